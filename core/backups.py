@@ -0,0 +1,163 @@
+import bisect
+import datetime
+import hashlib
+import json
+import logging
+import random
+import zlib
+from pathlib import Path
+
+from core.serializers import Packed_Serializer, load_data
+from core.storage import write_file
+
+
+# Keeps the newest `recent` backups, and the newest backup in each of the last `hourly` hours, `daily` days and
+# `weekly` weeks. Recent backups are never thinned out, so a backup taken when the data was loaded survives later
+# backups in the same hour.
+class Retention_Policy:
+    def __init__(
+        self, recent: int = 20, hourly: int = 24, daily: int = 14, weekly: int = 26
+    ):
+        self.recent = max(recent, 1)
+        self.hourly = hourly
+        self.daily = daily
+        self.weekly = weekly
+
+    # Returns the subset of times to keep.
+    def select(self, times: [datetime.datetime]) -> set:
+        newest_first = sorted(times, reverse=True)
+        kept = set(newest_first[: self.recent])
+        periods = (
+            (self.hourly, lambda time: (time.date(), time.hour)),
+            (self.daily, lambda time: time.date()),
+            (self.weekly, lambda time: time.isocalendar()[:2]),
+        )
+        for count, period_of in periods:
+            seen_periods = set()
+            for time in newest_first:
+                period = period_of(time)
+                if period not in seen_periods:
+                    if len(seen_periods) == count:
+                        break
+                    seen_periods.add(period)
+                    kept.add(time)
+        return kept
+
+
+# Stores backups of a handler's data in backup_dir.
+# Each backup is packed (see Packed_Serializer) and cut into chunks where the content, not the position, decides the
+# boundaries, so an edit only changes the chunks around it. Chunks are compressed and stored once under their hash in
+# objects/, and each backup is a small list of chunk hashes in snapshots/. A new backup therefore only writes the
+# chunks that changed since earlier backups.
+class Backup_Store:
+    _average_chunk_mask = (1 << 10) - 1  # About 1 KiB chunks.
+    _min_chunk_size = 256
+    _max_chunk_size = 8192
+    _gear = random.Random(0).choices(range(1 << 32), k=256)
+    _snapshot_time_format = "%Y-%m-%dT%H.%M.%S.%f"
+
+    def __init__(
+        self,
+        backup_dir,
+        retention_policy: Retention_Policy = None,
+        name: str = "Backups",
+    ):
+        self._backup_dir = Path(backup_dir)
+        self._objects_dir = self._backup_dir / "objects"
+        self._snapshots_dir = self._backup_dir / "snapshots"
+        if retention_policy is None:
+            retention_policy = Retention_Policy()
+        self._retention_policy = retention_policy
+        self._logger = logging.getLogger(name)
+
+    # Stores a backup of data and prunes old backups. Returns the time of the backup.
+    def add(self, data, time: datetime.datetime = None) -> datetime.datetime:
+        if time is None:
+            time = datetime.datetime.now()
+        raw = Packed_Serializer().dumps(data)
+
+        chunk_hashes = []
+        new_chunks = 0
+        for chunk in self._split(raw):
+            chunk_hash = hashlib.sha256(chunk).hexdigest()
+            chunk_path = self._chunk_path(chunk_hash)
+            if not chunk_path.exists():
+                write_file(chunk_path, zlib.compress(chunk))
+                new_chunks += 1
+            chunk_hashes.append(chunk_hash)
+
+        snapshot = {"time": time.isoformat(), "size": len(raw), "chunks": chunk_hashes}
+        write_file(self._snapshot_path(time), json.dumps(snapshot))
+        self._logger.info(
+            f"Backed up {len(raw)} bytes to '{self._backup_dir}' with {new_chunks} new of {len(chunk_hashes)} chunks."
+        )
+
+        self.prune()
+        return time
+
+    # Returns the times of every backup, oldest first.
+    def list_backups(self) -> [datetime.datetime]:
+        if not self._snapshots_dir.is_dir():
+            return []
+        return sorted(
+            datetime.datetime.strptime(path.stem, self._snapshot_time_format)
+            for path in self._snapshots_dir.glob("*.json")
+        )
+
+    # Returns the data of the newest backup taken at or before time, or of the newest backup if time is None.
+    def restore(self, time: datetime.datetime = None):
+        times = self.list_backups()
+        if time is not None:
+            times = times[: bisect.bisect_right(times, time)]
+        if not times:
+            raise FileNotFoundError(f"No backup in '{self._backup_dir}' before {time}.")
+
+        with open(self._snapshot_path(times[-1]), "r") as file:
+            snapshot = json.loads(file.read())
+        raw = b"".join(
+            zlib.decompress(self._chunk_path(chunk_hash).read_bytes())
+            for chunk_hash in snapshot["chunks"]
+        )
+        self._logger.info(f"Restored backup from {snapshot['time']}.")
+        return load_data(raw)
+
+    # Deletes backups the retention policy doesn't keep and chunks no remaining backup uses.
+    def prune(self):
+        times = self.list_backups()
+        kept = self._retention_policy.select(times)
+        for time in times:
+            if time not in kept:
+                self._snapshot_path(time).unlink()
+
+        used_chunks = set()
+        for time in kept:
+            with open(self._snapshot_path(time), "r") as file:
+                used_chunks.update(json.loads(file.read())["chunks"])
+        if self._objects_dir.is_dir():
+            for chunk_path in self._objects_dir.glob("*/*"):
+                if chunk_path.name not in used_chunks:
+                    chunk_path.unlink()
+
+    # Splits raw at content defined boundaries with a gear rolling hash.
+    def _split(self, raw: bytes):
+        start = 0
+        rolling_hash = 0
+        gear = self._gear
+        mask = self._average_chunk_mask
+        for index, byte in enumerate(raw):
+            rolling_hash = ((rolling_hash << 1) + gear[byte]) & 0xFFFFFFFF
+            size = index + 1 - start
+            if size >= self._max_chunk_size or (
+                size >= self._min_chunk_size and rolling_hash & mask == 0
+            ):
+                yield raw[start : index + 1]
+                start = index + 1
+                rolling_hash = 0
+        if start < len(raw) or not raw:
+            yield raw[start:]
+
+    def _chunk_path(self, chunk_hash: str) -> Path:
+        return self._objects_dir / chunk_hash[:2] / chunk_hash
+
+    def _snapshot_path(self, time: datetime.datetime) -> Path:
+        return self._snapshots_dir / f"{time.strftime(self._snapshot_time_format)}.json"
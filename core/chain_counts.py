@@ -0,0 +1,54 @@
+# Counts the links of a chain over any range of days with a Fenwick tree, so both counting a range and changing a day
+# take O(log n) steps. The tree covers a fixed range of date ordinals chosen when it's built, with room for a year of
+# links on either side of the links it's built from.
+class Chain_Counts:
+    _margin = 366
+
+    def __init__(self, first: int, last: int):
+        self._start = first
+        self._tree = [0] * (last - first + 2)
+
+    # Creates counts for date ordinals of links in increasing order, covering at least the days from first to last.
+    @classmethod
+    def from_ordinals(cls, ordinals, first: int, last: int):
+        ordinals = list(ordinals)
+        if ordinals:
+            first = min(first, ordinals[0])
+            last = max(last, ordinals[-1])
+        counts = cls(first - cls._margin, last + cls._margin)
+
+        tree = counts._tree
+        for ordinal in ordinals:
+            tree[ordinal - counts._start + 1] += 1
+        # Builds the tree in place in one pass by adding each node to its parent.
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        return counts
+
+    def covers(self, ordinal: int) -> bool:
+        return 0 <= ordinal - self._start < len(self._tree) - 1
+
+    # Adds delta to the count of a day. The day must be covered by the tree.
+    def add(self, ordinal: int, delta: int):
+        index = ordinal - self._start + 1
+        tree = self._tree
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    # Returns the number of links from the start of the tree up to and including ordinal.
+    def _prefix(self, ordinal: int) -> int:
+        index = min(ordinal - self._start + 1, len(self._tree) - 1)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    # Returns the number of links from first to last, inclusive.
+    def count(self, first: int, last: int) -> int:
+        if last < first:
+            return 0
+        return self._prefix(last) - self._prefix(first - 1)
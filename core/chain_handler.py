@@ -1,18 +1,319 @@
+import datetime
+from collections import OrderedDict
 from copy import deepcopy
 
-from core.data_handler import Data_Handler
+from core.backups import Backup_Store
+from core.data_handler import Data_Handler, Lazy_Handler
+from core.serializers import Serializer
+from core.storage import Storage, set_change, delete_change
+from core.chain_links import Chain_Links
+from core.chain_streaks import Chain_Streaks
+from core.chain_matrix import Chain_Matrix
+from core.chain_counts import Chain_Counts
+from core.comment_index import Comment_Index
 import core.helpers as h
 
 
 # Handles loading, saving, and getting chains.
+# Chain links are kept in memory as a Chain_Links bitset per chain and converted to and from the json format when
+# loading and saving.
+# When sharded is True, each year of chain links and comments is stored in its own shard (see Storage.shard) and the
+# main file only holds the chain order and the list of shards. Shards are loaded the first time a date in their year
+# is used, and a full save only writes the shards that changed since they were last saved. Backups of sharded chains
+# hold the main file and the shards loaded at the time, and with backup_on_load each shard is backed up when it's
+# loaded, so taking a backup never loads a shard.
+# Streaks are looked up through a Chain_Streaks per chain, built the first time a chain's streaks are used and kept up
+# to date by edit_chain. Link counts over date ranges work the same way through a Chain_Counts per chain. Both are
+# built from the years loaded so far and rebuilt when a year with links of the chain is loaded, so looking up a streak
+# only loads the years its run reaches and counting links only loads the years counted.
+# Comments are searched through a Comment_Index, built on the first search and kept up to date when comments change.
+# The last few chain matrices (see get_chain_matrix) are cached, and edit_chain updates the day it changes in them.
 class Chain_Handler(Data_Handler):
-    def __init__(self, chains_json_path="data/chains.json"):
+    _matrix_cache_size = 8
+
+    def __init__(
+        self,
+        chains_json_path="data/chains.json",
+        journal=False,
+        async_writes=False,
+        serializer: Serializer = None,
+        storage: Storage = None,
+        sharded=False,
+        backup_on_load=False,
+    ):
+        self._sharded = sharded
+        self._shard_storages = {}
+        self._shard_backup_stores = {}
+        self._unloaded_years = set()
+        self._dirty_years = set()
+        self._loaded_shards = False
+
         default_data = {"chain_order": [], "chains": {}, "chain_comments": {}}
         super(Chain_Handler, self).__init__(
-            "Chains", json_path=chains_json_path, default_data=default_data
+            "Chains",
+            json_path=chains_json_path,
+            default_data=default_data,
+            journal=journal,
+            async_writes=async_writes,
+            serializer=serializer,
+            storage=storage,
+            backup_on_load=backup_on_load,
         )
-        self.update_chain_val_event = h.Event()
-        self.update_chain_order_event = h.Event()
+        self.update_chain_val_event = h.Event(deferred=True)
+        self.update_chain_order_event = h.Event(deferred=True)
+
+        # Data loaded from a single file is written out as shards right away, and sharded data loaded without sharding
+        # is written out as a single file, so later changes are saved on top of the layout they apply to.
+        if (self._sharded and self._dirty_years) or (
+            not self._sharded and self._loaded_shards
+        ):
+            self.save_json()
+
+    def _get_data_json(self):
+        self._load_all_years()
+        return {
+            "chain_order": self._data["chain_order"],
+            "chains": {
+                chain_name: links.to_json()
+                for chain_name, links in self._chains.items()
+            },
+            "chain_comments": self._data["chain_comments"],
+        }
+
+    def _set_data_json(self, data):
+        self._data = {
+            "chain_order": data["chain_order"],
+            "chain_comments": {
+                chain_name: comments
+                for chain_name, comments in data.get("chain_comments", {}).items()
+                if comments
+            },
+        }
+        self._chains = {
+            chain_name: Chain_Links.from_json(
+                data.get("chains", {}).get(chain_name, {})
+            )
+            for chain_name in data["chain_order"]
+        }
+        self._streaks = {}
+        self._counts = {}
+        self._comment_index = None
+        self._matrices = OrderedDict()
+
+        self._loaded_shards = "shards" in data
+        if "shards" in data:
+            self._shard_years = set(data["shards"])
+            self._unloaded_years = set(self._shard_years)
+            if not self._sharded:
+                self._load_all_years()
+        else:
+            self._shard_years = set()
+            self._unloaded_years = set()
+            if self._sharded:
+                self._dirty_years = {
+                    year
+                    for chains_json in (data["chains"], data["chain_comments"])
+                    for chain_json in chains_json.values()
+                    for year in chain_json
+                }
+
+    # The main file of sharded chains: {"chain_order": [...], "shards": [year, ...]}
+    def _get_index_json(self):
+        return {
+            "chain_order": self._data["chain_order"],
+            "shards": sorted(self._shard_years),
+        }
+
+    # A shard of sharded chains: {"chains": {chain: {month: [0, 1, ...]}}, "chain_comments": {chain: {month: {day:
+    # comment}}}}
+    def _get_year_json(self, year):
+        chains = {}
+        for chain_name, links in self._chains.items():
+            year_json = links.year_to_json(year)
+            if year_json:
+                chains[chain_name] = year_json
+        chain_comments = {
+            chain_name: comments[year]
+            for chain_name, comments in self._data["chain_comments"].items()
+            if year in comments
+        }
+        return {"chains": chains, "chain_comments": chain_comments}
+
+    def _get_shard_storage(self, year) -> Storage:
+        if year not in self._shard_storages:
+            self._shard_storages[year] = self._storage.shard(year)
+        return self._shard_storages[year]
+
+    # Loads the shard for year if it hasn't been loaded yet.
+    def _load_year(self, year):
+        year = str(year)
+        if year not in self._unloaded_years:
+            return
+
+        year_json = self._get_shard_storage(year).load()
+        self._unloaded_years.remove(year)
+        if year_json is None:
+            return
+        for chain_name, months in year_json["chains"].items():
+            if chain_name in self._chains:
+                self._chains[chain_name].update_from_json({year: months})
+                self._streaks.pop(chain_name, None)
+                self._counts.pop(chain_name, None)
+        for chain_name, months in year_json["chain_comments"].items():
+            if chain_name in self._chains:
+                self._data["chain_comments"].setdefault(chain_name, {})[year] = months
+        self._logger.info(f"Loaded chains for {year}.")
+        if self._sharded and self._backup_on_load:
+            self._get_shard_backup_store(year).add(year_json)
+
+    # Loads the shards of every year from start to end.
+    def _load_years(self, start: datetime.date, end: datetime.date):
+        if self._unloaded_years:
+            for year in range(start.year, end.year + 1):
+                self._load_year(year)
+
+    def _load_all_years(self):
+        for year in list(self._unloaded_years):
+            self._load_year(year)
+
+    def _save_storage(self):
+        if not self._sharded:
+            super(Chain_Handler, self)._save_storage()
+            # Shards from an earlier sharded layout are no longer used.
+            self._shard_years = set()
+            return
+
+        for year in sorted(self._dirty_years):
+            self._shard_years.add(year)
+            self._get_shard_storage(year).save(self._get_year_json(year))
+        self._dirty_years = set()
+        self._storage.save(self._get_index_json())
+
+    def _save_storage_changes(self, changes: list) -> bool:
+        if not self._sharded:
+            return super(Chain_Handler, self)._save_storage_changes(changes)
+
+        index_changes = []
+        year_changes = {}
+        for change in changes:
+            for year, shard_change in self._split_change(change):
+                if year is None:
+                    index_changes.append(shard_change)
+                else:
+                    year_changes.setdefault(year, []).append(shard_change)
+
+        new_years = year_changes.keys() - self._shard_years
+        if new_years:
+            self._shard_years |= new_years
+            index_changes.append(set_change(["shards"], sorted(self._shard_years)))
+
+        for year, shard_changes in year_changes.items():
+            shard_storage = self._get_shard_storage(year)
+            if year in new_years:
+                # The changes have already been made, so saving the new shard in full includes them.
+                shard_storage.save(self._get_year_json(year))
+                continue
+            if not shard_storage.can_save_changes():
+                shard_storage.save(self._get_year_json(year))
+                self._dirty_years.discard(year)
+                continue
+            shard_storage.save_changes(shard_changes)
+            if shard_storage.should_compact():
+                shard_storage.save(self._get_year_json(year))
+                self._dirty_years.discard(year)
+
+        if index_changes:
+            if not self._storage.can_save_changes():
+                self._storage.save(self._get_index_json())
+                return False
+            self._storage.save_changes(index_changes)
+            return self._storage.should_compact()
+        return False
+
+    # Splits a change to the json format into (year, change to that year's shard) pairs. Changes to the main file have
+    # a year of None. Deleting a whole chain applies to every shard, so every shard has to be loaded before doing it.
+    # Setting a whole chain is only done for new chain names, which have no data in other shards.
+    def _split_change(self, change):
+        path = change["path"]
+        if path[0] not in ("chains", "chain_comments"):
+            return [(None, change)]
+        if len(path) >= 3:
+            return [(path[2], dict(change, path=path[:2] + path[3:]))]
+        if change["op"] == "set":
+            return [
+                (year, set_change(path, year_value))
+                for year, year_value in change["value"].items()
+            ]
+        return [(year, delete_change(path)) for year in self._shard_years]
+
+    def flush(self):
+        super(Chain_Handler, self).flush()
+        for shard_storage in self._shard_storages.values():
+            shard_storage.flush()
+
+    def close(self):
+        for shard_storage in self._shard_storages.values():
+            shard_storage.close()
+        super(Chain_Handler, self).close()
+
+    def _get_shard_backup_store(self, year) -> Backup_Store:
+        if year not in self._shard_backup_stores:
+            self._shard_backup_stores[year] = Backup_Store(
+                self._backup_dir_path / self._json_path.stem / "shards" / year,
+                retention_policy=self._retention_policy,
+                name=self._logger.name,
+            )
+        return self._shard_backup_stores[year]
+
+    def backup(self):
+        if not self._sharded:
+            return super(Chain_Handler, self).backup()
+        time = datetime.datetime.now()
+        for year in (self._shard_years | self._dirty_years) - self._unloaded_years:
+            self._get_shard_backup_store(year).add(self._get_year_json(year), time)
+        return self._backup_store.add(self._get_index_json(), time)
+
+    # Returns the json of a shard as it was when the main file was backed up at time. A shard that wasn't loaded then
+    # was unchanged until it was next loaded, which is when its next backup was taken. A shard without any later
+    # backup hasn't been backed up since, so the stored shard is used.
+    def _restore_shard_backup(self, year, time: datetime.datetime):
+        shard_backup_store = self._get_shard_backup_store(year)
+        for backup_time in shard_backup_store.list_backups():
+            if backup_time >= time:
+                return shard_backup_store.restore(backup_time)
+        return self._get_shard_storage(year).load()
+
+    # Returns the data of a backup of the main file of sharded chains taken at or before time, with the json of each
+    # shard as it was then.
+    def _restore_sharded_backup(self, index_json, time=None):
+        backup_time = [
+            backup_time
+            for backup_time in self._backup_store.list_backups()
+            if time is None or backup_time <= time
+        ][-1]
+        data = {
+            "chain_order": index_json["chain_order"],
+            "chains": {},
+            "chain_comments": {},
+        }
+        for year in index_json["shards"]:
+            year_json = self._restore_shard_backup(year, backup_time)
+            if year_json is None:
+                continue
+            for key in ("chains", "chain_comments"):
+                for chain_name, months in year_json[key].items():
+                    data[key].setdefault(chain_name, {})[year] = months
+        return data
+
+    def restore_backup(self, time=None):
+        data = self._backup_store.restore(time)
+        if "shards" in data:
+            data = self._restore_sharded_backup(data, time)
+        self._set_data_json(data)
+        self._logger.info("Restored data from backup.")
+        self.save_json()
+        self._call_event(self.update_chain_order_event, h.Change("all"))
+        self._call_event(self.update_chain_val_event, h.Change("all"))
 
     def get_chain_order(self):
         return self._data["chain_order"].copy()
@@ -26,8 +327,11 @@ class Chain_Handler(Data_Handler):
         if new_order_sorted == old_order_sorted:
             self._data["chain_order"] = new_order.copy()
             self._logger.info(f"Reordered chains from to {old_order} to {new_order}.")
-            self.save_json()
-            self.update_chain_order_event.call()
+            self._save_changes(set_change(["chain_order"], new_order.copy()))
+            self._call_event(
+                self.update_chain_order_event,
+                h.Change("chain_order", old=old_order, new=new_order.copy()),
+            )
         else:
             raise SyntaxError(
                 "New chain order must contain the same names as the old order."
@@ -35,49 +339,237 @@ class Chain_Handler(Data_Handler):
 
     # Try to check the value of the chain at the date. If it's not set, return 0.
     def get_chain(self, chain, year=None, month=None, day=None, date=None):
-        year, month, day = h.format_date_ssi(year, month, day, date)
+        ordinal = h.format_date_ordinal(year, month, day, date)
+        if self._unloaded_years:
+            self._load_year(datetime.date.fromordinal(ordinal).year)
 
         try:
-            return self._data["chains"][chain][year][month][day - 1]
-        except (KeyError, IndexError):
+            return self._chains[chain].get(ordinal)
+        except KeyError:
             return 0
 
-    # Return a list of all the chain links for a month. If it's not present in the json, return an empty list.
+    # Return a list of all the chain links for a month. If the chain doesn't exist, return an empty list.
     def get_chain_month(self, chain_name, year, month):
-        year = str(year)
-        month = str(month)
-
+        self._load_year(year)
         try:
-            return self._data["chains"][chain_name][year][month].copy()
+            return self._chains[chain_name].get_month(year, month)
         except KeyError:
             days = h.days_in_month(year, month)
             return [0] * days
 
+    # Return a list of the chain links for every day from start to end, inclusive. If the chain doesn't exist, every
+    # day is 0.
+    def get_chain_range(self, chain_name, start: datetime.date, end: datetime.date):
+        self._load_years(start, end)
+        first, last = start.toordinal(), end.toordinal()
+        try:
+            return list(self._chains[chain_name].get_range(first, last))
+        except KeyError:
+            return [0] * max(last - first + 1, 0)
+
+    # Return {chain_name: get_chain_range(chain_name, start, end)} for every chain in chain_names.
+    def get_chains_range(self, chain_names, start: datetime.date, end: datetime.date):
+        return {
+            chain_name: self.get_chain_range(chain_name, start, end)
+            for chain_name in chain_names
+        }
+
+    # Return the links of the Monday to Sunday week containing the date as 7 bits, with bit 0 for Monday. If the chain
+    # doesn't exist, return 0.
+    def get_week_mask(self, chain_name, year=None, month=None, day=None, date=None):
+        return self.get_week_masks([chain_name], year, month, day, date)[chain_name]
+
+    # Return {chain_name: get_week_mask(chain_name, date)} for every chain in chain_names.
+    def get_week_masks(
+        self, chain_names, year=None, month=None, day=None, date=None
+    ) -> dict:
+        week = (h.format_date_ordinal(year, month, day, date) - 1) // 7
+        monday = datetime.date.fromordinal(week * 7 + 1)
+        self._load_years(monday, monday + datetime.timedelta(days=6))
+        return {
+            chain_name: (
+                self._chains[chain_name].get_week_mask(week)
+                if chain_name in self._chains
+                else 0
+            )
+            for chain_name in chain_names
+        }
+
     def edit_chain(
         self, chain_name, new_value: int, year=None, month=None, day=None, date=None
     ):
         year, month, day = h.format_date_ssi(year, month, day, date)
+        ordinal = h.format_date_ordinal(year, month, day)
+        self._load_year(year)
+        links = self._chains[chain_name]
 
-        # If missing dictionary keys for year and/or month, add them.
-        if year not in self._data["chains"][chain_name]:
-            self._data["chains"][chain_name][year] = {}
-        if month not in self._data["chains"][chain_name][year]:
-            days = h.days_in_month(year, month)
-            self._data["chains"][chain_name][year][month] = [0] * days
-
-        day_index = day - 1
-        old_value = self._data["chains"][chain_name][year][month][day_index]
-        self._data["chains"][chain_name][year][month][day_index] = int(new_value)
+        old_value = links.get(ordinal)
+        links.set(ordinal, int(new_value))
+        if chain_name in self._counts and links.get(ordinal) != old_value:
+            counts = self._counts[chain_name]
+            if counts.covers(ordinal):
+                counts.add(ordinal, links.get(ordinal) - old_value)
+            else:
+                # Rebuilt with a wider range the next time it's used.
+                del self._counts[chain_name]
+        for matrix in self._matrices.values():
+            matrix.update(
+                chain_name, datetime.date.fromordinal(ordinal), links.get(ordinal)
+            )
+        if chain_name in self._streaks:
+            if new_value:
+                self._streaks[chain_name].add(ordinal)
+            else:
+                self._streaks[chain_name].remove(ordinal)
         self._logger.info(
             f"Changed chain '{chain_name}' at {year}/{month}/{day} from '{old_value}' to '{new_value}'."
         )
-        self._delete_chain_if_empty(chain_name, year, month)
-        self.save_json()
-        self.update_chain_val_event.call()
+
+        # Months and years without any links are left out of the json.
+        if links.year_is_empty(year):
+            self._save_changes(delete_change(["chains", chain_name, year]))
+        elif links.month_is_empty(year, month):
+            self._save_changes(delete_change(["chains", chain_name, year, month]))
+        else:
+            self._save_changes(
+                set_change(
+                    ["chains", chain_name, year, month],
+                    links.get_month(year, month),
+                )
+            )
+        date = datetime.date.fromordinal(ordinal)
+        self._call_event(
+            self.update_chain_val_event,
+            h.Change(
+                "link",
+                chain_name,
+                date,
+                date,
+                old=old_value,
+                new=links.get(ordinal),
+            ),
+        )
+
+    # Returns the streaks of a chain, with the runs containing the date ordinals complete. Runs can cross into other
+    # years, so the year before or after a run is loaded until the run ends in a loaded year.
+    def _get_streaks(self, chain_name, *ordinals) -> Chain_Streaks:
+        for ordinal in ordinals:
+            self._load_year(datetime.date.fromordinal(ordinal).year)
+        while True:
+            if chain_name not in self._streaks:
+                self._streaks[chain_name] = Chain_Streaks.from_ordinals(
+                    self._chains[chain_name].ordinals()
+                )
+            streaks = self._streaks[chain_name]
+            if not self._unloaded_years:
+                return streaks
+
+            unloaded_years = set()
+            for ordinal in ordinals:
+                run = streaks.get_run(ordinal)
+                if run is not None:
+                    for edge in (run[0] - 1, run[1] + 1):
+                        year = str(datetime.date.fromordinal(edge).year)
+                        if year in self._unloaded_years:
+                            unloaded_years.add(year)
+            if not unloaded_years:
+                return streaks
+            for year in unloaded_years:
+                self._load_year(year)
+
+    # Counts only cover the years loaded so far, so callers load the years they count first.
+    def _get_counts(self, chain_name) -> Chain_Counts:
+        if chain_name not in self._counts:
+            today = datetime.date.today().toordinal()
+            self._counts[chain_name] = Chain_Counts.from_ordinals(
+                self._chains[chain_name].ordinals(), today, today
+            )
+        return self._counts[chain_name]
+
+    # Return the number of links of a chain from start to end, inclusive.
+    def count_links(self, chain_name, start: datetime.date, end: datetime.date) -> int:
+        self._load_years(start, end)
+        return self._get_counts(chain_name).count(start.toordinal(), end.toordinal())
+
+    # Return the fraction of days from start to end, inclusive, that the chain was linked.
+    def get_completion_rate(
+        self, chain_name, start: datetime.date, end: datetime.date
+    ) -> float:
+        days = (end - start).days + 1
+        if days <= 0:
+            return 0.0
+        return self.count_links(chain_name, start, end) / days
+
+    # Return the number of days in a row the chain has been linked up to the date. If the date isn't linked yet, the
+    # streak up to the day before is returned, since it isn't broken until the day is over.
+    def get_streak(self, chain_name, year=None, month=None, day=None, date=None) -> int:
+        ordinal = h.format_date_ordinal(year, month, day, date)
+        return self._get_streaks(chain_name, ordinal, ordinal - 1).get_streak(ordinal)
+
+    # Return the longest streak of the chain. With loaded_only, only the years loaded so far are searched, so no
+    # shards are loaded.
+    def get_longest_streak(self, chain_name, loaded_only=False) -> int:
+        if not loaded_only:
+            self._load_all_years()
+        return self._get_streaks(chain_name).get_longest_streak()
+
+    # Return True if the data of some years hasn't been loaded yet (see sharded).
+    def has_unloaded_years(self) -> bool:
+        return bool(self._unloaded_years)
+
+    # Return the first and last dates of the run of linked days containing the date, or None if it isn't linked.
+    def get_chain_run(self, chain_name, year=None, month=None, day=None, date=None):
+        ordinal = h.format_date_ordinal(year, month, day, date)
+        run = self._get_streaks(chain_name, ordinal).get_run(ordinal)
+        if run is None:
+            return None
+        return tuple(datetime.date.fromordinal(ordinal) for ordinal in run)
+
+    # Return the first and last dates of every run of linked days that overlaps the dates from start to end.
+    def get_chain_runs(self, chain_name, start: datetime.date, end: datetime.date):
+        self._load_years(start, end)
+        first, last = start.toordinal(), end.toordinal()
+        return [
+            (datetime.date.fromordinal(run_first), datetime.date.fromordinal(run_last))
+            for run_first, run_last in self._get_streaks(chain_name, first, last).runs(
+                first, last
+            )
+        ]
+
+    # Return a Chain_Matrix of the links of chain_names (by default every chain, in order) from start to end,
+    # inclusive. The matrix is shared with the cache and kept up to date by edit_chain, so it must not be modified.
+    def get_chain_matrix(
+        self, start: datetime.date, end: datetime.date, chain_names=None
+    ) -> Chain_Matrix:
+        if chain_names is None:
+            chain_names = self._data["chain_order"]
+        key = (start, end, tuple(chain_names))
+        if key in self._matrices:
+            self._matrices.move_to_end(key)
+            return self._matrices[key]
+
+        self._load_years(start, end)
+        first, last = start.toordinal(), end.toordinal()
+        days = max(last - first + 1, 0)
+        rows = [
+            (
+                self._chains[chain_name].get_range(first, last)
+                if chain_name in self._chains
+                else bytes(days)
+            )
+            for chain_name in chain_names
+        ]
+        matrix = Chain_Matrix(chain_names, start, days, rows)
+
+        self._matrices[key] = matrix
+        if len(self._matrices) > self._matrix_cache_size:
+            self._matrices.popitem(last=False)
+        return matrix
 
     # Return the comment for a chain at a date. If it's not present in the json, return None.
     def get_chain_comment(self, chain_name, year=None, month=None, day=None, date=None):
         year, month, day = h.format_date_sss(year, month, day, date)
+        self._load_year(year)
         # Unlike _chains, _chains_comments uses strings for days because [chain_name][year][month] contains a dictionary
         # instead of a list.
 
@@ -86,14 +578,62 @@ class Chain_Handler(Data_Handler):
         except KeyError:
             return None
 
+    # Return {date: comment} for every comment of a chain from start to end, inclusive, ordered by date.
+    def get_comments_range(self, chain_name, start: datetime.date, end: datetime.date):
+        self._load_years(start, end)
+        chain_comments = self._data["chain_comments"].get(chain_name, {})
+        comments = {}
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            month_comments = chain_comments.get(str(year), {}).get(str(month), {})
+            for day in sorted(map(int, month_comments)):
+                date = datetime.date(year, month, day)
+                if start <= date <= end:
+                    comments[date] = month_comments[str(day)]
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return comments
+
+    # Return {chain_name: get_comments_range(chain_name, start, end)} for every chain in chain_names.
+    def get_chains_comments_range(
+        self, chain_names, start: datetime.date, end: datetime.date
+    ):
+        return {
+            chain_name: self.get_comments_range(chain_name, start, end)
+            for chain_name in chain_names
+        }
+
+    def _get_comment_index(self) -> Comment_Index:
+        if self._comment_index is None:
+            self._load_all_years()
+            self._comment_index = Comment_Index()
+            for chain_name, years in self._data["chain_comments"].items():
+                for year, months in years.items():
+                    for month, days in months.items():
+                        for day, comment in days.items():
+                            self._comment_index.set_comment(
+                                chain_name,
+                                h.format_date_ordinal(year, month, day),
+                                comment,
+                            )
+        return self._comment_index
+
+    # Return (chain_name, date) for every comment matching query, ordered by date. See Comment_Index for the query
+    # syntax.
+    def search_comments(self, query: str) -> [tuple]:
+        return [
+            (chain_name, datetime.date.fromordinal(ordinal))
+            for chain_name, ordinal in self._get_comment_index().search(query)
+        ]
+
     # Edit the comment for a chain at a date.
     def edit_chain_comment(
         self, chain_name, new_comment, year=None, month=None, day=None, date=None
     ):
         if new_comment == "" or new_comment.isspace():
-            self.delete_chain_comment(self, chain_name, year, month, day)
+            self.delete_chain_comment(chain_name, year, month, day, date)
         else:
             year, month, day = h.format_date_ssi(year, month, day, date)
+            self._load_year(year)
             # Unlike _chains, _chains_comments uses strings for days because [chain_name][year][month] contains a
             # dictionary instead of a list.
             day = str(day)
@@ -106,53 +646,101 @@ class Chain_Handler(Data_Handler):
                 self._data["chain_comments"][chain_name][year][month] = {}
             old_comment = self.get_chain_comment(chain_name, year, month, day)
             self._data["chain_comments"][chain_name][year][month][day] = new_comment
+            if self._comment_index is not None:
+                self._comment_index.set_comment(
+                    chain_name, h.format_date_ordinal(year, month, day), new_comment
+                )
             self._logger.info(
                 f"Changed chain '{chain_name}' comment at {year}/{month}/{day} from '{old_comment}' to '{new_comment}'."
             )
-            self.save_json()
+            self._save_changes(
+                set_change(
+                    ["chain_comments", chain_name, year, month, day], new_comment
+                )
+            )
+            date = datetime.date(int(year), int(month), int(day))
+            self._call_event(
+                self.update_chain_val_event,
+                h.Change(
+                    "comment", chain_name, date, date, old=old_comment, new=new_comment
+                ),
+            )
 
     def create_new_chain(self, chain_name):
-        self._data["chains"][chain_name] = {}
+        self._chains[chain_name] = Chain_Links()
+        self._matrices.clear()
         self._data["chain_order"].append(chain_name)
         self._logger.info(f"Created new chain '{chain_name}'.")
-        self.save_json()
-        self.update_chain_order_event.call()
+        self._save_changes(
+            set_change(["chains", chain_name], {}),
+            set_change(["chain_order"], self.get_chain_order()),
+        )
+        self._call_event(
+            self.update_chain_order_event, h.Change("chain_created", chain_name)
+        )
 
     def rename_chain(self, current_name, new_name):
-        if new_name in self._data["chains"]:
+        if new_name in self._chains:
             raise NameError(f"'{new_name}' already exists in chains.")
         else:
+            self._load_all_years()
             chain_order_index = self._data["chain_order"].index(current_name)
             self._data["chain_order"][chain_order_index] = new_name
 
-            self._data["chains"][new_name] = self._data["chains"][current_name]
-            del self._data["chains"][current_name]
+            self._chains[new_name] = self._chains.pop(current_name)
+            self._matrices.clear()
+            if current_name in self._streaks:
+                self._streaks[new_name] = self._streaks.pop(current_name)
+            if current_name in self._counts:
+                self._counts[new_name] = self._counts.pop(current_name)
+            if self._comment_index is not None:
+                self._comment_index.rename_chain(current_name, new_name)
+            changes = [
+                set_change(["chain_order"], self.get_chain_order()),
+                set_change(["chains", new_name], self._chains[new_name].to_json()),
+                delete_change(["chains", current_name]),
+            ]
 
             if current_name in self._data["chain_comments"]:
                 self._data["chain_comments"][new_name] = self._data["chain_comments"][
                     current_name
                 ]
                 del self._data["chain_comments"][current_name]
+                changes += [
+                    set_change(
+                        ["chain_comments", new_name],
+                        self._data["chain_comments"][new_name],
+                    ),
+                    delete_change(["chain_comments", current_name]),
+                ]
             self._logger.info(f"Renamed chain '{current_name}' to '{new_name}'.")
 
-            self.save_json()
-            self.update_chain_order_event.call()
-
-    # Removes chain link lists that are all 0 and any empty year/month dictionaries.
-    def _delete_chain_if_empty(self, chain_name, year, month):
-        if max(self._data["chains"][chain_name][year][month]) == 0:
-            del self._data["chains"][chain_name][year][month]
-            if not self._data["chains"][chain_name][year]:
-                del self._data["chains"][chain_name][year]
+            self._save_changes(*changes)
+            self._call_event(
+                self.update_chain_order_event,
+                h.Change("chain_renamed", old=current_name, new=new_name),
+            )
 
     def delete_chain(self, chain_name):
         if chain_name in self._data["chain_order"]:
+            self._load_all_years()
             self._data["chain_order"].remove(chain_name)
-            del self._data["chains"][chain_name]
+            del self._chains[chain_name]
+            self._streaks.pop(chain_name, None)
+            self._counts.pop(chain_name, None)
+            if self._comment_index is not None:
+                self._comment_index.remove_chain(chain_name)
+            self._matrices.clear()
             self._data["chain_comments"].pop(chain_name, None)
             self._logger.info(f"Deleted chain '{chain_name}'.")
-            self.save_json()
-            self.update_chain_order_event.call()
+            self._save_changes(
+                set_change(["chain_order"], self.get_chain_order()),
+                delete_change(["chains", chain_name]),
+                delete_change(["chain_comments", chain_name]),
+            )
+            self._call_event(
+                self.update_chain_order_event, h.Change("chain_deleted", chain_name)
+            )
         else:
             raise NameError(f"No chain '{chain_name}'")
 
@@ -161,23 +749,41 @@ class Chain_Handler(Data_Handler):
         self, chain_name, year=None, month=None, day=None, date=None
     ):
         year, month, day = h.format_date_sss(year, month, day, date)
-        # Unlike _data["chains"], _data["chains_comments"] uses strings for days because [chain_name][year][month]
+        self._load_year(year)
+        # Unlike the chains json, _data["chains_comments"] uses strings for days because [chain_name][year][month]
         # contains a dictionary instead of a list.
 
         try:
             old_comment = self.get_chain_comment(chain_name, year, month, day)
             del self._data["chain_comments"][chain_name][year][month][day]
+            if self._comment_index is not None:
+                self._comment_index.remove_comment(
+                    chain_name, h.format_date_ordinal(year, month, day)
+                )
             self._logger.info(
                 f"Deleted chain '{chain_name}' comment '{old_comment}' at {year}/{month}/{day}."
             )
-            self._delete_chain_comment_dictionaries_if_empty(chain_name, year, month)
-            self.save_json()
+            deleted_path = self._delete_chain_comment_dictionaries_if_empty(
+                chain_name, year, month
+            )
+            if deleted_path is None:
+                deleted_path = ["chain_comments", chain_name, year, month, day]
+            self._save_changes(delete_change(deleted_path))
         except KeyError:
             self._logger.info(
                 f"Tried to delete chain '{chain_name}' comment at {year}/{month}/{day} but there was no comment."
             )
+        else:
+            date = datetime.date(int(year), int(month), int(day))
+            self._call_event(
+                self.update_chain_val_event,
+                h.Change("comment", chain_name, date, date, old=old_comment),
+            )
 
-    # Removes chain_comments dictionaries that are empty.
+    # Removes chain_comments dictionaries that are empty. Returns the path of the outermost removed dictionary, or
+    # None if nothing was removed. The chain's dictionary is removed too, but the returned path stops at the year so
+    # the change only touches that year's shard. Replaying it leaves an empty dictionary for the chain, which is the
+    # same as no comments.
     def _delete_chain_comment_dictionaries_if_empty(self, chain_name, year, month):
         if not self._data["chain_comments"][chain_name][year][month]:
             del self._data["chain_comments"][chain_name][year][month]
@@ -185,6 +791,9 @@ class Chain_Handler(Data_Handler):
                 del self._data["chain_comments"][chain_name][year]
                 if not self._data["chain_comments"][chain_name]:
                     del self._data["chain_comments"][chain_name]
+                return ["chain_comments", chain_name, year]
+            return ["chain_comments", chain_name, year, month]
+        return None
 
 
-chain_handler = Chain_Handler()
\ No newline at end of file
+chain_handler = Lazy_Handler(Chain_Handler)
@@ -0,0 +1,143 @@
+import datetime
+
+import core.helpers as h
+
+# The 8 days of each possible bitset byte as bytes of 0 and 1.
+_byte_days = [bytes(byte >> bit & 1 for bit in range(8)) for byte in range(256)]
+
+
+# Stores the links of a chain as a bitset with one bit per day, indexed by the day's date ordinal.
+class Chain_Links:
+    def __init__(self):
+        # Ordinal of the day stored in the lowest bit of _bits[0]. Always a multiple of 8 so the bitset can grow in
+        # either direction by whole bytes.
+        self._start = 0
+        self._bits = bytearray()
+
+    # Creates chain links from the json format: {year: {month: [0, 1, ...]}} with string years and months.
+    @classmethod
+    def from_json(cls, chain_json: dict):
+        links = cls()
+        links.update_from_json(chain_json)
+        return links
+
+    # Sets the links of every month in chain_json, which is in the same format as from_json takes.
+    def update_from_json(self, chain_json: dict):
+        ordinals = [
+            datetime.date(int(year), int(month), day_index + 1).toordinal()
+            for year, months in chain_json.items()
+            for month, month_links in months.items()
+            for day_index, value in enumerate(month_links)
+            if value
+        ]
+        if ordinals:
+            self._reserve(min(ordinals), max(ordinals))
+            for ordinal in ordinals:
+                index = ordinal - self._start
+                self._bits[index >> 3] |= 1 << (index & 7)
+
+    # Returns the chain links in the json format. Months without any links are left out.
+    def to_json(self) -> dict:
+        chain_json = {}
+        for ordinal in self.ordinals():
+            date = datetime.date.fromordinal(ordinal)
+            year, month = str(date.year), str(date.month)
+            if year not in chain_json:
+                chain_json[year] = {}
+            if month not in chain_json[year]:
+                chain_json[year][month] = [0] * h.days_in_month(date.year, date.month)
+            chain_json[year][month][date.day - 1] = 1
+        return chain_json
+
+    # Returns the links of one year as {month: [0, 1, ...]}. Months without any links are left out.
+    def year_to_json(self, year) -> dict:
+        year_json = {}
+        for month in range(1, 13):
+            month_links = self.get_month(year, month)
+            if any(month_links):
+                year_json[str(month)] = month_links
+        return year_json
+
+    # Yields the ordinal of every day with a link, in order.
+    def ordinals(self):
+        for byte_index, byte in enumerate(self._bits):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield self._start + byte_index * 8 + bit
+
+    def get(self, ordinal: int) -> int:
+        index = ordinal - self._start
+        if index < 0 or index >= len(self._bits) * 8:
+            return 0
+        return self._bits[index >> 3] >> (index & 7) & 1
+
+    # Any truthy value is stored as 1.
+    def set(self, ordinal: int, value):
+        if value:
+            self._reserve(ordinal, ordinal)
+            index = ordinal - self._start
+            self._bits[index >> 3] |= 1 << (index & 7)
+        else:
+            index = ordinal - self._start
+            if 0 <= index < len(self._bits) * 8:
+                self._bits[index >> 3] &= ~(1 << (index & 7))
+
+    # Returns the links of every day from first to last, inclusive, as bytes of 0 and 1.
+    def get_range(self, first: int, last: int) -> bytes:
+        if last < first:
+            return b""
+        stored_first = max(first, self._start)
+        stored_last = min(last, self._start + len(self._bits) * 8 - 1)
+        if stored_last < stored_first:
+            return bytes(last - first + 1)
+
+        first_byte = (stored_first - self._start) >> 3
+        last_byte = (stored_last - self._start) >> 3
+        days = b"".join(
+            map(_byte_days.__getitem__, self._bits[first_byte : last_byte + 1])
+        )
+        offset = stored_first - self._start - first_byte * 8
+        return (
+            bytes(stored_first - first)
+            + days[offset : offset + stored_last - stored_first + 1]
+            + bytes(last - stored_last)
+        )
+
+    # Returns the links of a week as 7 bits, with bit 0 for Monday. Weeks are numbered from the week of ordinal 1, so
+    # the week of an ordinal is (ordinal - 1) // 7 and its weekday is (ordinal - 1) % 7.
+    def get_week_mask(self, week: int) -> int:
+        index = week * 7 + 1 - self._start
+        first_byte = max(index >> 3, 0)
+        last_byte = min((index + 6) >> 3, len(self._bits) - 1)
+        if last_byte < first_byte:
+            return 0
+        mask = int.from_bytes(self._bits[first_byte : last_byte + 1], "little")
+        shift = index - first_byte * 8
+        mask = mask >> shift if shift >= 0 else mask << -shift
+        return mask & 0x7F
+
+    def get_month(self, year, month) -> list:
+        first = datetime.date(int(year), int(month), 1).toordinal()
+        return list(self.get_range(first, first + h.days_in_month(year, month) - 1))
+
+    def month_is_empty(self, year, month) -> bool:
+        return not any(self.get_month(year, month))
+
+    def year_is_empty(self, year) -> bool:
+        first = datetime.date(int(year), 1, 1).toordinal()
+        last = datetime.date(int(year), 12, 31).toordinal()
+        return not any(self.get(ordinal) for ordinal in range(first, last + 1))
+
+    # Grows the bitset so it includes every day from first to last.
+    def _reserve(self, first: int, last: int):
+        if not self._bits:
+            self._start = first - first % 8
+        elif first < self._start:
+            new_start = first - first % 8
+            self._bits[0:0] = bytes((self._start - new_start) // 8)
+            self._start = new_start
+
+        needed_bytes = (last - self._start) // 8 + 1
+        if needed_bytes > len(self._bits):
+            self._bits += bytes(needed_bytes - len(self._bits))
@@ -0,0 +1,73 @@
+import datetime
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Links of several chains over a range of days, with a row per chain and a column per day. values is a NumPy array of
+# uint8 when NumPy is installed, or a list of array("B") rows otherwise. Either way values[row][column] is 1 if the
+# chain was linked that day.
+class Chain_Matrix:
+    # Each row is bytes of 0 and 1 with one byte per day.
+    def __init__(self, chains: list, start: datetime.date, days: int, rows: list):
+        self.chains = list(chains)
+        self.start = start
+        self.days = days
+        self._rows_by_chain = {chain: row for row, chain in enumerate(self.chains)}
+        if numpy is None:
+            self.values = [array("B", row) for row in rows]
+        elif not rows or not self.days:
+            self.values = numpy.zeros((len(rows), self.days), dtype=numpy.uint8)
+        else:
+            self.values = numpy.frombuffer(b"".join(rows), dtype=numpy.uint8)
+            self.values = self.values.reshape(len(rows), self.days).copy()
+
+    @property
+    def end(self) -> datetime.date:
+        return self.start + datetime.timedelta(days=self.days - 1)
+
+    def dates(self) -> [datetime.date]:
+        return [self.start + datetime.timedelta(days=day) for day in range(self.days)]
+
+    def get(self, chain, date: datetime.date) -> int:
+        return int(self.values[self._rows_by_chain[chain]][(date - self.start).days])
+
+    # Updates the matrix after a chain link was edited. Dates and chains outside of the matrix are ignored.
+    def update(self, chain, date: datetime.date, value: int):
+        column = (date - self.start).days
+        if chain in self._rows_by_chain and 0 <= column < self.days:
+            self.values[self._rows_by_chain[chain]][column] = value
+
+    # Returns the fraction of days each chain was linked, in the order of chains.
+    def completion_rates(self) -> list:
+        if not self.days:
+            return [0.0] * len(self.chains)
+        if numpy is None:
+            return [row.count(1) / self.days for row in self.values]
+        return (self.values.sum(axis=1) / self.days).tolist()
+
+    # Returns the number of links of each chain in each week, where weeks are counted in blocks of 7 days from start.
+    # The last week is shorter if days isn't a multiple of 7.
+    def weekly_sums(self) -> [list]:
+        if not self.days:
+            return [[] for _ in self.chains]
+        if numpy is None:
+            return [
+                [sum(row[day : day + 7]) for day in range(0, self.days, 7)]
+                for row in self.values
+            ]
+        week_starts = numpy.arange(0, self.days, 7)
+        return numpy.add.reduceat(self.values, week_starts, axis=1).tolist()
+
+    # Returns a chains x chains table of the number of days both chains were linked. The diagonal is the number of
+    # links of each chain.
+    def co_occurrence(self) -> [list]:
+        if numpy is None:
+            # Every byte of a row is 0 or 1, so the set bits of the rows as ints and-ed together are the shared days.
+            masks = [int.from_bytes(row, "little") for row in self.values]
+            return [[bin(mask & other).count("1") for other in masks] for mask in masks]
+        values = self.values.astype(numpy.int32)
+        return (values @ values.T).tolist()
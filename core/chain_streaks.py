@@ -0,0 +1,137 @@
+import bisect
+import heapq
+
+
+# Keeps the runs of consecutive linked days of a chain, so streaks can be looked up without walking the chain day by
+# day. Runs are stored as (first, last) date ordinals, inclusive, sorted by first day. Adding or removing a link
+# finds its neighbouring runs with a binary search and merges or splits them.
+class Chain_Streaks:
+    def __init__(self):
+        self._firsts = []
+        self._lasts = []
+        # Heap of (-length, first, last) of every run. Runs that have been merged or split are left in the heap and
+        # skipped once they reach the top.
+        self._longest_runs = []
+
+    # Creates the runs from date ordinals of links in increasing order.
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        streaks = cls()
+        for ordinal in ordinals:
+            if streaks._lasts and streaks._lasts[-1] == ordinal - 1:
+                streaks._lasts[-1] = ordinal
+            else:
+                streaks._firsts.append(ordinal)
+                streaks._lasts.append(ordinal)
+        streaks._longest_runs = [
+            (first - last - 1, first, last)
+            for first, last in zip(streaks._firsts, streaks._lasts)
+        ]
+        heapq.heapify(streaks._longest_runs)
+        return streaks
+
+    # Index of the last run starting at or before ordinal, or -1.
+    def _find(self, ordinal: int) -> int:
+        return bisect.bisect_right(self._firsts, ordinal) - 1
+
+    def add(self, ordinal: int):
+        index = self._find(ordinal)
+        if index >= 0 and ordinal <= self._lasts[index]:
+            return
+
+        joins_previous = index >= 0 and self._lasts[index] == ordinal - 1
+        joins_next = (
+            index + 1 < len(self._firsts) and self._firsts[index + 1] == ordinal + 1
+        )
+        if joins_previous and joins_next:
+            self._lasts[index] = self._lasts.pop(index + 1)
+            del self._firsts[index + 1]
+        elif joins_previous:
+            self._lasts[index] = ordinal
+        elif joins_next:
+            index += 1
+            self._firsts[index] = ordinal
+        else:
+            index += 1
+            self._firsts.insert(index, ordinal)
+            self._lasts.insert(index, ordinal)
+        self._push_run(index)
+
+    def remove(self, ordinal: int):
+        index = self._find(ordinal)
+        if index < 0 or ordinal > self._lasts[index]:
+            return
+
+        first, last = self._firsts[index], self._lasts[index]
+        if first == last:
+            del self._firsts[index]
+            del self._lasts[index]
+            return
+        if ordinal == first:
+            self._firsts[index] = ordinal + 1
+        elif ordinal == last:
+            self._lasts[index] = ordinal - 1
+        else:
+            self._lasts[index] = ordinal - 1
+            self._firsts.insert(index + 1, ordinal + 1)
+            self._lasts.insert(index + 1, last)
+            self._push_run(index + 1)
+        self._push_run(index)
+
+    def _push_run(self, index: int):
+        first, last = self._firsts[index], self._lasts[index]
+        heapq.heappush(self._longest_runs, (first - last - 1, first, last))
+        # Rebuilds the heap once it's mostly stale runs so it doesn't grow with every edit.
+        if len(self._longest_runs) > 2 * len(self._firsts) + 64:
+            self._longest_runs = [
+                (first - last - 1, first, last)
+                for first, last in zip(self._firsts, self._lasts)
+            ]
+            heapq.heapify(self._longest_runs)
+
+    # Returns (first, last) of the run containing ordinal, or None if the day has no link.
+    def get_run(self, ordinal: int):
+        index = self._find(ordinal)
+        if index >= 0 and ordinal <= self._lasts[index]:
+            return (self._firsts[index], self._lasts[index])
+        return None
+
+    # Returns the number of consecutive linked days up to and including ordinal. A day without a link doesn't break
+    # the streak until the day is over, so it counts the streak up to the day before instead.
+    def get_streak(self, ordinal: int) -> int:
+        index = self._find(ordinal)
+        if index < 0:
+            return 0
+        if ordinal <= self._lasts[index]:
+            return ordinal - self._firsts[index] + 1
+        if self._lasts[index] == ordinal - 1:
+            return self._lasts[index] - self._firsts[index] + 1
+        return 0
+
+    # Returns (first, last) of the longest run, or None if there are no links. Ties go to the earliest run.
+    def get_longest_run(self):
+        while self._longest_runs:
+            _, first, last = self._longest_runs[0]
+            index = self._find(first)
+            if (
+                index >= 0
+                and self._firsts[index] == first
+                and self._lasts[index] == last
+            ):
+                return (first, last)
+            heapq.heappop(self._longest_runs)
+        return None
+
+    def get_longest_streak(self) -> int:
+        run = self.get_longest_run()
+        if run is None:
+            return 0
+        return run[1] - run[0] + 1
+
+    # Yields (first, last) of every run that overlaps the days from first to last, inclusive.
+    def runs(self, first: int, last: int):
+        index = max(self._find(first), 0)
+        while index < len(self._firsts) and self._firsts[index] <= last:
+            if self._lasts[index] >= first:
+                yield (self._firsts[index], self._lasts[index])
+            index += 1
@@ -0,0 +1,102 @@
+import bisect
+import re
+
+_token_pattern = re.compile(r"\w+")
+_query_pattern = re.compile(r'"([^"]*)"|(\S+)')
+
+
+# Splits text into lowercase words.
+def tokenize(text: str) -> [str]:
+    return _token_pattern.findall(text.lower())
+
+
+# Inverted index from words to the comments containing them. Comments are keyed by (chain name, date ordinal).
+# Queries are made of words and "quoted phrases", and a comment matches when it has every one of them. Words match
+# any word they're the start of, so "sic" finds "sick". Phrases match whole words in that order.
+class Comment_Index:
+    def __init__(self):
+        self._postings = {}  # token: {(chain, ordinal)}
+        self._tokens = {}  # (chain, ordinal): [token, ...]
+        # Every token in _postings, sorted so tokens starting with a prefix are next to each other.
+        self._sorted_tokens = []
+
+    def set_comment(self, chain, ordinal: int, comment: str):
+        self.remove_comment(chain, ordinal)
+        key = (chain, ordinal)
+        tokens = tokenize(comment)
+        self._tokens[key] = tokens
+        for token in set(tokens):
+            if token not in self._postings:
+                self._postings[token] = set()
+                bisect.insort(self._sorted_tokens, token)
+            self._postings[token].add(key)
+
+    def remove_comment(self, chain, ordinal: int):
+        key = (chain, ordinal)
+        for token in set(self._tokens.pop(key, ())):
+            keys = self._postings[token]
+            keys.discard(key)
+            if not keys:
+                del self._postings[token]
+                del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+
+    def remove_chain(self, chain):
+        for key in [key for key in self._tokens if key[0] == chain]:
+            self.remove_comment(*key)
+
+    def rename_chain(self, current_name, new_name):
+        for key in [key for key in self._tokens if key[0] == current_name]:
+            tokens = self._tokens[key]
+            self.remove_comment(*key)
+            self.set_comment(new_name, key[1], " ".join(tokens))
+
+    # Returns the set of keys with a token starting with prefix.
+    def _prefix_keys(self, prefix: str) -> set:
+        keys = set()
+        index = bisect.bisect_left(self._sorted_tokens, prefix)
+        while index < len(self._sorted_tokens) and self._sorted_tokens[
+            index
+        ].startswith(prefix):
+            keys |= self._postings[self._sorted_tokens[index]]
+            index += 1
+        return keys
+
+    # Returns the (chain, ordinal) of every comment matching query, ordered by date and then chain.
+    def search(self, query: str) -> [tuple]:
+        words = []
+        phrases = []
+        for phrase, word in _query_pattern.findall(query):
+            if phrase:
+                phrases.append(tokenize(phrase))
+            else:
+                words += tokenize(word)
+        phrases = [phrase for phrase in phrases if phrase]
+        if not words and not phrases:
+            return []
+
+        # Checks the rarest words first so the candidates shrink as fast as possible.
+        candidate_sets = [self._prefix_keys(word) for word in words]
+        candidate_sets += [
+            self._postings.get(token, set()) for phrase in phrases for token in phrase
+        ]
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for keys in candidate_sets[1:]:
+            if not candidates:
+                break
+            candidates &= keys
+
+        matches = [
+            key
+            for key in candidates
+            if all(_contains_phrase(self._tokens[key], phrase) for phrase in phrases)
+        ]
+        return sorted(matches, key=lambda key: (key[1], key[0]))
+
+
+def _contains_phrase(tokens: list, phrase: list) -> bool:
+    length = len(phrase)
+    return any(
+        tokens[index : index + length] == phrase
+        for index in range(len(tokens) - length + 1)
+    )
@@ -1,16 +1,22 @@
-import json
 import logging
+import threading
 from pathlib import Path
 from copy import deepcopy
-from datetime import datetime
-
-from core.helpers import Event
+from contextlib import contextmanager
+from core.helpers import Event, Change
+from core.storage import Storage, Json_Storage, write_file
+from core.serializers import Serializer, dumps_json
+from core.backups import Backup_Store, Retention_Policy
 
 
 logging.basicConfig()
 
 
 class Data_Handler:
+    # Data is kept in storage, which defaults to a Json_Storage at json_path. The journal, async_writes and serializer
+    # options are passed on to it (see Json_Storage).
+    # Backups are kept in backup_dir_path (by default a backups directory next to json_path) and thinned out by
+    # retention_policy. With backup_on_load, a backup is taken every time the data is loaded.
     def __init__(
         self,
         name: str,
@@ -18,15 +24,46 @@ class Data_Handler:
         backup_dir_path: str = None,
         default_data={},
         logging_level: int = logging.WARN,
+        journal: bool = False,
+        journal_compact_threshold: int = 500,
+        async_writes: bool = False,
+        serializer: Serializer = None,
+        storage: Storage = None,
+        backup_on_load: bool = False,
+        retention_policy: Retention_Policy = None,
     ):
         self._json_path = Path(json_path)
         if backup_dir_path is None:
             self._backup_dir_path = self._json_path.parent / "backups"
         else:
             self._backup_dir_path = Path(backup_dir_path)
+        self._retention_policy = retention_policy
+        self._backup_store = Backup_Store(
+            self._backup_dir_path / self._json_path.stem,
+            retention_policy=retention_policy,
+            name=name,
+        )
+        self._backup_on_load = backup_on_load
+
+        if storage is None:
+            storage = Json_Storage(
+                self._json_path,
+                name=name,
+                journal=journal,
+                journal_compact_threshold=journal_compact_threshold,
+                async_writes=async_writes,
+                serializer=serializer,
+            )
+        self._storage = storage
+
+        self._batch_depth = 0
+        self._batch_changes = []
+        self._batch_save_json = False
+        self._batch_events = {}  # event: [change, ...]
 
         self._default_data = default_data
-        self.update_event = Event()
+        # Events are deferred so a burst of edits reaches listeners as one call (see Event).
+        self.update_event = Event(deferred=True)
         self._logger = logging.getLogger(name)
         self._logger.setLevel(logging_level)
 
@@ -35,46 +72,185 @@ class Data_Handler:
     def _get_data_json(self):
         return self._data
 
-    def _load_json(self, path=None):
+    # Sets the handler's data from data in the json format. Subclasses can override this together with
+    # _get_data_json to keep their data in a different format in memory.
+    def _set_data_json(self, data):
+        self._data = data
+
+    def _load_json(self):
         try:
-            if path is None:
-                path = self._json_path
-            if path.is_file():
-                with open(path, "r") as file:
-                    self._data = json.loads(file.read())
-                    self._logger.info(f"Loaded data from '{path}'.")
-            else:
-                self._data = deepcopy(self._default_data)
+            data = self._storage.load()
+            if data is None:
+                self._set_data_json(deepcopy(self._default_data))
                 self.save_json()
+                if self._backup_on_load:
+                    self.backup()
+            else:
+                # The backup is of the data as it was stored, before _set_data_json converts it to the current format.
+                if self._backup_on_load:
+                    self._backup_store.add(data)
+                self._set_data_json(data)
+                if self._storage.should_compact():
+                    self.compact_journal()
         except Exception as e:
-            self._logger.error(f"Error loading data from {path}", exc_info=e)
+            self._logger.error(f"Error loading data from {self._storage}", exc_info=e)
             raise e
 
+    # Saves all of the data to storage, or to a json file at path.
     def save_json(self, path=None):
-        if path is None:
-            path = self._json_path
+        if self._batch_depth and path is None:
+            self._batch_save_json = True
+            return
         try:
-            if not path.exists():
-                path.parent.mkdir(parents=True, exist_ok=True)
-                path.touch(exist_ok=True)
-                self._logger.info(f"Created path '{path}'.")
-
-            with open(path, "w") as file:
-                serialized_json = json.dumps(self._data, indent=1)
-                file.write(serialized_json)
+            if path is None:
+                self._save_storage()
+            else:
+                write_file(Path(path), dumps_json(self._get_data_json(), indent=1))
                 self._logger.info(f"Saved data to '{path}'.")
-            self.update_event.call()
+            self._call_event(self.update_event, Change("all"))
         except Exception as e:
             self._logger.error(f"Error saving data to {path}", exc_info=e)
             raise e
 
+    # Saves changes that have already been made to the data. Each change is created with set_change or
+    # delete_change. If the storage can't save the changes on their own, all of the data is saved.
+    def _save_changes(self, *changes):
+        if self._batch_depth:
+            self._batch_changes += changes
+            return
+
+        try:
+            compact = self._save_storage_changes(list(changes))
+        except Exception as e:
+            self._logger.error(f"Error saving changes to {self._storage}", exc_info=e)
+            raise e
+
+        if compact:
+            self.compact_journal()
+        else:
+            self._call_event(self.update_event, Change("json_changes", new=changes))
+
+    # Saves all of the data to storage. Subclasses that split their data between several storages override this
+    # together with _save_storage_changes.
+    def _save_storage(self):
+        self._storage.save(self._get_data_json())
+
+    # Saves changes to storage. Returns True if all of the data should be saved instead, either because the storage
+    # can't save changes on their own or to compact the changes.
+    def _save_storage_changes(self, changes: list) -> bool:
+        if not self._storage.can_save_changes():
+            return True
+        self._storage.save_changes(changes)
+        return self._storage.should_compact()
+
+    # Folds saved changes into a full save of the data.
+    def compact_journal(self):
+        self._logger.info(f"Compacting changes in {self._storage}.")
+        self.save_json()
+
+    # Waits until every save has been written to the disk.
+    def flush(self):
+        self._storage.flush()
+
+    # Waits until every save has been written to the disk and closes the storage. The handler can't be used
+    # afterwards.
+    def close(self):
+        self._storage.close()
+
+    # Saving and events are deferred until the outermost batch exits. Then the data is saved once and each event that
+    # would have been called is called once with all of its changes.
+    #   with handler.batch():
+    #       ...
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._end_batch()
+
+    def _end_batch(self):
+        changes, self._batch_changes = self._batch_changes, []
+        save_json, self._batch_save_json = self._batch_save_json, False
+        events, self._batch_events = self._batch_events, {}
+
+        if save_json:
+            self.save_json()
+        elif changes:
+            self._save_changes(*changes)
+        for event, event_changes in events.items():
+            event.call(event_changes)
+
+    # Calls event with a list of changes (see Change), or delays it until the end of the current batch.
+    def _call_event(self, event: Event, *changes: Change):
+        if not self._batch_depth:
+            event.call(list(changes))
+        else:
+            self._batch_events.setdefault(event, []).extend(changes)
+
+    # Takes a backup, or writes the data as a json file to path.
     def _backup_json(self, path=None):
         if path is None:
-            now = (
-                datetime.now()
-                .replace(tzinfo=None, microsecond=0)
-                .isoformat()
-                .replace(":", ".")
-            )
-            path = self._backup_dir_path / f"{now}_{self._json_path.name}"
-        self.save_json(path)
\ No newline at end of file
+            self.backup()
+        else:
+            self.save_json(path)
+
+    # Takes a backup of the data and returns its time. Backups the retention policy no longer keeps are deleted.
+    def backup(self):
+        return self._backup_store.add(self._get_data_json())
+
+    # Returns the times of every backup, oldest first.
+    def list_backups(self):
+        return self._backup_store.list_backups()
+
+    # Replaces the data with the newest backup taken at or before time, or the newest backup if time is None.
+    def restore_backup(self, time=None):
+        self._set_data_json(self._backup_store.restore(time))
+        self._logger.info("Restored data from backup.")
+        self.save_json()
+
+
+# Stands in for a handler until it's first used, so importing a module with a handler doesn't read any files.
+# Attributes are looked up on the handler, which is created by calling factory with no arguments. The factory can be
+# replaced with set_factory until then.
+class Lazy_Handler:
+    def __init__(self, factory):
+        self._factory = factory
+        self._handler = None
+        self._lock = threading.Lock()
+
+    def set_factory(self, factory):
+        with self._lock:
+            if self._handler is not None:
+                raise RuntimeError("Handler has already been created.")
+            self._factory = factory
+
+    def is_created(self) -> bool:
+        return self._handler is not None
+
+    def get_handler(self) -> Data_Handler:
+        # Creating the handler on another thread (see prefetch_handler) makes this wait for it instead of creating a
+        # second one.
+        with self._lock:
+            if self._handler is None:
+                self._handler = self._factory()
+            return self._handler
+
+    # Creates the handler on a background thread.
+    def prefetch_handler(self) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.get_handler, name="Handler prefetch", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def __getattr__(self, name):
+        return getattr(self.get_handler(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super(Lazy_Handler, self).__setattr__(name, value)
+        else:
+            setattr(self.get_handler(), name, value)
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from core.chain_handler import Chain_Handler, chain_handler
+from core.todo_handler import Todo_Handler, todo_handler
+from core.sqlite_storage import Chain_Sqlite_Storage, Todo_Sqlite_Storage
+from core.serializers import get_serializer
+
+
+# Sets where and how the shared handlers store their data. Must be called before the handlers are first used.
+# With use_sqlite, both handlers store their data in data_dir/scheduler.db, importing their json files the first time.
+# Otherwise the json files are written in the format named by serializer (see get_serializer).
+# With backup_on_load, each handler takes a backup when it's loaded.
+# journal and async_writes are passed on to the json storages of the handlers (see Json_Storage).
+def configure_handlers(
+    data_dir="data",
+    use_sqlite=False,
+    sharded_chains=False,
+    serializer="json",
+    backup_on_load=False,
+    journal=False,
+    async_writes=False,
+):
+    data_dir = Path(data_dir)
+    chains_json_path = data_dir / "chains.json"
+    todo_json_path = data_dir / "todo.json"
+    db_path = data_dir / "scheduler.db"
+
+    def create_chain_handler():
+        storage = None
+        if use_sqlite:
+            storage = Chain_Sqlite_Storage(db_path, migrate_from=chains_json_path)
+        return Chain_Handler(
+            chains_json_path,
+            journal=journal,
+            async_writes=async_writes,
+            serializer=get_serializer(serializer),
+            storage=storage,
+            sharded=sharded_chains,
+            backup_on_load=backup_on_load,
+        )
+
+    def create_todo_handler():
+        storage = None
+        if use_sqlite:
+            storage = Todo_Sqlite_Storage(db_path, migrate_from=todo_json_path)
+        return Todo_Handler(
+            todo_json_path,
+            journal=journal,
+            async_writes=async_writes,
+            serializer=get_serializer(serializer),
+            storage=storage,
+            backup_on_load=backup_on_load,
+        )
+
+    chain_handler.set_factory(create_chain_handler)
+    todo_handler.set_factory(create_todo_handler)
+
+
+# Starts loading the shared handlers on background threads, e.g. while the window is being built.
+def prefetch_handlers():
+    return [
+        chain_handler.prefetch_handler(),
+        todo_handler.prefetch_handler(),
+    ]
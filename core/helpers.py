@@ -1,10 +1,32 @@
 import datetime
+import functools
+import math
+import threading
+import time
 from calendar import monthrange
 
+_event_scheduler = None
+
+
+# Sets the function deferred events use to run a callback later, called as scheduler(callback, delay_ms). A GUI sets
+# one that runs the callback from its event loop. Without one, deferred events call their functions right away.
+def set_event_scheduler(scheduler):
+    global _event_scheduler
+    _event_scheduler = scheduler
+
 
 class Event:
-    def __init__(self):
+    # A deferred event collects its calls and delivers them as one call on a later turn of the event loop, once
+    # debounce_ms have passed since the last call. List arguments of the collected calls are joined together and
+    # other arguments keep their latest value. Calls are delivered right away if there's no event scheduler or the
+    # event isn't called from the main thread.
+    def __init__(self, deferred=False, debounce_ms=0):
         self._connected_functions = []
+        self._deferred = deferred
+        self._debounce_ms = debounce_ms
+        self._pending_calls = []
+        self._scheduled = False
+        self._last_call_time = 0
 
     def connect(self, func):
         # Can be used as a decorator or called on already existing functions.
@@ -16,10 +38,98 @@ class Event:
             self._connected_functions.remove(func)
 
     def call(self, *args, **kwargs):
-        for func in self._connected_functions:
+        if (
+            not self._deferred
+            or _event_scheduler is None
+            or threading.current_thread() is not threading.main_thread()
+        ):
+            self._call_functions(args, kwargs)
+            return
+
+        self._pending_calls.append((args, kwargs))
+        self._last_call_time = time.monotonic()
+        if not self._scheduled:
+            self._scheduled = True
+            _event_scheduler(self._on_scheduled, self._debounce_ms)
+
+    def _on_scheduled(self):
+        # Calls since this was scheduled push the delivery back.
+        remaining_ms = (
+            self._debounce_ms - (time.monotonic() - self._last_call_time) * 1000
+        )
+        if remaining_ms > 0:
+            _event_scheduler(self._on_scheduled, math.ceil(remaining_ms))
+            return
+        self._scheduled = False
+        self.flush()
+
+    # Delivers the collected calls of a deferred event right away.
+    def flush(self):
+        if self._pending_calls:
+            calls, self._pending_calls = self._pending_calls, []
+            self._call_functions(*_merge_calls(calls))
+
+    def _call_functions(self, args, kwargs):
+        for func in list(self._connected_functions):
             func(*args, **kwargs)
 
 
+# Merges (args, kwargs) of several calls into one. List arguments are joined in the order of the calls, and other
+# arguments keep the value of the last call.
+def _merge_calls(calls) -> (tuple, dict):
+    args = list(calls[-1][0])
+    for index, value in enumerate(args):
+        if isinstance(value, list):
+            args[index] = [
+                item
+                for call_args, _ in calls
+                if index < len(call_args) and isinstance(call_args[index], list)
+                for item in call_args[index]
+            ]
+    kwargs = {}
+    for _, call_kwargs in calls:
+        kwargs.update(call_kwargs)
+    return (tuple(args), kwargs)
+
+
+# Describes a change made by a handler. Handler events are called with a list of the changes since they were last
+# called, so listeners can update only what changed. kind says what changed and which other fields are set:
+#   "all": Anything may have changed.
+#   "json_changes": Saved changes to the json format of the data. new is a list of changes from set_change,
+#       insert_change and delete_change.
+#   "link": The link of chain name at date start (and end) changed from old to new.
+#   "comment": The comment of chain name at date start (and end) changed from old to new. None means no comment.
+#   "chain_order": The chain order changed from old to new.
+#   "chain_created", "chain_deleted": Chain name was created or deleted.
+#   "chain_renamed": A chain was renamed from old to new.
+#   "todo_item_changed": The fields of the todo item with id name changed from old to new, as dicts without children.
+#   "todo_item_inserted": The todo item with id name was inserted. new is the item.
+#   "todo_item_deleted": The todo item with id name was deleted. old is the item, and new is the list of its children
+#       that took its place, or None.
+class Change:
+    def __init__(self, kind: str, name=None, start=None, end=None, old=None, new=None):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field}={value!r}"
+            for field, value in vars(self).items()
+            if field != "kind" and value is not None
+        )
+        return f"Change({self.kind!r}{', ' if fields else ''}{fields})"
+
+
+# Returns True if changes is None or has a change of kind "all", meaning listeners have to assume that anything
+# changed.
+def changes_all(changes) -> bool:
+    return changes is None or any(change.kind == "all" for change in changes)
+
+
 def format_date_iii(year=None, month=None, day=None, date=None) -> (int, int, int):
     # Return year, month, and day as a tuple of integers.
     if date is not None:
@@ -55,6 +165,38 @@ def format_date_sss(year=None, month=None, day=None, date=None) -> (str, str, st
     return (str(year), str(month), str(day))
 
 
+def format_date_ordinal(year=None, month=None, day=None, date=None) -> int:
+    # Return the proleptic Gregorian ordinal of the date, as returned by datetime.date.toordinal.
+    if date is not None and year is None and month is None and day is None:
+        return date.toordinal()
+    return datetime.date(*format_date_iii(year, month, day, date)).toordinal()
+
+
+# Returns the date of a "mm/dd/yy", "mm/dd/yyyy" or "mm/dd" string, or None if it isn't a valid date. Dates without a
+# year are in the current year. Results are cached, since the same few strings are parsed over and over.
+def date_string_to_date(string: str) -> datetime.date:
+    return _parse_date_string(string, datetime.date.today().year)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_string(string: str, current_year: int) -> datetime.date:
+    split_string = string.split("/")
+    try:
+        if len(split_string) == 3:
+            month, day, year = map(int, split_string)
+            # Two digit years are in the 2000s.
+            if len(split_string[2].strip()) <= 2:
+                year += 2000
+        elif len(split_string) == 2:
+            month, day = map(int, split_string)
+            year = current_year
+        else:
+            return None
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
 def days_in_month(year, month) -> int:
     # Returns how many days there are in a given month.
     return monthrange(int(year), int(month))[1]
@@ -76,4 +218,4 @@ class Date_Iterator:
     def get_dates(self, i: int):
         for _ in range(i):
             yield self.date
-            self.date += self.timedelta
\ No newline at end of file
+            self.date += self.timedelta
@@ -0,0 +1,357 @@
+import itertools
+import json
+import re
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Converts data in the json format to bytes and back. Every format can be told apart from the others by its first
+# bytes, so load_data can read a file without knowing which serializer wrote it.
+class Serializer:
+    def dumps(self, data) -> bytes:
+        raise NotImplementedError()
+
+    def loads(self, raw: bytes):
+        raise NotImplementedError()
+
+
+# Standard library json. indent=None writes compact json without any whitespace.
+class Json_Serializer(Serializer):
+    def __init__(self, indent: int = None):
+        self._indent = indent
+
+    def dumps(self, data) -> bytes:
+        return dumps_json(data, self._indent).encode()
+
+    def loads(self, raw: bytes):
+        return loads_json(raw)
+
+
+# Compact json written with orjson when it's installed, or the standard library otherwise. orjson has a fixed limit
+# on nesting, so deeper data is left to the standard library.
+class Fast_Json_Serializer(Json_Serializer):
+    def dumps(self, data) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(data)
+            except orjson.JSONEncodeError:
+                pass
+        return super(Fast_Json_Serializer, self).dumps(data)
+
+    def loads(self, raw: bytes):
+        if orjson is not None:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+        return super(Fast_Json_Serializer, self).loads(raw)
+
+
+# Binary format with a one byte tag per value. Lists that only hold the ints 0 and 1, like the months of a chain,
+# are stored as bits.
+# Lists and dicts are read and written with a stack instead of recursion, so data of any depth can be packed.
+class Packed_Serializer(Serializer):
+    magic = b"SCHP\x01"
+
+    _NONE = 0
+    _FALSE = 1
+    _TRUE = 2
+    _INT = 3
+    _FLOAT = 4
+    _STR = 5
+    _LIST = 6
+    _DICT = 7
+    _BITS = 8
+
+    def dumps(self, data) -> bytes:
+        out = bytearray(self.magic)
+        # Iterators of the values left to write in each list and dict being written. Dicts write their keys and values
+        # in turn.
+        stack = [iter((data,))]
+        while stack:
+            for value in stack[-1]:
+                items = self._dump(value, out)
+                if items is not None:
+                    stack.append(items)
+                    break
+            else:
+                stack.pop()
+        return bytes(out)
+
+    # Writes a value, or only the tag and length of a list or dict. Returns an iterator of the values in the list or
+    # dict, which are written next.
+    def _dump(self, value, out: bytearray):
+        if value is None:
+            out.append(self._NONE)
+        elif value is True:
+            out.append(self._TRUE)
+        elif value is False:
+            out.append(self._FALSE)
+        elif type(value) is int:
+            out.append(self._INT)
+            # Zigzag encoding keeps small negative numbers short.
+            _dump_varint(value * 2 if value >= 0 else -value * 2 - 1, out)
+        elif type(value) is float:
+            out.append(self._FLOAT)
+            out += struct.pack("<d", value)
+        elif isinstance(value, str):
+            encoded = value.encode()
+            out.append(self._STR)
+            _dump_varint(len(encoded), out)
+            out += encoded
+        elif isinstance(value, (list, tuple)):
+            if value and all(type(item) is int and 0 <= item <= 1 for item in value):
+                out.append(self._BITS)
+                _dump_varint(len(value), out)
+                bits = bytearray((len(value) + 7) // 8)
+                for index, item in enumerate(value):
+                    if item:
+                        bits[index >> 3] |= 1 << (index & 7)
+                out += bits
+            else:
+                out.append(self._LIST)
+                _dump_varint(len(value), out)
+                return iter(value)
+        elif isinstance(value, dict):
+            out.append(self._DICT)
+            _dump_varint(len(value), out)
+            return itertools.chain.from_iterable(
+                (str(key), item) for key, item in value.items()
+            )
+        else:
+            raise TypeError(f"Can not pack {type(value).__name__}.")
+        return None
+
+    def loads(self, raw: bytes):
+        if not raw.startswith(self.magic):
+            raise ValueError("Data is not in the packed format.")
+        raw = memoryview(raw)
+        index = len(self.magic)
+        # [list or dict, values left to read, key read for the next dict value] of each list and dict being read.
+        stack = []
+        while True:
+            value, index, length = self._load(raw, index)
+            if not stack:
+                data = value
+            elif isinstance(stack[-1][0], list):
+                stack[-1][0].append(value)
+                stack[-1][1] -= 1
+            elif stack[-1][2] is None:
+                stack[-1][2] = value
+            else:
+                stack[-1][0][stack[-1][2]] = value
+                stack[-1][2] = None
+                stack[-1][1] -= 1
+            if length:
+                stack.append([value, length, None])
+            while stack and not stack[-1][1]:
+                stack.pop()
+            if not stack:
+                return data
+
+    # Reads a value at index, or an empty list or dict. Returns the value, the index after it and the number of values
+    # to read into the list or dict.
+    def _load(self, raw: memoryview, index: int):
+        tag = raw[index]
+        index += 1
+        if tag == self._NONE:
+            return None, index, 0
+        if tag == self._TRUE:
+            return True, index, 0
+        if tag == self._FALSE:
+            return False, index, 0
+        if tag == self._INT:
+            zigzag, index = _load_varint(raw, index)
+            return (zigzag >> 1) ^ -(zigzag & 1), index, 0
+        if tag == self._FLOAT:
+            return struct.unpack_from("<d", raw, index)[0], index + 8, 0
+        if tag == self._STR:
+            length, index = _load_varint(raw, index)
+            return str(raw[index : index + length], "utf-8"), index + length, 0
+        if tag == self._BITS:
+            length, index = _load_varint(raw, index)
+            bits = raw[index : index + (length + 7) // 8]
+            value = [bits[i >> 3] >> (i & 7) & 1 for i in range(length)]
+            return value, index + len(bits), 0
+        if tag == self._LIST:
+            length, index = _load_varint(raw, index)
+            return [], index, length
+        if tag == self._DICT:
+            length, index = _load_varint(raw, index)
+            return {}, index, length
+        raise ValueError(f"Unknown tag {tag} at byte {index - 1}.")
+
+
+def _dump_varint(number: int, out: bytearray):
+    while number >= 0x80:
+        out.append(number & 0x7F | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def _load_varint(raw: memoryview, index: int) -> (int, int):
+    number = 0
+    shift = 0
+    while True:
+        byte = raw[index]
+        index += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, index
+        shift += 7
+
+
+# Returns a serializer by name: "json", "indented_json", "fast_json" or "packed".
+def get_serializer(name: str) -> Serializer:
+    if name == "json":
+        return Json_Serializer()
+    if name == "indented_json":
+        return Json_Serializer(indent=1)
+    if name == "fast_json":
+        return Fast_Json_Serializer()
+    if name == "packed":
+        return Packed_Serializer()
+    raise NameError(f"No serializer '{name}'")
+
+
+# Loads data written by any of the serializers.
+def load_data(raw: bytes):
+    if raw.startswith(Packed_Serializer.magic):
+        return Packed_Serializer().loads(raw)
+    return Fast_Json_Serializer().loads(raw)
+
+
+# Writes data as json with the json module, or without recursion if data is nested too deeply for it. indent=None
+# writes compact json without any whitespace.
+def dumps_json(data, indent: int = None) -> str:
+    try:
+        if indent is None:
+            return json.dumps(data, separators=(",", ":"))
+        return json.dumps(data, indent=indent)
+    except RecursionError:
+        return _dumps_deep_json(data, indent)
+
+
+# Reads json with the json module, or without recursion if it's nested too deeply for it.
+def loads_json(raw):
+    try:
+        return json.loads(raw)
+    except RecursionError:
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode()
+        return _loads_deep_json(raw)
+
+
+def _dumps_deep_json(data, indent: int = None) -> str:
+    key_separator = ":" if indent is None else ": "
+    parts = []
+    # [closing bracket, iterator of the (key, value) pairs left, whether a pair was written] of each list and dict
+    # being written. The data itself is the only value of the first level.
+    stack = [[None, iter(((None, data),)), False]]
+    while stack:
+        level = stack[-1]
+        pair = next(level[1], None)
+        if pair is None:
+            stack.pop()
+            if level[0] is not None:
+                if level[2] and indent is not None:
+                    parts.append("\n" + " " * (indent * (len(stack) - 1)))
+                parts.append(level[0])
+            continue
+
+        if level[0] is not None:
+            if level[2]:
+                parts.append(",")
+            if indent is not None:
+                parts.append("\n" + " " * (indent * (len(stack) - 1)))
+        level[2] = True
+        key, value = pair
+        if level[0] == "}":
+            # Keys that aren't strings are written like the json module does.
+            key = key if isinstance(key, str) else json.dumps(key)
+            parts.append(json.dumps(key) + key_separator)
+        if isinstance(value, dict):
+            parts.append("{")
+            stack.append(["}", iter(value.items()), False])
+        elif isinstance(value, (list, tuple)):
+            parts.append("[")
+            stack.append(["]", ((None, item) for item in value), False])
+        else:
+            parts.append(json.dumps(value))
+    return "".join(parts)
+
+
+_json_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def _loads_deep_json(text: str):
+    decoder = json.JSONDecoder()
+
+    def skip_whitespace(index: int) -> int:
+        return _json_whitespace.match(text, index).end()
+
+    # Reads the key of the next value of the dict on top of the stack and returns the index of the value.
+    def read_key(index: int) -> int:
+        if text[index : index + 1] != '"':
+            raise json.JSONDecodeError(
+                "Expecting property name enclosed in double quotes", text, index
+            )
+        key, index = json.decoder.scanstring(text, index + 1)
+        index = skip_whitespace(index)
+        if text[index : index + 1] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, index)
+        stack[-1][1] = key
+        return skip_whitespace(index + 1)
+
+    # [list or dict, key of the next dict value] of each list and dict being read.
+    stack = []
+    index = skip_whitespace(0)
+    while True:
+        bracket = text[index : index + 1]
+        if bracket in ("[", "{"):
+            value = [] if bracket == "[" else {}
+            index = skip_whitespace(index + 1)
+            if text[index : index + 1] != ("]" if bracket == "[" else "}"):
+                if stack:
+                    _add_json_value(stack[-1], value)
+                stack.append([value, None])
+                if bracket == "{":
+                    index = read_key(index)
+                continue
+            index += 1
+        else:
+            # Values other than lists and dicts are read by the json module.
+            value, index = decoder.raw_decode(text, index)
+        if stack:
+            _add_json_value(stack[-1], value)
+
+        # Closes every list and dict that ends after the value.
+        while stack:
+            index = skip_whitespace(index)
+            container = stack[-1][0]
+            separator = text[index : index + 1]
+            if separator == ",":
+                index = skip_whitespace(index + 1)
+                if isinstance(container, dict):
+                    index = read_key(index)
+                break
+            if separator != ("]" if isinstance(container, list) else "}"):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+            stack.pop()
+            value = container
+            index += 1
+        if not stack:
+            if skip_whitespace(index) != len(text):
+                raise json.JSONDecodeError("Extra data", text, index)
+            return value
+
+
+def _add_json_value(level: list, value):
+    if isinstance(level[0], list):
+        level[0].append(value)
+    else:
+        level[0][level[1]] = value
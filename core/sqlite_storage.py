@@ -0,0 +1,539 @@
+import datetime
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+from core.storage import Storage, Json_Storage
+import core.helpers as h
+
+
+# Stores data in a SQLite database, updating only the rows touched by each change. The database uses write-ahead
+# logging, so a crash never leaves it half written.
+# If the database has no data yet and migrate_from is the path of an existing json file, the json file is imported
+# once when the database is opened. The json file itself is left untouched.
+# Subclasses define the tables and how data and changes map to rows.
+class Sqlite_Storage(Storage):
+    def __init__(self, db_path, name: str = "Data", migrate_from=None):
+        self._db_path = Path(db_path)
+        self._logger = logging.getLogger(name)
+
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        # The storage may be opened on a background thread (see Lazy_Handler.prefetch_handler) and used on another,
+        # but never from two threads at once.
+        self._connection = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS storage_info (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._create_tables()
+
+        if migrate_from is not None and not self._has_data():
+            self._migrate(Path(migrate_from))
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self._db_path}')"
+
+    def _create_tables(self):
+        raise NotImplementedError()
+
+    # Name of the storage_info key marking that this storage's tables hold data. Tables of several storages can
+    # share one database file.
+    @property
+    def _info_key(self) -> str:
+        return f"{type(self).__name__}.initialized"
+
+    def _has_data(self) -> bool:
+        row = self._connection.execute(
+            "SELECT value FROM storage_info WHERE key = ?", (self._info_key,)
+        ).fetchone()
+        return row is not None
+
+    def _migrate(self, json_path: Path):
+        data = Json_Storage(json_path, journal=True).load()
+        if data is not None:
+            self.save(data)
+            self._logger.info(f"Migrated data from '{json_path}' to '{self._db_path}'.")
+
+    def load(self):
+        if not self._has_data():
+            return None
+        return self._load_rows()
+
+    def save(self, data):
+        with self._connection:
+            self._save_rows(data)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO storage_info (key, value) VALUES (?, ?)",
+                (self._info_key, "1"),
+            )
+        self._logger.info(f"Saved data to '{self._db_path}'.")
+
+    def save_changes(self, changes: list):
+        with self._connection:
+            for change in changes:
+                self._save_change(change)
+        self._logger.info(f"Saved {len(changes)} changes to '{self._db_path}'.")
+
+    def _load_rows(self):
+        raise NotImplementedError()
+
+    def _save_rows(self, data):
+        raise NotImplementedError()
+
+    def _save_change(self, change: dict):
+        raise NotImplementedError()
+
+    def close(self):
+        self._connection.close()
+
+
+# Stores Chain_Handler data. Only days with a chain link or a comment have rows, keyed by chain name and date
+# ordinal, so reading a date range of a chain is an index range scan.
+# Sharded chains (see Chain_Handler) keep the same rows. Each shard is a Chain_Sqlite_Shard reading and writing the
+# rows of one year, and the list of shards is kept in storage_info.
+class Chain_Sqlite_Storage(Sqlite_Storage):
+    def __init__(self, db_path, name: str = "Chains", migrate_from=None):
+        super(Chain_Sqlite_Storage, self).__init__(
+            db_path, name=name, migrate_from=migrate_from
+        )
+
+    def _create_tables(self):
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS chain_order (
+                position INTEGER PRIMARY KEY,
+                chain TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS chain_links (
+                chain TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                PRIMARY KEY (chain, day)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS chain_comments (
+                chain TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                comment TEXT NOT NULL,
+                PRIMARY KEY (chain, day)
+            ) WITHOUT ROWID;
+            """)
+
+    # Returns the date ordinals of every link of a chain from first to last, inclusive.
+    def load_links(self, chain_name, first: int, last: int) -> [int]:
+        return [
+            day
+            for (day,) in self._connection.execute(
+                "SELECT day FROM chain_links WHERE chain = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (chain_name, first, last),
+            )
+        ]
+
+    # Returns {date ordinal: comment} for every comment of a chain from first to last, inclusive.
+    def load_comments(self, chain_name, first: int, last: int) -> dict:
+        return dict(
+            self._connection.execute(
+                "SELECT day, comment FROM chain_comments WHERE chain = ? AND day BETWEEN ? AND ?",
+                (chain_name, first, last),
+            )
+        )
+
+    # Name of the storage_info key holding the list of shards, which is only set while the chains are sharded.
+    @property
+    def _shards_key(self) -> str:
+        return f"{type(self).__name__}.shards"
+
+    def shard(self, key: str):
+        return Chain_Sqlite_Shard(self, key)
+
+    def _load_chain_order(self) -> list:
+        return [
+            chain
+            for (chain,) in self._connection.execute(
+                "SELECT chain FROM chain_order ORDER BY position"
+            )
+        ]
+
+    # Returns the json of one year of every chain, in the format of a Chain_Handler shard.
+    def _load_year(self, year: str) -> dict:
+        first, last = _json_date_range([year])
+        chains = {}
+        chain_comments = {}
+        for chain in self._load_chain_order():
+            links = self.load_links(chain, first, last)
+            if links:
+                months = chains[chain] = {}
+                for day in links:
+                    date = datetime.date.fromordinal(day)
+                    if str(date.month) not in months:
+                        months[str(date.month)] = [0] * h.days_in_month(
+                            date.year, date.month
+                        )
+                    months[str(date.month)][date.day - 1] = 1
+            comments = self.load_comments(chain, first, last)
+            if comments:
+                months = chain_comments[chain] = {}
+                for day, comment in comments.items():
+                    date = datetime.date.fromordinal(day)
+                    months.setdefault(str(date.month), {})[str(date.day)] = comment
+        return {"chains": chains, "chain_comments": chain_comments}
+
+    # Replaces one year of every chain with the json of a Chain_Handler shard.
+    def _save_year(self, year: str, year_json: dict):
+        first, last = _json_date_range([year])
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM chain_links WHERE day BETWEEN ? AND ?", (first, last)
+            )
+            self._connection.execute(
+                "DELETE FROM chain_comments WHERE day BETWEEN ? AND ?", (first, last)
+            )
+            for chain, months in year_json["chains"].items():
+                self._insert_links(chain, [year], months)
+            for chain, months in year_json["chain_comments"].items():
+                self._insert_comments(chain, [year], months)
+
+    def _load_rows(self):
+        chain_order = self._load_chain_order()
+        shards = self._connection.execute(
+            "SELECT value FROM storage_info WHERE key = ?", (self._shards_key,)
+        ).fetchone()
+        if shards is not None:
+            return {"chain_order": chain_order, "shards": json.loads(shards[0])}
+
+        data = {
+            "chain_order": chain_order,
+            "chains": {chain: {} for chain in chain_order},
+            "chain_comments": {},
+        }
+
+        for chain, day in self._connection.execute(
+            "SELECT chain, day FROM chain_links"
+        ):
+            date = datetime.date.fromordinal(day)
+            months = data["chains"].setdefault(chain, {}).setdefault(str(date.year), {})
+            if str(date.month) not in months:
+                months[str(date.month)] = [0] * h.days_in_month(date.year, date.month)
+            months[str(date.month)][date.day - 1] = 1
+
+        for chain, day, comment in self._connection.execute(
+            "SELECT chain, day, comment FROM chain_comments"
+        ):
+            date = datetime.date.fromordinal(day)
+            days = (
+                data["chain_comments"]
+                .setdefault(chain, {})
+                .setdefault(str(date.year), {})
+                .setdefault(str(date.month), {})
+            )
+            days[str(date.day)] = comment
+        return data
+
+    # The main data of sharded chains only has the chain order and the list of shards. Their links and comments are
+    # saved through the shards.
+    def _save_rows(self, data):
+        self._connection.execute("DELETE FROM chain_order")
+        self._save_chain_order(data["chain_order"])
+        if "shards" in data:
+            self._save_shards(data["shards"])
+            return
+
+        self._connection.execute(
+            "DELETE FROM storage_info WHERE key = ?", (self._shards_key,)
+        )
+        self._connection.execute("DELETE FROM chain_links")
+        self._connection.execute("DELETE FROM chain_comments")
+        for chain, chain_json in data["chains"].items():
+            self._insert_links(chain, [], chain_json)
+        for chain, chain_json in data["chain_comments"].items():
+            self._insert_comments(chain, [], chain_json)
+
+    # Changes use json paths: ["chain_order"], ["chains", chain, year, month] or
+    # ["chain_comments", chain, year, month, day], where the date part can be cut short at any point.
+    def _save_change(self, change: dict):
+        path = change["path"]
+        if not path:
+            self._save_rows(change["value"])
+        elif path == ["chain_order"]:
+            self._connection.execute("DELETE FROM chain_order")
+            self._save_chain_order(change["value"])
+        elif path == ["shards"]:
+            self._save_shards(change["value"])
+        elif path[0] in ("chains", "chain_comments") and len(path) >= 2:
+            table = "chain_links" if path[0] == "chains" else "chain_comments"
+            chain, date_keys = path[1], path[2:]
+            first, last = _json_date_range(date_keys)
+            self._connection.execute(
+                f"DELETE FROM {table} WHERE chain = ? AND day BETWEEN ? AND ?",
+                (chain, first, last),
+            )
+            if change["op"] == "set":
+                if table == "chain_links":
+                    self._insert_links(chain, date_keys, change["value"])
+                else:
+                    self._insert_comments(chain, date_keys, change["value"])
+        else:
+            raise KeyError(f"Can not save change to {path}.")
+
+    def _save_shards(self, shards):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO storage_info (key, value) VALUES (?, ?)",
+            (self._shards_key, json.dumps(shards)),
+        )
+
+    def _save_chain_order(self, chain_order):
+        self._connection.executemany(
+            "INSERT INTO chain_order (position, chain) VALUES (?, ?)",
+            enumerate(chain_order),
+        )
+
+    def _insert_links(self, chain, date_keys, value):
+        self._connection.executemany(
+            "INSERT INTO chain_links (chain, day) VALUES (?, ?)",
+            (
+                (chain, day)
+                for day, link in _flatten_json_dates(date_keys, value)
+                if link
+            ),
+        )
+
+    def _insert_comments(self, chain, date_keys, value):
+        self._connection.executemany(
+            "INSERT INTO chain_comments (chain, day, comment) VALUES (?, ?, ?)",
+            (
+                (chain, day, comment)
+                for day, comment in _flatten_json_dates(date_keys, value)
+            ),
+        )
+
+
+# One year of a Chain_Sqlite_Storage, loaded and saved in the format of a Chain_Handler shard. Loading reads the year
+# of each chain through an index range scan.
+class Chain_Sqlite_Shard(Storage):
+    def __init__(self, storage: Chain_Sqlite_Storage, year: str):
+        self._storage = storage
+        self._year = year
+
+    def __repr__(self):
+        return f"{self._storage!r}.shard('{self._year}')"
+
+    def load(self):
+        return self._storage._load_year(self._year)
+
+    def save(self, data):
+        self._storage._save_year(self._year, data)
+
+    # Shard changes have paths of ["chains", chain, month, ...] or ["chain_comments", chain, month, ...], which are
+    # the paths of the whole data without the year.
+    def save_changes(self, changes: list):
+        self._storage.save_changes(
+            [
+                dict(
+                    change, path=change["path"][:2] + [self._year] + change["path"][2:]
+                )
+                for change in changes
+            ]
+        )
+
+
+# Stores Todo_Handler data as one row per todo item, with the tree kept through parent ids and positions.
+class Todo_Sqlite_Storage(Sqlite_Storage):
+    def __init__(self, db_path, name: str = "Todo", migrate_from=None):
+        super(Todo_Sqlite_Storage, self).__init__(
+            db_path, name=name, migrate_from=migrate_from
+        )
+
+    def _create_tables(self):
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS todo_items (
+                id INTEGER PRIMARY KEY,
+                parent INTEGER REFERENCES todo_items (id),
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                completed INTEGER NOT NULL,
+                due_date TEXT,
+                due_ordinal INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS todo_items_parent ON todo_items (parent, position);
+            CREATE INDEX IF NOT EXISTS todo_items_due_date ON todo_items (due_date);
+            """)
+        # Older databases have no due_ordinal column and kept date ordinals as text in due_date, where they were read
+        # back as ordinals. They are moved to the new column once.
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(todo_items)")
+        ]
+        if "due_ordinal" not in columns:
+            self._connection.execute(
+                "ALTER TABLE todo_items ADD COLUMN due_ordinal INTEGER"
+            )
+            self._connection.execute(
+                "UPDATE todo_items SET due_ordinal = CAST(due_date AS INTEGER), due_date = NULL "
+                "WHERE due_date GLOB '[0-9]*' AND NOT due_date GLOB '*[^0-9]*'"
+            )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS todo_items_due_ordinal ON todo_items (due_ordinal)"
+        )
+
+    def _load_rows(self):
+        items = {None: {"items": []}}
+        rows = self._connection.execute(
+            "SELECT id, parent, name, completed, due_date, due_ordinal FROM todo_items ORDER BY parent, position"
+        ).fetchall()
+        for row_id, _, name, completed, due_date, due_ordinal in rows:
+            item = {"id": row_id, "name": name, "completed": bool(completed)}
+            if due_ordinal is not None:
+                item["due_date"] = due_ordinal
+            elif due_date is not None:
+                item["due_date"] = due_date
+            items[row_id] = item
+        for row_id, parent, *_ in rows:
+            items[parent].setdefault("items", []).append(items[row_id])
+        return items[None]["items"]
+
+    def _save_rows(self, data):
+        self._connection.execute("DELETE FROM todo_items")
+        self._insert_items(data, None)
+
+    # Items keep their "id" as the id of their row. Items without one get a new id. Items below them are inserted
+    # with a stack instead of recursion, so trees of any depth can be saved.
+    def _insert_items(self, items, parent, first_position: int = 0):
+        # (iterator of the (position, item) pairs left, id of their parent) of each list of items being inserted.
+        stack = [(enumerate(items, first_position), parent)]
+        while stack:
+            positioned_items, parent = stack[-1]
+            for position, item in positioned_items:
+                cursor = self._connection.execute(
+                    "INSERT INTO todo_items (id, parent, position, name, completed, due_date, due_ordinal) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        item.get("id"),
+                        parent,
+                        position,
+                        item["name"],
+                        int(item.get("completed", False)),
+                        *_due_date_columns(item.get("due_date")),
+                    ),
+                )
+                if item.get("items"):
+                    stack.append((enumerate(item["items"]), cursor.lastrowid))
+                    break
+            else:
+                stack.pop()
+
+    # Changes use json paths of item indices joined by "items", e.g. [0, "items", 2] for the third child of the first
+    # item, optionally followed by a field name or "items".
+    def _save_change(self, change: dict):
+        path = change["path"]
+        op = change["op"]
+        if not path:
+            if op != "set":
+                raise KeyError(f"Can not save change to {path}.")
+            self._save_rows(change["value"])
+        elif isinstance(path[-1], str):
+            row_id = self._find_row(path[:-1])
+            field = path[-1]
+            if field == "items":
+                for (child_id,) in self._connection.execute(
+                    "SELECT id FROM todo_items WHERE parent = ?", (row_id,)
+                ).fetchall():
+                    self._delete_item(child_id)
+                if op == "set":
+                    self._insert_items(change["value"], row_id)
+            elif field in ("name", "completed"):
+                value = change.get("value")
+                if field == "completed":
+                    value = int(bool(value))
+                self._connection.execute(
+                    f"UPDATE todo_items SET {field} = ? WHERE id = ?", (value, row_id)
+                )
+            elif field == "due_date":
+                self._connection.execute(
+                    "UPDATE todo_items SET due_date = ?, due_ordinal = ? WHERE id = ?",
+                    (*_due_date_columns(change.get("value")), row_id),
+                )
+            else:
+                raise KeyError(f"Can not save change to {path}.")
+        else:
+            parent = self._find_row(path[:-2]) if len(path) > 1 else None
+            position = path[-1]
+            if op in ("set", "del"):
+                self._delete_item(self._find_row(path))
+            if op == "del":
+                self._shift_positions(parent, position + 1, -1)
+            elif op == "insert":
+                self._shift_positions(parent, position, 1)
+            if op in ("set", "insert"):
+                self._insert_items([change["value"]], parent, position)
+
+    # Returns the id of the row of the item at a json path.
+    def _find_row(self, path: list) -> int:
+        row_id = None
+        for position in path[::2]:
+            row = self._connection.execute(
+                "SELECT id FROM todo_items WHERE parent IS ? AND position = ?",
+                (row_id, position),
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"No todo item at {path}.")
+            row_id = row[0]
+        return row_id
+
+    # Deletes the row of an item and the rows of everything below it.
+    def _delete_item(self, row_id: int):
+        self._connection.execute(
+            """
+            WITH RECURSIVE subtree (id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT todo_items.id FROM todo_items JOIN subtree ON todo_items.parent = subtree.id
+            )
+            DELETE FROM todo_items WHERE id IN subtree
+            """,
+            (row_id,),
+        )
+
+    # Adds delta to the positions of the children of parent from first_position on.
+    def _shift_positions(self, parent, first_position: int, delta: int):
+        self._connection.execute(
+            "UPDATE todo_items SET position = position + ? WHERE parent IS ? AND position >= ?",
+            (delta, parent, first_position),
+        )
+
+
+# Returns the (due_date, due_ordinal) columns of a todo item due date. Due dates are date ordinals, or text that isn't
+# a date, and each is kept in its own column so they load back as the same type.
+def _due_date_columns(due_date) -> (str, int):
+    if isinstance(due_date, int):
+        return (None, due_date)
+    return (due_date, None)
+
+
+# Returns the first and last date ordinals covered by a json date path of [], [year], [year, month] or
+# [year, month, day].
+def _json_date_range(date_keys: list) -> (int, int):
+    if not date_keys:
+        return (datetime.date.min.toordinal(), datetime.date.max.toordinal())
+    year = int(date_keys[0])
+    if len(date_keys) == 1:
+        first = datetime.date(year, 1, 1)
+        last = datetime.date(year, 12, 31)
+    elif len(date_keys) == 2:
+        first = datetime.date(year, int(date_keys[1]), 1)
+        last = first.replace(day=h.days_in_month(first.year, first.month))
+    else:
+        first = last = datetime.date(year, int(date_keys[1]), int(date_keys[2]))
+    return (first.toordinal(), last.toordinal())
+
+
+# Yields (date ordinal, value) for every day in a json value found at date_keys. Months are either lists indexed by
+# day - 1 (chains) or dictionaries keyed by day (chain comments).
+def _flatten_json_dates(date_keys: list, value):
+    if len(date_keys) == 3:
+        yield (datetime.date(*map(int, date_keys)).toordinal(), value)
+    elif isinstance(value, list):
+        year, month = int(date_keys[0]), int(date_keys[1])
+        for day_index, day_value in enumerate(value):
+            yield (datetime.date(year, month, day_index + 1).toordinal(), day_value)
+    else:
+        for key, child_value in value.items():
+            yield from _flatten_json_dates(date_keys + [key], child_value)
@@ -0,0 +1,351 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from core.serializers import (
+    Serializer,
+    Json_Serializer,
+    load_data,
+    dumps_json,
+    loads_json,
+)
+
+
+# Interface for where a Data_Handler keeps its data. Data is passed in the json format, and changes are created with
+# set_change, insert_change and delete_change.
+class Storage:
+    # Returns the stored data, or None if nothing has been stored yet.
+    def load(self):
+        raise NotImplementedError()
+
+    # Replaces all of the stored data.
+    def save(self, data):
+        raise NotImplementedError()
+
+    # Saves changes that have already been applied to the handler's data.
+    def save_changes(self, changes: list):
+        raise NotImplementedError()
+
+    # Returns True when save_changes can save changes on their own. Otherwise the handler calls save with all of its
+    # data instead.
+    def can_save_changes(self) -> bool:
+        return True
+
+    # Returns True when the handler should call save with all of its data, for example to fold a journal into a
+    # new snapshot.
+    def should_compact(self) -> bool:
+        return False
+
+    # Returns a storage for one shard of the data, stored separately from the rest of it.
+    def shard(self, key: str):
+        raise NotImplementedError(f"{type(self).__name__} can not be sharded.")
+
+    # Waits until every save has reached the disk.
+    def flush(self):
+        pass
+
+    # Waits for every save and releases what the storage holds open. The storage can't be used afterwards.
+    def close(self):
+        self.flush()
+
+
+# Stores data in a json file. The file is written with serializer (compact json by default); any serializer's format
+# is recognized when loading.
+# When journal is True, changes are appended to a journal file next to the json file instead of rewriting the whole
+# file. The journal is replayed on load and should_compact returns True once it holds journal_compact_threshold
+# changes. Every change in the journal is numbered, and the json file records the number of the last change it
+# contains, so changes already in the json file are skipped if the program stopped before the journal was cleared.
+# When async_writes is True, files are written by a background thread so saving never waits on the disk.
+class Json_Storage(Storage):
+    def __init__(
+        self,
+        json_path,
+        name: str = "Data",
+        journal: bool = False,
+        journal_compact_threshold: int = 500,
+        async_writes: bool = False,
+        serializer: Serializer = None,
+        writer=None,
+    ):
+        self._json_path = Path(json_path)
+        self._serializer = Json_Serializer() if serializer is None else serializer
+        self._name = name
+        self._logger = logging.getLogger(name)
+
+        self._journal = journal
+        self._journal_path = self._json_path.with_name(
+            self._json_path.name + ".journal"
+        )
+        self._journal_compact_threshold = journal_compact_threshold
+        self._journal_length = 0
+        # Number of the last change saved.
+        self._journal_sequence = 0
+
+        # A writer passed in is shared with other storages, so only a writer created here is closed with the storage.
+        self._owns_writer = writer is None and async_writes
+        if self._owns_writer:
+            writer = File_Writer(name)
+        self._writer = writer
+
+    def __repr__(self):
+        return f"Json_Storage('{self._json_path}')"
+
+    def load(self):
+        if not self._json_path.is_file():
+            return None
+
+        with open(self._json_path, "rb") as file:
+            data = load_data(file.read())
+            self._logger.info(f"Loaded data from '{self._json_path}'.")
+        self._journal_sequence = 0
+        if _is_journal_snapshot(data):
+            self._journal_sequence = data["journal_sequence"]
+            data = data["data"]
+        if self._journal:
+            data = self._replay_journal(data)
+        return data
+
+    # Applies every change in the journal that isn't in the json file yet to data loaded from the json file and
+    # returns the result.
+    def _replay_journal(self, data):
+        self._journal_length = 0
+        if not self._journal_path.is_file():
+            return data
+
+        skipped = 0
+        with open(self._journal_path, "r") as file:
+            for line in file:
+                try:
+                    change = loads_json(line)
+                except json.JSONDecodeError:
+                    # Only the last change can be incomplete, which happens if the program stopped while writing it.
+                    self._logger.warning(
+                        f"Ignoring incomplete change at the end of '{self._journal_path}'."
+                    )
+                    break
+                # Changes written before changes were numbered have no number.
+                sequence = change.pop("seq", None)
+                if sequence is not None:
+                    if sequence <= self._journal_sequence:
+                        skipped += 1
+                        continue
+                    self._journal_sequence = sequence
+                data = apply_change(data, change)
+                self._journal_length += 1
+        self._logger.info(
+            f"Replayed {self._journal_length} changes from '{self._journal_path}' and skipped {skipped} changes "
+            "already in the json file."
+        )
+        return data
+
+    def save(self, data):
+        if self._journal:
+            data = {"journal_sequence": self._journal_sequence, "data": data}
+        self._write_file(self._json_path, self._serializer.dumps(data))
+        self._logger.info(f"Saved data to '{self._json_path}'.")
+
+        # The json file now contains every change in the journal.
+        if self._journal:
+            self._write_file(self._journal_path, "")
+            self._journal_length = 0
+
+    # Without a journal, changes can't be saved on their own (see can_save_changes).
+    def save_changes(self, changes: list):
+        if not self._journal:
+            return
+
+        serialized_changes = ""
+        for change in changes:
+            self._journal_sequence += 1
+            serialized_changes += (
+                dumps_json({"seq": self._journal_sequence, **change}) + "\n"
+            )
+        self._write_file(self._journal_path, serialized_changes, append=True)
+        self._journal_length += len(changes)
+        self._logger.info(f"Saved {len(changes)} changes to '{self._journal_path}'.")
+
+    # Shards are stored in a directory next to the json file named after it, e.g. data/chains/2024.json for
+    # data/chains.json. They share this storage's options and background writer.
+    def shard(self, key: str):
+        return Json_Storage(
+            self._json_path.with_suffix("") / f"{key}{self._json_path.suffix}",
+            name=self._name,
+            journal=self._journal,
+            journal_compact_threshold=self._journal_compact_threshold,
+            serializer=self._serializer,
+            writer=self._writer,
+        )
+
+    def can_save_changes(self) -> bool:
+        return self._journal
+
+    def should_compact(self) -> bool:
+        return self._journal and self._journal_length >= self._journal_compact_threshold
+
+    def _write_file(self, path: Path, text, append: bool = False):
+        if self._writer is None:
+            write_file(path, text, append)
+        else:
+            self._writer.write(path, text, append)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        if self._owns_writer:
+            self._writer.close()
+        else:
+            self.flush()
+
+
+# Writes files on a background thread. Pending writes to the same file are combined, so only the latest contents
+# of a file are written and appends to a file are written together.
+# Pending writes are flushed when the program exits. close stops the thread once they're written.
+class File_Writer:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+        self._pending = OrderedDict()  # path: (append, text)
+        self._writing = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"{name} writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def write(self, path: Path, text, append: bool = False):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("File writer has been closed.")
+            if append and path in self._pending:
+                pending_append, pending_text = self._pending[path]
+                self._pending[path] = (pending_append, pending_text + text)
+            else:
+                # Replacing the file makes earlier writes to it unnecessary. Moving it to the end keeps it ordered
+                # after writes to other files that were requested before it.
+                self._pending.pop(path, None)
+                self._pending[path] = (append, text)
+            self._condition.notify_all()
+
+    # Waits until every pending write is done. Raises the first error since the last flush, if there was one.
+    def flush(self):
+        with self._condition:
+            while self._pending or self._writing:
+                self._condition.wait()
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    # Writes every pending write and stops the thread.
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        atexit.unregister(self.flush)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                path, (append, text) = self._pending.popitem(last=False)
+                self._writing = True
+
+            error = None
+            try:
+                write_file(path, text, append)
+            except Exception as e:
+                self._logger.error(f"Error writing to {path}", exc_info=e)
+                error = e
+
+            with self._condition:
+                if self._error is None:
+                    self._error = error
+                self._writing = False
+                self._condition.notify_all()
+
+
+# Writes text (a str or bytes) to path without leaving a partially written file if the program stops. New contents
+# are written to a temporary file which then replaces the old file. Appended text is synced to the disk before
+# returning.
+def write_file(path: Path, text, append: bool = False):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    binary = "b" if isinstance(text, bytes) else ""
+    if append:
+        with open(path, "a" + binary) as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+    else:
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "w" + binary) as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+
+# Returns True if data loaded from a json file is a snapshot written with a journal, which holds the data together with
+# the number of the last journal change in it.
+def _is_journal_snapshot(data) -> bool:
+    return isinstance(data, dict) and data.keys() == {"journal_sequence", "data"}
+
+
+# Change that sets the value at path, creating missing dictionaries along the way.
+def set_change(path: list, value) -> dict:
+    return {"op": "set", "path": path, "value": value}
+
+
+# Change that inserts value into a list at path, which ends with the index to insert at.
+def insert_change(path: list, value) -> dict:
+    return {"op": "insert", "path": path, "value": value}
+
+
+# Change that deletes the value at path.
+def delete_change(path: list) -> dict:
+    return {"op": "del", "path": path}
+
+
+# Applies a change to data and returns the result. Data is modified in place unless the change replaces the root.
+def apply_change(data, change: dict):
+    path = change["path"]
+    if not path:
+        if change["op"] == "set":
+            return change["value"]
+        raise KeyError("Can not delete the root of the data.")
+
+    container = data
+    for key in path[:-1]:
+        if isinstance(container, dict) and key not in container:
+            if change["op"] == "del":
+                return data
+            container[key] = {}
+        container = container[key]
+
+    key = path[-1]
+    if change["op"] == "set":
+        container[key] = change["value"]
+    elif change["op"] == "insert":
+        container.insert(key, change["value"])
+    elif change["op"] == "del":
+        if isinstance(container, dict):
+            container.pop(key, None)
+        else:
+            del container[key]
+    else:
+        raise SyntaxError(f"Unknown change operation '{change['op']}'.")
+    return data
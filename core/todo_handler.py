@@ -1,35 +1,459 @@
-from core.data_handler import Data_Handler
+import bisect
+import datetime
+
+from core.data_handler import Data_Handler, Lazy_Handler
+from core.serializers import Serializer
+from core.storage import Storage, set_change, insert_change, delete_change
+import core.helpers as h
 
 
 # Handles the to-do list.
+# The handler owns the list and the item operations below change it in place, saving only what changed. Items are
+# found by their path: the index of an item in the todo list followed by the index in "items" of each item below it,
+# e.g. (0, 2) for the third child of the first item.
+# Every item also has a persistent "id", and the handler keeps an index from ids to items and their parents so items
+# can be looked up by id without searching the tree. Items loaded without an id are given one and saved.
+# Due dates are stored as date ordinals (see due_date_ordinal), and older "mm/dd/yy" due dates are converted when
+# they're loaded. Items with a due date are also indexed by the date they're due, so the items due on a range of days
+# can be found without walking the tree.
 class Todo_Handler(Data_Handler):
-    def __init__(self, todo_json_path="data/todo.json"):
+    item_fields = ("name", "completed", "due_date")
+
+    def __init__(
+        self,
+        todo_json_path="data/todo.json",
+        journal=False,
+        async_writes=False,
+        serializer: Serializer = None,
+        storage: Storage = None,
+        backup_on_load=False,
+    ):
+        self._items_by_id = {}
+        self._parent_ids = {}
+        self._next_id = 1
+        self._migrated = False
+        self._due_days = {}
+        self._due_ordinals = []
+        self._item_due_ordinals = {}
+
         super(Todo_Handler, self).__init__(
-            "Todo", json_path=todo_json_path, default_data=[]
+            "Todo",
+            json_path=todo_json_path,
+            default_data=[],
+            journal=journal,
+            async_writes=async_writes,
+            serializer=serializer,
+            storage=storage,
+            backup_on_load=backup_on_load,
         )
 
+        if self._migrated:
+            self._logger.info("Gave todo items ids and date ordinal due dates.")
+            self.save_json()
+
+    def _set_data_json(self, data):
+        self._data = data
+        self._items_by_id = {}
+        self._parent_ids = {}
+        ids = [item["id"] for item, _, _ in walk_items(data) if "id" in item]
+        self._next_id = max(ids, default=0) + 1
+        # True if items were changed to the current format while loading them.
+        self._migrated = False
+        # Date ordinal: ([ids of incomplete items], [ids of completed items]) of every day with items due.
+        self._due_days = {}
+        # Sorted ordinals of the keys of _due_days.
+        self._due_ordinals = []
+        self._item_due_ordinals = {}
+        self._index_items(data, None)
+
+    # Adds items and everything below them to the id index, giving items without an id a new one.
+    def _index_items(self, items, parent_id):
+        # Ids of the items above the current item, by depth.
+        parent_ids = [parent_id]
+        for item, depth, _ in walk_items(items):
+            del parent_ids[depth + 1 :]
+            if "id" not in item:
+                item["id"] = self._next_id
+                self._migrated = True
+            if isinstance(item.get("due_date"), str):
+                due_date = due_date_ordinal(item["due_date"])
+                if due_date != item["due_date"]:
+                    item["due_date"] = due_date
+                    self._migrated = True
+            self._next_id = max(self._next_id, item["id"] + 1)
+            self._items_by_id[item["id"]] = item
+            self._parent_ids[item["id"]] = parent_ids[depth]
+            self._index_due_date(item)
+            parent_ids.append(item["id"])
+
+    def _unindex_item(self, item):
+        for subitem, _, _ in walk_items([item]):
+            del self._items_by_id[subitem["id"]]
+            del self._parent_ids[subitem["id"]]
+            self._unindex_due_date(subitem["id"])
+
+    # Adds an item to the list of the day it's due, after the incomplete items if it's completed and after the other
+    # incomplete items otherwise.
+    def _index_due_date(self, item):
+        ordinal = item.get("due_date")
+        if not isinstance(ordinal, int):
+            return
+        if ordinal not in self._due_days:
+            self._due_days[ordinal] = ([], [])
+            bisect.insort(self._due_ordinals, ordinal)
+        self._due_days[ordinal][todo_item_is_completed(item)].append(item["id"])
+        self._item_due_ordinals[item["id"]] = ordinal
+
+    def _unindex_due_date(self, item_id):
+        ordinal = self._item_due_ordinals.pop(item_id, None)
+        if ordinal is None:
+            return
+        incomplete_ids, completed_ids = self._due_days[ordinal]
+        if item_id in incomplete_ids:
+            incomplete_ids.remove(item_id)
+        else:
+            completed_ids.remove(item_id)
+        if not incomplete_ids and not completed_ids:
+            del self._due_days[ordinal]
+            del self._due_ordinals[bisect.bisect_left(self._due_ordinals, ordinal)]
+
+    # Returns (date, items) for every day from start to end, inclusive, with items due. Incomplete items come before
+    # completed items.
+    def items_due_between(self, start: datetime.date, end: datetime.date) -> list:
+        first = bisect.bisect_left(self._due_ordinals, start.toordinal())
+        last = bisect.bisect_right(self._due_ordinals, end.toordinal())
+        ret = []
+        for ordinal in self._due_ordinals[first:last]:
+            incomplete_ids, completed_ids = self._due_days[ordinal]
+            items = [self._items_by_id[item_id] for item_id in incomplete_ids]
+            items += [self._items_by_id[item_id] for item_id in completed_ids]
+            ret.append((datetime.date.fromordinal(ordinal), items))
+        return ret
+
     @property
     def todo_list(self):
         return self._data
 
     @todo_list.setter
     def todo_list(self, value):
-        self._data = value
+        self._set_data_json(value)
 
     # Returns an array of all todo items.
     def flat_item_list(self) -> [dict]:
-        ret = []
-        for item in self.todo_list:
-            ret += item_to_list(item)
-        return ret
+        return [item for item, _, _ in walk_items(self.todo_list)]
+
+    # Yields (item, depth, path) for the items in the todo list, like walk_items, keeping only items that match the
+    # filters of filter_items.
+    def walk(
+        self,
+        post_order=False,
+        with_path=False,
+        completed=None,
+        due_start: datetime.date = None,
+        due_end: datetime.date = None,
+    ):
+        entries = walk_items(self.todo_list, post_order, with_path)
+        if completed is None and due_start is None and due_end is None:
+            return entries
+        return filter_items(entries, completed, due_start, due_end)
+
+    # Returns the item with an id.
+    def get(self, item_id) -> dict:
+        return self._items_by_id[item_id]
+
+    # Returns the id of the parent of an item, or None for items in the todo list itself.
+    def get_parent_id(self, item_id):
+        return self._parent_ids[item_id]
+
+    # Returns the path of an item. Only the position of the item among its siblings is searched for at each level.
+    def get_path(self, item_id) -> tuple:
+        path = []
+        while item_id is not None:
+            item = self._items_by_id[item_id]
+            parent_id = self._parent_ids[item_id]
+            if parent_id is None:
+                siblings = self.todo_list
+            else:
+                siblings = self._items_by_id[parent_id]["items"]
+            path.append(next(i for i, other in enumerate(siblings) if other is item))
+            item_id = parent_id
+        return tuple(reversed(path))
+
+    def update(self, item_id, **fields):
+        self.update_item(self.get_path(item_id), **fields)
+
+    # Inserts a copy of item at index in the items of the item with parent_id, or in the todo list if parent_id is
+    # None. Returns the id of the new item.
+    def insert(self, parent_id, index, item: dict) -> int:
+        parent_path = () if parent_id is None else self.get_path(parent_id)
+        return self.get_item(self.insert_item(parent_path, index, item))["id"]
+
+    def delete(self, item_id, keep_children=False):
+        self.delete_item(self.get_path(item_id), keep_children)
+
+    # Moves an item to index in the items of the item with new_parent_id, or in the todo list if new_parent_id is
+    # None. index is a position in the list after the item has been taken out of its old place.
+    def move(self, item_id, new_parent_id, index):
+        parent_id = new_parent_id
+        while parent_id is not None:
+            if parent_id == item_id:
+                raise ValueError("Can not move a todo item into itself.")
+            parent_id = self._parent_ids[parent_id]
+
+        with self.batch():
+            item = self.get(item_id)
+            self.delete(item_id)
+            self.insert(new_parent_id, index, item)
+
+    def get_item(self, path) -> dict:
+        item = None
+        items = self.todo_list
+        for index in path:
+            item = items[index]
+            items = item.get("items", [])
+        if item is None:
+            raise IndexError("Path of a todo item can not be empty.")
+        return item
+
+    # Returns the list of items below the item at parent_path, or the todo list if parent_path is empty.
+    def _get_items(self, parent_path) -> list:
+        if not parent_path:
+            return self.todo_list
+        return self.get_item(parent_path).get("items", [])
+
+    # Sets fields of the item at path from keyword arguments, e.g. update_item(path, completed=True). due_date can be
+    # anything due_date_ordinal takes, and None removes the due date.
+    def update_item(self, path, **fields):
+        item = self.get_item(path)
+        if "id" in fields:
+            raise KeyError("The id of a todo item can not be changed.")
+        old_fields = _item_fields(item)
+        item_json_path = _json_path(path)
+
+        changes = []
+        for field, value in fields.items():
+            if field not in self.item_fields:
+                raise KeyError(f"No todo item field '{field}'.")
+            if value is None and field == "due_date":
+                if "due_date" in item:
+                    del item["due_date"]
+                    changes.append(delete_change(item_json_path + ["due_date"]))
+                continue
+            if field == "due_date":
+                value = due_date_ordinal(value)
+            if _item_fields(item).get(field) != value:
+                item[field] = value
+                changes.append(set_change(item_json_path + [field], value))
+
+        if changes:
+            new_fields = _item_fields(item)
+            if any(
+                old_fields.get(field) != new_fields.get(field)
+                for field in ("completed", "due_date")
+            ):
+                self._unindex_due_date(item["id"])
+                self._index_due_date(item)
+
+            self._logger.info(f"Changed todo item {list(path)} to {fields}.")
+            self._save_changes(*changes)
+            self._call_event(
+                self.update_event,
+                h.Change(
+                    "todo_item_changed",
+                    item["id"],
+                    old=old_fields,
+                    new=new_fields,
+                ),
+            )
+
+    # Inserts a copy of item at index in the items of the item at parent_path, or in the todo list if parent_path is
+    # empty. An index of None appends the item. Items without an id are given one, and due dates are converted like
+    # update_item does, with a due date of None removed. Returns the path of the new item.
+    def insert_item(self, parent_path, index, item: dict) -> tuple:
+        parent_path = tuple(parent_path)
+        item = copy_item(item)
+        for new_item, _, _ in walk_items([item]):
+            if "due_date" in new_item:
+                if new_item["due_date"] is None:
+                    del new_item["due_date"]
+                else:
+                    new_item["due_date"] = due_date_ordinal(new_item["due_date"])
+        parent_id = self.get_item(parent_path)["id"] if parent_path else None
+        if any(
+            "id" in new_item and new_item["id"] in self._items_by_id
+            for new_item, _, _ in walk_items([item])
+        ):
+            raise KeyError("A todo item with the same id already exists.")
+        self._index_items([item], parent_id)
+        if parent_path and "items" not in self.get_item(parent_path):
+            # A new list is saved whole, since there's no list to insert into yet.
+            index = 0
+            self.get_item(parent_path)["items"] = [item]
+            change = set_change(_json_path(parent_path) + ["items"], [item])
+        else:
+            items = self._get_items(parent_path)
+            if index is None:
+                index = len(items)
+            index = min(index, len(items))
+            items.insert(index, item)
+            change = insert_change(_json_path(parent_path + (index,)), item)
+
+        path = parent_path + (index,)
+        self._logger.info(f"Inserted todo item '{item['name']}' at {list(path)}.")
+        self._save_changes(change)
+        self._call_event(
+            self.update_event, h.Change("todo_item_inserted", item["id"], new=item)
+        )
+        return path
+
+    # Deletes the item at path. With keep_children, the item's children take its place instead of being deleted.
+    def delete_item(self, path, keep_children=False):
+        path = tuple(path)
+        parent_path, index = path[:-1], path[-1]
+        items = self._get_items(parent_path)
+        item = items.pop(index)
+        children = item.get("items", []) if keep_children else []
+        items[index:index] = children
+        parent_id = self._parent_ids[item["id"]]
+        self._unindex_item(item)
+        self._index_items(children, parent_id)
+
+        if not items and parent_path:
+            # Items without children have no "items" list.
+            del self.get_item(parent_path)["items"]
+            changes = [delete_change(_json_path(parent_path) + ["items"])]
+        else:
+            changes = [delete_change(_json_path(path))]
+            changes += [
+                insert_change(_json_path(parent_path + (index + offset,)), child)
+                for offset, child in enumerate(children)
+            ]
+
+        self._logger.info(f"Deleted todo item '{item['name']}' at {list(path)}.")
+        self._save_changes(*changes)
+        self._call_event(
+            self.update_event,
+            h.Change("todo_item_deleted", item["id"], old=item, new=children or None),
+        )
+
+    # Moves the item at path to index in the items of the item at new_parent_path. new_parent_path and index are
+    # positions in the list after the item has been taken out of its old place. Returns the new path of the item.
+    def move_item(self, path, new_parent_path, index) -> tuple:
+        path, new_parent_path = tuple(path), tuple(new_parent_path)
+        if new_parent_path[: len(path)] == path:
+            raise ValueError("Can not move a todo item into itself.")
+
+        with self.batch():
+            item = self.get_item(path)
+            self.delete_item(path)
+            new_path = self.insert_item(new_parent_path, index, item)
+        return new_path
+
+
+# Returns the fields of an item without its children.
+def _item_fields(item: dict) -> dict:
+    fields = {"name": item["name"], "completed": todo_item_is_completed(item)}
+    if "due_date" in item:
+        fields["due_date"] = item["due_date"]
+    return fields
+
+
+# Returns the json path of the item at path, e.g. [0, "items", 2] for (0, 2).
+def _json_path(path) -> list:
+    json_path = []
+    for index in path:
+        if json_path:
+            json_path.append("items")
+        json_path.append(index)
+    return json_path
+
+
+# Yields (item, depth, path) for every item in items and below them, where depth is 0 for the items in items. Items
+# are yielded before their children, or after them with post_order. path is the path of the item from items (see
+# Todo_Handler) with with_path, or None otherwise. Walks with a stack instead of recursion, so trees of any depth can
+# be walked.
+def walk_items(items: list, post_order=False, with_path=False):
+    # Iterators over the (index, item) of the lists being walked, and the items the lists belong to.
+    iterators = [enumerate(items)]
+    parents = []
+    path = []
+    while iterators:
+        for index, item in iterators[-1]:
+            path.append(index)
+            if not post_order:
+                yield (item, len(path) - 1, tuple(path) if with_path else None)
+            if item.get("items"):
+                iterators.append(enumerate(item["items"]))
+                parents.append(item)
+                break
+            if post_order:
+                yield (item, len(path) - 1, tuple(path) if with_path else None)
+            path.pop()
+        else:
+            iterators.pop()
+            if parents:
+                item = parents.pop()
+                if post_order:
+                    yield (item, len(path) - 1, tuple(path) if with_path else None)
+                path.pop()
+
+
+# Yields the (item, depth, path) entries of walk_items that are completed or not if completed isn't None, and that
+# are due from due_start to due_end, inclusive, if either is given.
+def filter_items(
+    entries,
+    completed: bool = None,
+    due_start: datetime.date = None,
+    due_end: datetime.date = None,
+):
+    filter_due = due_start is not None or due_end is not None
+    first = due_start.toordinal() if due_start is not None else None
+    last = due_end.toordinal() if due_end is not None else None
+    for entry in entries:
+        item = entry[0]
+        if completed is not None and todo_item_is_completed(item) != completed:
+            continue
+        if filter_due:
+            ordinal = item.get("due_date")
+            if not isinstance(ordinal, int):
+                continue
+            if (first is not None and ordinal < first) or (
+                last is not None and ordinal > last
+            ):
+                continue
+        yield entry
+
+
+# Returns a copy of an item and everything below it.
+def copy_item(item: dict) -> dict:
+    # Copies of the items above the current item, by depth.
+    copies = []
+    for subitem, depth, _ in walk_items([item]):
+        del copies[depth:]
+        copy = {key: value for key, value in subitem.items() if key != "items"}
+        if "items" in subitem:
+            copy["items"] = []
+        if copies:
+            copies[-1]["items"].append(copy)
+        else:
+            item_copy = copy
+        copies.append(copy)
+    return item_copy
 
 
 def item_to_list(item: dict) -> [dict]:
-    ret = [item]
-    if "items" in item:
-        for child_item in item["items"]:
-            ret += item_to_list(child_item)
-    return ret
+    return [item for item, _, _ in walk_items([item])]
+
+
+# Returns the date ordinal of a due date given as a date ordinal, a datetime.date or a "mm/dd/yy" or "mm/dd" string.
+# Strings that aren't dates are returned unchanged, so text entered as a due date isn't lost.
+def due_date_ordinal(due_date):
+    if isinstance(due_date, datetime.date):
+        return due_date.toordinal()
+    if isinstance(due_date, str):
+        date = h.date_string_to_date(due_date.strip())
+        return due_date if date is None else date.toordinal()
+    return due_date
 
 
 def todo_item_is_completed(item: dict) -> bool:
@@ -39,4 +463,4 @@ def todo_item_is_completed(item: dict) -> bool:
         return False
 
 
-todo_handler = Todo_Handler()
\ No newline at end of file
+todo_handler = Lazy_Handler(Todo_Handler)
@@ -4,6 +4,12 @@ abspath = os.path.abspath(__file__)
 dname = os.path.dirname(abspath)
 os.chdir(dname)
 
+from core.handlers import configure_handlers, prefetch_handlers
+
+configure_handlers(backup_on_load=True, journal=True, async_writes=True)
+# Load data while the UI modules are imported and the window is built.
+prefetch_handlers()
+
 from ui.qt_main import App
 
 
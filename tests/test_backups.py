@@ -0,0 +1,72 @@
+import datetime
+import json
+
+from core.backups import Backup_Store, Retention_Policy
+from core.chain_handler import Chain_Handler
+from core.todo_handler import Todo_Handler
+
+
+def test_restore_earlier_backup_in_same_hour(tmp_path):
+    store = Backup_Store(tmp_path)
+    good = store.add(["good"], datetime.datetime(2024, 1, 1, 10, 5))
+    store.add(["bad"], datetime.datetime(2024, 1, 1, 10, 20))
+    assert store.restore(good) == ["good"]
+    assert store.restore() == ["bad"]
+
+
+def test_old_backups_are_thinned_out(tmp_path):
+    store = Backup_Store(
+        tmp_path, Retention_Policy(recent=2, hourly=1, daily=0, weekly=0)
+    )
+    start = datetime.datetime(2024, 1, 1, 10)
+    for minute in range(4):
+        store.add([minute], start + datetime.timedelta(minutes=minute))
+    assert store.list_backups() == [
+        start + datetime.timedelta(minutes=2),
+        start + datetime.timedelta(minutes=3),
+    ]
+
+
+def test_handler_backup_round_trip(tmp_path):
+    handler = Todo_Handler(
+        tmp_path / "todo.json", async_writes=False, backup_on_load=True
+    )
+    handler.insert(None, 0, {"name": "x", "completed": False})
+    backup_time = handler.backup()
+    handler.insert(None, 1, {"name": "y", "completed": False})
+    handler.backup()
+
+    handler.restore_backup(backup_time)
+    assert [item["name"] for item in handler.todo_list] == ["x"]
+    reloaded = Todo_Handler(tmp_path / "todo.json", async_writes=False)
+    assert reloaded.todo_list == handler.todo_list
+
+
+def test_sharded_chains_backup_on_load_loads_no_shards(tmp_path):
+    handler = Chain_Handler(tmp_path / "chains.json", async_writes=False, sharded=True)
+    handler.create_new_chain("a")
+    handler.edit_chain("a", 1, date=datetime.date(2023, 5, 1))
+    handler.edit_chain("a", 1, date=datetime.date(2024, 5, 1))
+    handler.save_json()
+
+    reloaded = Chain_Handler(
+        tmp_path / "chains.json", async_writes=False, sharded=True, backup_on_load=True
+    )
+    assert reloaded._unloaded_years == {"2023", "2024"}
+    load_time = reloaded.list_backups()[-1]
+    reloaded.edit_chain("a", 0, date=datetime.date(2024, 5, 1))
+    assert reloaded._unloaded_years == {"2023"}
+
+    reloaded.restore_backup(load_time)
+    assert reloaded.get_chain("a", date=datetime.date(2024, 5, 1)) == 1
+    assert reloaded.get_chain("a", date=datetime.date(2023, 5, 1)) == 1
+
+
+def test_backup_on_load_keeps_data_from_before_migration(tmp_path):
+    json_path = tmp_path / "todo.json"
+    stored = [{"name": "x", "completed": False, "due_date": "03/14/24"}]
+    json_path.write_text(json.dumps(stored))
+
+    handler = Todo_Handler(json_path, backup_on_load=True)
+    assert handler.todo_list[0]["due_date"] == datetime.date(2024, 3, 14).toordinal()
+    assert handler._backup_store.restore() == stored
@@ -0,0 +1,73 @@
+import datetime
+import random
+
+from core.chain_counts import Chain_Counts
+from core.chain_handler import Chain_Handler
+
+
+def test_counts_match_brute_force():
+    rnd = random.Random(0)
+    linked = set(rnd.sample(range(1000, 1100), 40))
+    counts = Chain_Counts.from_ordinals(sorted(linked), 1050, 1050)
+    first_covered = min(linked) - Chain_Counts._margin
+    last_covered = max(linked) + Chain_Counts._margin
+    for _ in range(300):
+        ordinal = rnd.randint(first_covered, last_covered)
+        assert counts.covers(ordinal)
+        delta = 1 if ordinal not in linked else -1
+        counts.add(ordinal, delta)
+        linked ^= {ordinal}
+
+        first = rnd.randrange(0, 1500)
+        last = first + rnd.randrange(-5, 600)
+        assert counts.count(first, last) == sum(
+            1 for ordinal in linked if first <= ordinal <= last
+        )
+
+
+def test_counts_cover_margin_around_links():
+    counts = Chain_Counts.from_ordinals([1000], 1000, 1000)
+    assert counts.covers(1000 - Chain_Counts._margin)
+    assert counts.covers(1000 + Chain_Counts._margin)
+    assert not counts.covers(1000 - Chain_Counts._margin - 1)
+    assert not counts.covers(1000 + Chain_Counts._margin + 1)
+
+
+def test_handler_counts_and_ranges_after_edits(tmp_path):
+    rnd = random.Random(1)
+    today = datetime.date.today()
+    handler = Chain_Handler(tmp_path / "chains.json", async_writes=False)
+    handler.create_new_chain("a")
+    linked = set()
+    comments = {}
+    # Days far outside the margin of the counts built around today are edited too.
+    days = [
+        today + datetime.timedelta(days=rnd.randrange(-2000, 30)) for _ in range(200)
+    ]
+    handler.count_links("a", today, today)
+    for date in days:
+        value = rnd.randrange(2)
+        handler.edit_chain("a", value, date=date)
+        if value:
+            linked.add(date)
+        else:
+            linked.discard(date)
+        if rnd.random() < 0.3:
+            handler.edit_chain_comment("a", f"comment {date}", date=date)
+            comments[date] = f"comment {date}"
+
+        start = today - datetime.timedelta(days=rnd.randrange(0, 2100))
+        end = start + datetime.timedelta(days=rnd.randrange(0, 400))
+        in_range = [date for date in linked if start <= date <= end]
+        assert handler.count_links("a", start, end) == len(in_range)
+        days_in_range = (end - start).days + 1
+        assert handler.get_chain_range("a", start, end) == [
+            int(start + datetime.timedelta(days=day) in linked)
+            for day in range(days_in_range)
+        ]
+        assert handler.get_comments_range("a", start, end) == {
+            date: comment for date, comment in comments.items() if start <= date <= end
+        }
+
+    assert handler.get_chain_range("missing", today, today) == [0]
+    assert handler.get_chain_range("a", today, today - datetime.timedelta(days=1)) == []
@@ -0,0 +1,55 @@
+import datetime
+
+from core.chain_handler import Chain_Handler
+
+
+def create_sharded_handler(tmp_path):
+    return Chain_Handler(tmp_path / "chains.json", async_writes=False, sharded=True)
+
+
+def test_streaks_and_counts_only_load_the_years_they_use(tmp_path):
+    handler = create_sharded_handler(tmp_path)
+    handler.create_new_chain("a")
+    for date in (
+        datetime.date(2020, 6, 1),
+        datetime.date(2022, 12, 31),
+        datetime.date(2023, 1, 1),
+        datetime.date(2023, 1, 2),
+        datetime.date(2024, 3, 1),
+    ):
+        handler.edit_chain("a", 1, date=date)
+    handler.save_json()
+
+    reloaded = create_sharded_handler(tmp_path)
+    assert reloaded.get_streak("a", date=datetime.date(2023, 1, 2)) == 3
+    assert reloaded._unloaded_years == {"2020", "2024"}
+    assert reloaded.get_longest_streak("a", loaded_only=True) == 3
+    assert (
+        reloaded.count_links(
+            "a", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)
+        )
+        == 1
+    )
+    assert reloaded._unloaded_years == {"2020"}
+    assert (
+        reloaded.count_links(
+            "a", datetime.date(2020, 1, 1), datetime.date(2024, 12, 31)
+        )
+        == 5
+    )
+    assert reloaded._unloaded_years == set()
+
+
+def test_unsharded_edits_of_sharded_chains_are_kept(tmp_path):
+    handler = create_sharded_handler(tmp_path)
+    handler.create_new_chain("a")
+    handler.edit_chain("a", 1, date=datetime.date(2023, 5, 1))
+    handler.edit_chain("a", 1, date=datetime.date(2023, 5, 2))
+    handler.save_json()
+
+    unsharded = Chain_Handler(tmp_path / "chains.json", async_writes=False)
+    unsharded.edit_chain("a", 0, date=datetime.date(2023, 5, 1))
+
+    reloaded = Chain_Handler(tmp_path / "chains.json", async_writes=False)
+    assert reloaded.get_chain("a", date=datetime.date(2023, 5, 1)) == 0
+    assert reloaded.get_chain("a", date=datetime.date(2023, 5, 2)) == 1
@@ -0,0 +1,77 @@
+import datetime
+import random
+
+import pytest
+
+import core.chain_matrix
+from core.chain_handler import Chain_Handler
+from core.chain_matrix import Chain_Matrix
+
+
+@pytest.fixture(params=["numpy", "array"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(core.chain_matrix, "numpy", None)
+    return request.param
+
+
+def create_matrix(rows, start=datetime.date(2024, 1, 1)):
+    days = len(rows[0]) if rows else 0
+    return Chain_Matrix(
+        [f"chain {row}" for row in range(len(rows))],
+        start,
+        days,
+        [bytes(row) for row in rows],
+    )
+
+
+def test_matrix_matches_rows(backend):
+    rnd = random.Random(0)
+    rows = [[rnd.randrange(2) for _ in range(20)] for _ in range(4)]
+    matrix = create_matrix(rows)
+
+    assert matrix.end == datetime.date(2024, 1, 20)
+    assert matrix.dates()[-1] == matrix.end
+    assert [
+        [matrix.get(chain, date) for date in matrix.dates()] for chain in matrix.chains
+    ] == rows
+    assert matrix.completion_rates() == [sum(row) / 20 for row in rows]
+    assert matrix.weekly_sums() == [
+        [sum(row[day : day + 7]) for day in range(0, 20, 7)] for row in rows
+    ]
+    assert matrix.co_occurrence() == [
+        [sum(a & b for a, b in zip(row, other)) for other in rows] for row in rows
+    ]
+
+    matrix.update("chain 0", datetime.date(2024, 1, 1), 1 - rows[0][0])
+    assert matrix.get("chain 0", datetime.date(2024, 1, 1)) == 1 - rows[0][0]
+    # Chains and dates outside of the matrix are ignored.
+    matrix.update("missing", datetime.date(2024, 1, 1), 1)
+    matrix.update("chain 0", datetime.date(2023, 12, 31), 1)
+    matrix.update("chain 0", datetime.date(2024, 1, 21), 1)
+
+
+def test_empty_matrices(backend):
+    no_rows = Chain_Matrix([], datetime.date(2024, 1, 1), 5, [])
+    assert no_rows.completion_rates() == []
+    assert no_rows.weekly_sums() == []
+    assert no_rows.co_occurrence() == []
+
+    no_days = Chain_Matrix(["a", "b"], datetime.date(2024, 1, 1), 0, [b"", b""])
+    assert no_days.dates() == []
+    assert no_days.completion_rates() == [0.0, 0.0]
+    assert no_days.weekly_sums() == [[], []]
+    assert no_days.co_occurrence() == [[0, 0], [0, 0]]
+
+
+def test_cached_matrix_follows_links(tmp_path, backend):
+    handler = Chain_Handler(tmp_path / "chains.json", async_writes=False)
+    handler.create_new_chain("a")
+    start = datetime.date(2024, 1, 1)
+    matrix = handler.get_chain_matrix(start, start + datetime.timedelta(days=6))
+    handler.edit_chain("a", 2, date=start)
+    assert matrix.get("a", start) == handler.get_chain("a", date=start)
+    handler.edit_chain("a", 0, date=start)
+    assert matrix.get("a", start) == 0
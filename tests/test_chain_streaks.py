@@ -0,0 +1,109 @@
+import datetime
+import random
+
+from core.chain_handler import Chain_Handler
+from core.chain_streaks import Chain_Streaks
+
+
+def brute_run(linked: set, ordinal: int):
+    if ordinal not in linked:
+        return None
+    first = last = ordinal
+    while first - 1 in linked:
+        first -= 1
+    while last + 1 in linked:
+        last += 1
+    return (first, last)
+
+
+def brute_streak(linked: set, ordinal: int) -> int:
+    if ordinal not in linked:
+        ordinal -= 1
+    run = brute_run(linked, ordinal)
+    return 0 if run is None else ordinal - run[0] + 1
+
+
+def brute_longest(linked: set) -> int:
+    runs = [brute_run(linked, ordinal) for ordinal in linked]
+    return max((last - first + 1 for first, last in runs), default=0)
+
+
+def test_streaks_match_brute_force_after_edits():
+    rnd = random.Random(0)
+    linked = set(rnd.sample(range(1000, 1200), 120))
+    streaks = Chain_Streaks.from_ordinals(sorted(linked))
+    for _ in range(600):
+        ordinal = rnd.randrange(995, 1205)
+        if rnd.random() < 0.5:
+            streaks.add(ordinal)
+            linked.add(ordinal)
+        else:
+            streaks.remove(ordinal)
+            linked.discard(ordinal)
+
+        probe = rnd.randrange(990, 1210)
+        assert streaks.get_run(probe) == brute_run(linked, probe)
+        assert streaks.get_streak(probe) == brute_streak(linked, probe)
+        assert streaks.get_longest_streak() == brute_longest(linked)
+        first, last = sorted((rnd.randrange(990, 1210), rnd.randrange(990, 1210)))
+        all_runs = {brute_run(linked, ordinal) for ordinal in linked}
+        expected_runs = sorted(
+            run for run in all_runs if run[1] >= first and run[0] <= last
+        )
+        assert list(streaks.runs(first, last)) == expected_runs
+
+
+def test_empty_streaks():
+    streaks = Chain_Streaks.from_ordinals([])
+    assert streaks.get_streak(5) == 0
+    assert streaks.get_run(5) is None
+    assert streaks.get_longest_run() is None
+    assert streaks.get_longest_streak() == 0
+    assert list(streaks.runs(0, 10)) == []
+
+
+# Links around the new year, so runs cross shard edges.
+def test_handler_streaks_across_years_and_shards(tmp_path):
+    rnd = random.Random(1)
+    start = datetime.date(2022, 12, 1).toordinal()
+    end = datetime.date(2024, 2, 1).toordinal()
+    new_years = [datetime.date(year, 1, 1).toordinal() for year in (2023, 2024)]
+    linked = set()
+    for new_year in new_years:
+        linked.update(
+            range(new_year - rnd.randrange(1, 20), new_year + rnd.randrange(1, 20))
+        )
+    linked.update(rnd.sample(range(start, end), 80))
+
+    handler = Chain_Handler(tmp_path / "chains.json", async_writes=False, sharded=True)
+    handler.create_new_chain("a")
+    with handler.batch():
+        for ordinal in sorted(linked):
+            handler.edit_chain("a", 1, date=datetime.date.fromordinal(ordinal))
+
+    for ordinal in new_years + rnd.sample(range(start, end), 40):
+        date = datetime.date.fromordinal(ordinal)
+        reloaded = Chain_Handler(
+            tmp_path / "chains.json", async_writes=False, sharded=True
+        )
+        assert reloaded.get_streak("a", date=date) == brute_streak(linked, ordinal)
+        run = brute_run(linked, ordinal)
+        assert reloaded.get_chain_run("a", date=date) == (
+            None if run is None else tuple(map(datetime.date.fromordinal, run))
+        )
+
+    reloaded = Chain_Handler(tmp_path / "chains.json", async_writes=False, sharded=True)
+    assert reloaded.get_longest_streak("a") == brute_longest(linked)
+
+
+def test_has_unloaded_years(tmp_path):
+    handler = Chain_Handler(tmp_path / "chains.json", sharded=True)
+    handler.create_new_chain("a")
+    handler.edit_chain("a", 1, date=datetime.date(2020, 1, 1))
+    assert not handler.has_unloaded_years()
+
+    reloaded = Chain_Handler(tmp_path / "chains.json", sharded=True)
+    assert reloaded.has_unloaded_years()
+    assert reloaded.get_longest_streak("a", loaded_only=True) == 0
+    assert reloaded.get_longest_streak("a") == 1
+    assert not reloaded.has_unloaded_years()
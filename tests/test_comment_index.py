@@ -0,0 +1,105 @@
+import datetime
+import random
+
+from core.chain_handler import Chain_Handler
+from core.comment_index import Comment_Index, tokenize
+
+words = ["sick", "sickness", "run", "running", "ran", "gym", "rest", "day", "Rainy"]
+
+
+# Matches a query against comments without the index.
+def brute_search(comments: dict, query: str) -> list:
+    matches = []
+    for key, comment in comments.items():
+        tokens = tokenize(comment)
+        matched = True
+        phrases = query.split('"')[1::2]
+        loose_words = tokenize(" ".join(query.split('"')[0::2]))
+        for word in loose_words:
+            if not any(token.startswith(word) for token in tokens):
+                matched = False
+        for phrase in map(tokenize, phrases):
+            if phrase and not any(
+                tokens[index : index + len(phrase)] == phrase
+                for index in range(len(tokens) - len(phrase) + 1)
+            ):
+                matched = False
+        if not loose_words and not any(map(tokenize, phrases)):
+            matched = False
+        if matched:
+            matches.append(key)
+    return sorted(matches, key=lambda key: (key[1], key[0]))
+
+
+def random_comment(rnd) -> str:
+    return " ".join(rnd.choice(words) for _ in range(rnd.randrange(1, 6)))
+
+
+def random_query(rnd) -> str:
+    parts = []
+    for _ in range(rnd.randrange(1, 3)):
+        if rnd.random() < 0.3:
+            parts.append(f'"{random_comment(rnd)}"')
+        else:
+            parts.append(rnd.choice(words)[: rnd.randrange(1, 6)])
+    return " ".join(parts)
+
+
+def test_search_matches_brute_force():
+    rnd = random.Random(0)
+    index = Comment_Index()
+    comments = {}
+    for _ in range(500):
+        key = (rnd.choice("abc"), rnd.randrange(20))
+        if rnd.random() < 0.2:
+            index.remove_comment(*key)
+            comments.pop(key, None)
+        else:
+            comment = random_comment(rnd)
+            index.set_comment(*key, comment)
+            comments[key] = comment
+        query = random_query(rnd)
+        assert index.search(query) == brute_search(comments, query), query
+
+
+def test_prefix_and_phrase_search():
+    index = Comment_Index()
+    index.set_comment("a", 2, "Felt sick, went running")
+    index.set_comment("b", 1, "Running late")
+    index.set_comment("a", 1, "late run")
+    assert index.search("sic") == [("a", 2)]
+    assert index.search("run") == [("a", 1), ("b", 1), ("a", 2)]
+    assert index.search('"running late"') == [("b", 1)]
+    assert index.search('"late running"') == []
+    assert index.search("") == []
+    assert index.search('""') == []
+
+
+def test_index_follows_renames_and_deletes():
+    index = Comment_Index()
+    index.set_comment("a", 1, "gym day")
+    index.set_comment("b", 1, "gym")
+    index.rename_chain("a", "c")
+    assert index.search("gym") == [("b", 1), ("c", 1)]
+    index.remove_chain("b")
+    assert index.search("gym") == [("c", 1)]
+    index.remove_comment("c", 1)
+    assert index.search("gym") == []
+    assert index._sorted_tokens == []
+
+
+def test_handler_search_after_edits(tmp_path):
+    handler = Chain_Handler(tmp_path / "chains.json", async_writes=False)
+    date = datetime.date(2024, 1, 1)
+    handler.create_new_chain("a")
+    handler.create_new_chain("b")
+    handler.edit_chain_comment("a", "rest day", date=date)
+    assert handler.search_comments("rest") == [("a", date)]
+
+    handler.edit_chain_comment("b", "rest", date=date)
+    handler.rename_chain("a", "c")
+    assert handler.search_comments("rest") == [("b", date), ("c", date)]
+    handler.delete_chain("b")
+    assert handler.search_comments("rest") == [("c", date)]
+    handler.delete_chain_comment("c", date=date)
+    assert handler.search_comments("rest") == []
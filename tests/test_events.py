@@ -0,0 +1,152 @@
+import datetime
+import threading
+
+import pytest
+
+from core import helpers as h
+from core.chain_handler import Chain_Handler
+
+
+# Runs scheduled callbacks only when run_scheduled is called, like an event loop that hasn't had a turn yet.
+class Fake_Scheduler:
+    def __init__(self):
+        self.scheduled = []  # (callback, delay_ms)
+
+    def __call__(self, callback, delay_ms):
+        self.scheduled.append((callback, delay_ms))
+
+    def run_scheduled(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback, _ in scheduled:
+            callback()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Fake_Scheduler()
+    h.set_event_scheduler(scheduler)
+    yield scheduler
+    h.set_event_scheduler(None)
+
+
+def test_merge_calls():
+    calls = [
+        (([1], "a"), {"x": 1}),
+        (([2, 3], "b"), {"y": 2}),
+        (([4], "c"), {"x": 3}),
+    ]
+    assert h._merge_calls(calls) == (([1, 2, 3, 4], "c"), {"x": 3, "y": 2})
+    # Only list arguments are joined.
+    assert h._merge_calls([(("a",), {}), ((["b"],), {})]) == ((["b"],), {})
+
+
+def test_events_without_scheduler_are_called_right_away():
+    calls = []
+    event = h.Event(deferred=True)
+    event.connect(calls.append)
+    event.call([1])
+    event.call([2])
+    assert calls == [[1], [2]]
+
+
+def test_deferred_event_merges_calls(scheduler):
+    calls = []
+    event = h.Event(deferred=True)
+    event.connect(calls.append)
+    event.call([1])
+    event.call([2, 3])
+    assert calls == []
+    assert len(scheduler.scheduled) == 1
+
+    scheduler.run_scheduled()
+    assert calls == [[1, 2, 3]]
+    event.call([4])
+    scheduler.run_scheduled()
+    assert calls == [[1, 2, 3], [4]]
+
+
+def test_deferred_event_flush(scheduler):
+    calls = []
+    event = h.Event(deferred=True)
+    event.connect(calls.append)
+    event.call([1])
+    event.flush()
+    assert calls == [[1]]
+    # The scheduled delivery has nothing left to deliver.
+    scheduler.run_scheduled()
+    assert calls == [[1]]
+
+
+def test_debounced_event_waits_for_calls_to_stop(scheduler, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(h.time, "monotonic", lambda: now[0])
+    calls = []
+    event = h.Event(deferred=True, debounce_ms=100)
+    event.connect(calls.append)
+    event.call([1])
+    assert scheduler.scheduled[0][1] == 100
+
+    now[0] = 0.06
+    event.call([2])
+    now[0] = 0.1
+    scheduler.run_scheduled()
+    assert calls == []
+    # Rescheduled for the rest of the 100ms since the last call.
+    assert scheduler.scheduled[0][1] == 60
+
+    now[0] = 0.16
+    scheduler.run_scheduled()
+    assert calls == [[1, 2]]
+    assert scheduler.scheduled == []
+
+
+def test_events_called_from_other_threads_are_not_deferred(scheduler):
+    calls = []
+    event = h.Event(deferred=True)
+    event.connect(calls.append)
+    thread = threading.Thread(target=event.call, args=([1],))
+    thread.start()
+    thread.join()
+    assert calls == [[1]]
+    assert scheduler.scheduled == []
+
+
+def create_handler(tmp_path):
+    return Chain_Handler(tmp_path / "chains.json", journal=True, async_writes=False)
+
+
+def test_batch_saves_and_calls_events_once(tmp_path, monkeypatch):
+    handler = create_handler(tmp_path)
+    handler.create_new_chain("a")
+    saved = []
+    monkeypatch.setattr(handler._storage, "save_changes", saved.append)
+    link_calls = []
+    handler.update_chain_val_event.connect(link_calls.append)
+    update_calls = []
+    handler.update_event.connect(update_calls.append)
+
+    dates = [datetime.date(2024, 1, day) for day in (1, 2, 3)]
+    with handler.batch():
+        with handler.batch():
+            handler.edit_chain("a", 1, date=dates[0])
+        handler.edit_chain("a", 1, date=dates[1])
+        handler.edit_chain("a", 1, date=dates[2])
+        assert saved == [] and link_calls == [] and update_calls == []
+
+    assert len(saved) == 1 and len(saved[0]) == 3
+    assert len(link_calls) == 1
+    assert [change.start for change in link_calls[0]] == dates
+    assert len(update_calls) == 1
+    assert update_calls[0][0].kind == "json_changes"
+
+
+def test_batch_saves_changes_after_an_error(tmp_path):
+    handler = create_handler(tmp_path)
+    handler.create_new_chain("a")
+    date = datetime.date(2024, 1, 1)
+    with pytest.raises(KeyError):
+        with handler.batch():
+            handler.edit_chain("a", 1, date=date)
+            handler.edit_chain("missing", 1, date=date)
+
+    assert create_handler(tmp_path).get_chain("a", date=date) == 1
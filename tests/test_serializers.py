@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from core.serializers import get_serializer, load_data, dumps_json, loads_json
+
+serializer_names = ["json", "indented_json", "fast_json", "packed"]
+
+
+# Returns a list nested depth times around value.
+def nest(depth: int, value):
+    for _ in range(depth):
+        value = [value]
+    return value
+
+
+# Returns the value inside a list nested depth times, checking every level holds only the next one. Comparing deep data
+# with == would recurse too deeply.
+def unnest(depth: int, data):
+    for _ in range(depth):
+        assert type(data) is list and len(data) == 1
+        data = data[0]
+    return data
+
+
+@pytest.mark.parametrize("name", serializer_names)
+@pytest.mark.parametrize(
+    "data",
+    [
+        None,
+        0,
+        -(2**40),
+        1.5,
+        "",
+        'ü\n"',
+        [],
+        {},
+        [[], {}, [{}]],
+        {"": [], "a": {"b": None}},
+        [0, 1, 1, 0, 1, 0, 0, 1, 1],
+        [True, False, True],
+        [0, 1, True],
+        [1] * 100,
+        {"2024": {"1": [0, 1] * 16}, "x": [0, 2]},
+    ],
+)
+def test_round_trip(name, data):
+    raw = get_serializer(name).dumps(data)
+    loaded = load_data(raw)
+    assert loaded == data
+    # 0 and 1 == False and True, so check the types are kept as well.
+    assert json.dumps(loaded) == json.dumps(data)
+
+
+@pytest.mark.parametrize("name", serializer_names)
+def test_deep_nesting_round_trip(name):
+    depth = 3000 if name == "indented_json" else 100000
+    data = nest(depth, {"a": nest(10, 1)})
+    loaded = load_data(get_serializer(name).dumps(data))
+    assert unnest(depth, loaded) == {"a": nest(10, 1)}
+
+
+def test_deep_json_matches_json_module():
+    data = [{"a": [1, "x", None, True, {}], "b": {"c": []}}, 2.5]
+    for indent in (None, 1):
+        deep = dumps_json(nest(5000, data), indent)
+        assert unnest(5000, loads_json(deep)) == data
+        assert dumps_json(data, indent) == json.dumps(
+            data, indent=indent, separators=(",", ":") if indent is None else None
+        )
+
+
+def test_unknown_serializer():
+    with pytest.raises(NameError):
+        get_serializer("xml")
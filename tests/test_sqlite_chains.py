@@ -0,0 +1,39 @@
+import datetime
+
+from core.chain_handler import Chain_Handler
+from core.sqlite_storage import Chain_Sqlite_Storage
+
+
+def create_handler(tmp_path, sharded=True):
+    storage = Chain_Sqlite_Storage(tmp_path / "scheduler.db")
+    return Chain_Handler(
+        tmp_path / "chains.json", async_writes=False, storage=storage, sharded=sharded
+    )
+
+
+def test_sharded_chains_load_one_year_at_a_time(tmp_path):
+    handler = create_handler(tmp_path)
+    handler.create_new_chain("a")
+    handler.edit_chain("a", 1, date=datetime.date(2023, 5, 1))
+    handler.edit_chain("a", 1, date=datetime.date(2024, 5, 1))
+    handler.edit_chain_comment("a", "note", date=datetime.date(2024, 5, 1))
+    handler.save_json()
+
+    reloaded = create_handler(tmp_path)
+    assert reloaded._unloaded_years == {"2023", "2024"}
+    assert reloaded.get_chain("a", date=datetime.date(2024, 5, 1)) == 1
+    assert reloaded.get_chain_comment("a", date=datetime.date(2024, 5, 1)) == "note"
+    assert reloaded._unloaded_years == {"2023"}
+    assert reloaded.get_chain("a", date=datetime.date(2023, 5, 1)) == 1
+
+
+def test_unsharded_handler_loads_sharded_database(tmp_path):
+    handler = create_handler(tmp_path)
+    handler.create_new_chain("a")
+    handler.edit_chain("a", 1, date=datetime.date(2023, 5, 1))
+    handler.save_json()
+
+    reloaded = create_handler(tmp_path, sharded=False)
+    assert reloaded.get_chain("a", date=datetime.date(2023, 5, 1)) == 1
+    reloaded.save_json()
+    assert create_handler(tmp_path).get_chain("a", date=datetime.date(2023, 5, 1)) == 1
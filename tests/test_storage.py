@@ -0,0 +1,197 @@
+import datetime
+import threading
+
+import pytest
+
+import core.storage as storage_module
+from core.chain_handler import Chain_Handler
+from core.serializers import get_serializer, loads_json
+from core.storage import (
+    Json_Storage,
+    File_Writer,
+    insert_change,
+    delete_change,
+    write_file,
+)
+from core.todo_handler import Todo_Handler
+
+
+# Makes the next write of the journal file fail, like the program stopping after the json file was saved but before
+# the journal was cleared.
+def fail_next_journal_write(storage: Json_Storage, monkeypatch):
+    write_file = storage._write_file
+
+    def failing_write_file(path, text, append=False):
+        if path == storage._journal_path and not append:
+            monkeypatch.setattr(storage, "_write_file", write_file)
+            raise OSError("Journal write failed.")
+        write_file(path, text, append)
+
+    monkeypatch.setattr(storage, "_write_file", failing_write_file)
+
+
+def test_replay_skips_changes_in_json_file(tmp_path, monkeypatch):
+    json_path = tmp_path / "data.json"
+    storage = Json_Storage(json_path, journal=True)
+    storage.save([])
+    data = ["x"]
+    storage.save_changes([insert_change([0], "x")])
+    data.insert(1, "y")
+    storage.save_changes([insert_change([1], "y")])
+    del data[0]
+    storage.save_changes([delete_change([0])])
+
+    fail_next_journal_write(storage, monkeypatch)
+    with pytest.raises(OSError):
+        storage.save(data)
+
+    reloaded = Json_Storage(json_path, journal=True)
+    assert reloaded.load() == ["y"]
+    # Changes saved after reloading are replayed after the json file.
+    reloaded.save_changes([insert_change([1], "z")])
+    assert Json_Storage(json_path, journal=True).load() == ["y", "z"]
+
+
+def test_todo_items_are_not_duplicated_after_failed_compaction(tmp_path, monkeypatch):
+    json_path = tmp_path / "todo.json"
+    handler = Todo_Handler(json_path, journal=True)
+    handler.insert(None, 0, {"name": "x", "completed": False})
+    item_id = handler.insert(None, 1, {"name": "y", "completed": False})
+    handler.delete(handler.todo_list[0]["id"])
+
+    fail_next_journal_write(handler._storage, monkeypatch)
+    with pytest.raises(OSError):
+        handler.compact_journal()
+
+    reloaded = Todo_Handler(json_path, journal=True)
+    assert [item["id"] for item in reloaded.todo_list] == [item_id]
+    assert reloaded.todo_list == handler.todo_list
+
+
+def test_unnumbered_journal_is_replayed(tmp_path):
+    json_path = tmp_path / "data.json"
+    json_path.write_text("[1]")
+    (tmp_path / "data.json.journal").write_text(
+        '{"op":"insert","path":[1],"value":2}\n'
+    )
+    assert Json_Storage(json_path, journal=True).load() == [1, 2]
+
+
+def test_loading_without_journal_leaves_file_untouched(tmp_path):
+    json_path = tmp_path / "todo.json"
+    handler = Todo_Handler(json_path, journal=False, async_writes=False)
+    handler.insert(None, 0, {"name": "x", "completed": False})
+    modified = json_path.stat().st_mtime_ns
+
+    reloaded = Todo_Handler(json_path, journal=False, async_writes=False)
+    assert json_path.stat().st_mtime_ns == modified
+    assert [item["name"] for item in reloaded.todo_list] == ["x"]
+
+
+@pytest.mark.parametrize("serializer", ["json", "indented_json", "packed"])
+def test_deep_todo_tree_round_trip(tmp_path, serializer):
+    depth = 5000
+    item = {"name": "0", "completed": False}
+    root = item
+    for i in range(1, depth):
+        child = {"name": str(i), "completed": False}
+        item["items"] = [child]
+        item = child
+
+    json_path = tmp_path / "todo.json"
+    handler = Todo_Handler(
+        json_path, async_writes=False, serializer=get_serializer(serializer)
+    )
+    handler.insert(None, 0, root)
+    assert len(list(handler.walk())) == depth
+    handler.save_json()
+    assert len(list(Todo_Handler(json_path, async_writes=False).walk())) == depth
+
+
+def test_file_writer_combines_pending_writes(tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    writes = []
+
+    def blocking_write_file(path, text, append=False):
+        writes.append((path.name, text, append))
+        if len(writes) == 1:
+            started.set()
+            release.wait()
+        write_file(path, text, append)
+
+    monkeypatch.setattr(storage_module, "write_file", blocking_write_file)
+    writer = File_Writer("Test")
+    a, b = tmp_path / "a", tmp_path / "b"
+    writer.write(a, "1")
+    started.wait()
+    # Queued while the first write is blocked.
+    writer.write(b, "x", append=True)
+    writer.write(a, "2")
+    writer.write(b, "y", append=True)
+    writer.write(a, "3")
+    release.set()
+    writer.flush()
+
+    assert writes == [("a", "1", False), ("b", "xy", True), ("a", "3", False)]
+    assert a.read_text() == "3"
+    assert b.read_text() == "xy"
+
+
+def test_file_writer_flush_raises_write_errors(tmp_path):
+    writer = File_Writer("Test")
+    (tmp_path / "file").write_text("")
+    writer.write(tmp_path / "file" / "child", "x")
+    with pytest.raises(OSError):
+        writer.flush()
+    # Errors are only raised once.
+    writer.flush()
+
+
+def test_journal_compacts_at_threshold(tmp_path):
+    json_path = tmp_path / "data.json"
+    storage = Json_Storage(json_path, journal=True, journal_compact_threshold=3)
+    storage.save([])
+    storage.save_changes([insert_change([0], 0), insert_change([1], 1)])
+    assert not storage.should_compact()
+    storage.save_changes([insert_change([2], 2)])
+    assert storage.should_compact()
+    storage.save([0, 1, 2])
+    assert not storage.should_compact()
+    assert storage._journal_path.read_text() == ""
+
+    # Loading a journal that's over the threshold makes the handler compact it.
+    storage.save_changes([delete_change([0])] * 3)
+    handler = Todo_Handler(
+        storage=Json_Storage(json_path, journal=True, journal_compact_threshold=3),
+        todo_json_path=json_path,
+        async_writes=False,
+    )
+    assert handler._storage._journal_path.read_text() == ""
+    assert Json_Storage(json_path, journal=True).load() == []
+
+
+def test_closing_handlers_stops_their_writers(tmp_path):
+    threads = threading.active_count()
+    for i in range(5):
+        handler = Chain_Handler(
+            tmp_path / "chains.json", journal=True, async_writes=True, sharded=True
+        )
+        handler.create_new_chain(str(i))
+        handler.edit_chain(str(i), 1, date=datetime.date(2024, 1, i + 1))
+        handler.close()
+    assert threading.active_count() == threads
+
+    reloaded = Chain_Handler(tmp_path / "chains.json", journal=True, sharded=True)
+    assert reloaded.get_chain_order() == ["0", "1", "2", "3", "4"]
+    for i in range(5):
+        assert reloaded.get_chain(str(i), date=datetime.date(2024, 1, i + 1)) == 1
+
+
+def test_handlers_default_to_plain_json_files(tmp_path):
+    threads = threading.active_count()
+    handler = Todo_Handler(tmp_path / "todo.json")
+    handler.insert(None, 0, {"name": "x", "completed": False})
+    assert threading.active_count() == threads
+    assert not (tmp_path / "todo.json.journal").exists()
+    assert isinstance(loads_json((tmp_path / "todo.json").read_text()), list)
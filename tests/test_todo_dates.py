@@ -0,0 +1,52 @@
+import datetime
+import sqlite3
+
+from core.helpers import date_string_to_date
+from core.sqlite_storage import Todo_Sqlite_Storage
+from core.storage import set_change
+
+
+def test_two_digit_years_are_in_the_2000s():
+    assert date_string_to_date("03/14/24") == datetime.date(2024, 3, 14)
+    assert date_string_to_date("03/14/2024") == datetime.date(2024, 3, 14)
+    assert date_string_to_date("03/14/0024") == datetime.date(24, 3, 14)
+
+
+def test_sqlite_due_dates_keep_their_type(tmp_path):
+    ordinal = datetime.date(2024, 3, 14).toordinal()
+    storage = Todo_Sqlite_Storage(tmp_path / "todo.db")
+    storage.save(
+        [
+            {"name": "a", "completed": False, "due_date": ordinal},
+            {"name": "b", "completed": False, "due_date": "12345"},
+        ]
+    )
+    storage.save_changes([set_change([1, "due_date"], "54321")])
+    storage.close()
+
+    items = Todo_Sqlite_Storage(tmp_path / "todo.db").load()
+    assert items[0]["due_date"] == ordinal
+    assert items[1]["due_date"] == "54321"
+
+
+def test_sqlite_ordinals_move_to_due_ordinal_column(tmp_path):
+    connection = sqlite3.connect(tmp_path / "todo.db")
+    connection.executescript("""
+        CREATE TABLE storage_info (key TEXT PRIMARY KEY, value TEXT);
+        INSERT INTO storage_info VALUES ('Todo_Sqlite_Storage.initialized', '1');
+        CREATE TABLE todo_items (
+            id INTEGER PRIMARY KEY,
+            parent INTEGER,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            completed INTEGER NOT NULL,
+            due_date TEXT
+        );
+        INSERT INTO todo_items VALUES (1, NULL, 0, 'a', 0, '738959');
+        INSERT INTO todo_items VALUES (2, NULL, 1, 'b', 0, 'someday');
+        """)
+    connection.close()
+
+    items = Todo_Sqlite_Storage(tmp_path / "todo.db").load()
+    assert items[0]["due_date"] == 738959
+    assert items[1]["due_date"] == "someday"
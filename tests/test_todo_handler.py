@@ -0,0 +1,171 @@
+import datetime
+import random
+
+from core.todo_handler import (
+    Todo_Handler,
+    walk_items,
+    filter_items,
+    copy_item,
+    todo_item_is_completed,
+)
+
+
+def create_handler(tmp_path):
+    return Todo_Handler(tmp_path / "todo.json", async_writes=False)
+
+
+def test_inserted_due_dates_are_normalized(tmp_path):
+    handler = create_handler(tmp_path)
+    date = datetime.date(2024, 3, 14)
+    date_id = handler.insert(None, 0, {"name": "a", "due_date": date})
+    string_id = handler.insert(None, 1, {"name": "b", "due_date": "03/15/24"})
+    none_id = handler.insert(None, 2, {"name": "c", "due_date": None})
+
+    assert handler.get(date_id)["due_date"] == date.toordinal()
+    assert handler.get(string_id)["due_date"] == date.toordinal() + 1
+    assert "due_date" not in handler.get(none_id)
+    assert [
+        [item["name"] for item in items]
+        for _, items in handler.items_due_between(date, date.replace(day=15))
+    ] == [["a"], ["b"]]
+
+    reloaded = create_handler(tmp_path)
+    assert reloaded.todo_list == handler.todo_list
+
+
+# Returns (date, ids of incomplete items, ids of completed items) for every day with items due, found by walking the
+# tree.
+def brute_due_days(handler: Todo_Handler) -> list:
+    days = {}
+    for item, _, _ in handler.walk():
+        if isinstance(item.get("due_date"), int):
+            day = days.setdefault(item["due_date"], ([], []))
+            day[todo_item_is_completed(item)].append(item["id"])
+    return [
+        (datetime.date.fromordinal(ordinal), sorted(incomplete), sorted(completed))
+        for ordinal, (incomplete, completed) in sorted(days.items())
+    ]
+
+
+def indexed_due_days(handler: Todo_Handler, start, end) -> list:
+    days = []
+    for date, items in handler.items_due_between(start, end):
+        completed = [todo_item_is_completed(item) for item in items]
+        # Incomplete items come first.
+        assert completed == sorted(completed)
+        days.append(
+            (
+                date,
+                sorted(
+                    item["id"] for item in items if not todo_item_is_completed(item)
+                ),
+                sorted(item["id"] for item in items if todo_item_is_completed(item)),
+            )
+        )
+    return days
+
+
+def test_due_index_matches_tree_after_edits(tmp_path):
+    rnd = random.Random(0)
+    handler = create_handler(tmp_path)
+    first = datetime.date(2024, 1, 1)
+
+    def random_due_date():
+        if rnd.random() < 0.2:
+            return None
+        return first + datetime.timedelta(days=rnd.randrange(10))
+
+    for step in range(300):
+        ids = [item["id"] for item, _, _ in handler.walk()]
+        operation = rnd.random()
+        if not ids or operation < 0.35:
+            parent_id = rnd.choice(ids + [None] * 3)
+            item = {"name": str(step), "due_date": random_due_date()}
+            if rnd.random() < 0.3:
+                item["items"] = [{"name": "child", "due_date": random_due_date()}]
+            handler.insert(parent_id, rnd.randrange(3), item)
+        elif operation < 0.55:
+            item_id = rnd.choice(ids)
+            parent_id = rnd.choice(ids + [None] * 3)
+            try:
+                handler.move(item_id, parent_id, rnd.randrange(3))
+            except ValueError:
+                pass
+        elif operation < 0.7:
+            handler.delete(rnd.choice(ids), keep_children=rnd.random() < 0.5)
+        else:
+            item_id = rnd.choice(ids)
+            if rnd.random() < 0.5:
+                handler.update(item_id, completed=rnd.random() < 0.5)
+            else:
+                handler.update(item_id, due_date=random_due_date())
+
+        expected = brute_due_days(handler)
+        assert indexed_due_days(handler, first, first.replace(day=10)) == expected
+        start, end = first.replace(day=3), first.replace(day=6)
+        assert indexed_due_days(handler, start, end) == [
+            day for day in expected if start <= day[0] <= end
+        ]
+
+    assert indexed_due_days(create_handler(tmp_path), first, first.replace(day=10)) == (
+        brute_due_days(handler)
+    )
+
+
+tree = [
+    {"name": "a", "items": [{"name": "b"}, {"name": "c", "items": [{"name": "d"}]}]},
+    {"name": "e"},
+]
+
+
+def test_walk_items_order():
+    assert [(item["name"], depth, path) for item, depth, path in walk_items(tree)] == [
+        ("a", 0, None),
+        ("b", 1, None),
+        ("c", 1, None),
+        ("d", 2, None),
+        ("e", 0, None),
+    ]
+    assert [
+        (item["name"], depth, path)
+        for item, depth, path in walk_items(tree, post_order=True, with_path=True)
+    ] == [
+        ("b", 1, (0, 0)),
+        ("d", 2, (0, 1, 0)),
+        ("c", 1, (0, 1)),
+        ("a", 0, (0,)),
+        ("e", 0, (1,)),
+    ]
+    assert list(walk_items([])) == []
+
+
+def test_filter_items():
+    items = [
+        {"name": "a", "completed": True, "due_date": 10},
+        {"name": "b", "due_date": 12},
+        {"name": "c", "completed": False},
+        {"name": "d", "completed": False, "due_date": "someday"},
+    ]
+
+    def names(**filters):
+        return [
+            item["name"] for item, _, _ in filter_items(walk_items(items), **filters)
+        ]
+
+    assert names() == ["a", "b", "c", "d"]
+    assert names(completed=False) == ["b", "c", "d"]
+    assert names(completed=True) == ["a"]
+    start, end = datetime.date.fromordinal(11), datetime.date.fromordinal(12)
+    assert names(due_start=start) == ["b"]
+    assert names(due_end=start) == ["a"]
+    assert names(due_start=start, due_end=end, completed=True) == []
+
+
+def test_copy_item():
+    copy = copy_item(tree[0])
+    assert copy == tree[0]
+    assert copy is not tree[0]
+    assert copy["items"] is not tree[0]["items"]
+    assert copy["items"][1]["items"][0] is not tree[0]["items"][1]["items"][0]
+    # Empty lists of children are kept.
+    assert copy_item({"name": "x", "items": []}) == {"name": "x", "items": []}
@@ -1,9 +1,13 @@
 from PySide2 import QtWidgets, QtCore, QtGui
 import datetime
+import math
 
 from core.chain_handler import chain_handler
+import core.helpers as h
 
 from ui.qt_helpers import (
+    Q_Cell_Render_Cache,
+    create_cell_pixmap,
     date_string_to_qdate,
     qdate_is_weekend,
     scroll_area_wrapper,
@@ -24,7 +28,6 @@ class Q_Todo_Month_View(QtWidgets.QSplitter):
 
     def on_chain_selection_update(self):
         self.chains_calendar.on_chain_selection_update()
-        self.chains_calendar.updateCells()
 
     def get_chains(self):
         chains = []
@@ -47,17 +50,39 @@ class Q_Chain_Selector(QtWidgets.QListWidget):
 
         self.generate_items()
 
-        chain_handler.update_chain_order_event.connect(self.generate_items)
+        chain_handler.update_chain_order_event.connect(self.on_chain_order_update)
         self.itemChanged.connect(parent.on_chain_selection_update)
 
     def generate_items(self):
         self.clear()
 
-        for index, chain in enumerate(chain_handler.get_chain_order()):
-            self.addItem(chain)
-            item = self.item(index)
-            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
-            item.setCheckState(QtCore.Qt.Checked)
+        for chain in chain_handler.get_chain_order():
+            self.add_chain_item(chain)
+
+    def add_chain_item(self, chain):
+        self.addItem(chain)
+        item = self.item(self.count() - 1)
+        item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+        item.setCheckState(QtCore.Qt.Checked)
+
+    # Created, renamed and deleted chains only change their own item. Other changes regenerate every item.
+    def on_chain_order_update(self, changes):
+        if h.changes_all(changes):
+            self.generate_items()
+            return
+        for change in changes:
+            if change.kind == "chain_created":
+                self.add_chain_item(change.name)
+            elif change.kind == "chain_renamed":
+                for item in self.findItems(change.old, QtCore.Qt.MatchExactly):
+                    item.setText(change.new)
+            elif change.kind == "chain_deleted":
+                for item in self.findItems(change.name, QtCore.Qt.MatchExactly):
+                    self.takeItem(self.row(item))
+                self.parent().on_chain_selection_update()
+            else:
+                self.generate_items()
+                return
 
     def dropEvent(self, event):
         super(Q_Chain_Selector, self).dropEvent(event)
@@ -103,124 +128,175 @@ class Q_Chains_Calendar(QtWidgets.QCalendarWidget):
         self.setSelectedDate(QtCore.QDate(1, 1, 1))
         self.setCurrentPage(today.year, today.month)
 
-        self.month_chains = {}
+        self.date_font = QtGui.QFont("Helvetica", 20)
+        self.count_font = QtGui.QFont("Helvetica", 14)
+        self.chain_font = QtGui.QFont("Helvetica", 10)
+        # Cells are keyed by their size and how the date is shown. Cells whose links changed are invalidated.
+        self.render_cache = Q_Cell_Render_Cache(self.chain_font)
+
+        self.week_masks = {}
         self.set_chain_colors()
-        self.currentPageChanged.connect(self.on_chain_selection_update)
-        chain_handler.update_chain_val_event.connect(self.on_chain_selection_update)
+        self.currentPageChanged.connect(self.on_page_changed)
+        chain_handler.update_chain_val_event.connect(self.on_chain_val_update)
 
     def on_chain_selection_update(self):
-        self.month_chains = {}
+        self.week_masks = {}
+        self.render_cache.invalidate()
         self.set_chain_colors()
         self.updateCells()
 
+    # Cells of other pages are kept, so moving back to a page doesn't paint it again.
+    def on_page_changed(self, year, month):
+        self.updateCells()
+
+    # Changed links update the bitmask of their week and repaint their week, where the chain may have been added or
+    # removed, and the later days of their run, whose streaks changed.
+    def on_chain_val_update(self, changes):
+        if h.changes_all(changes):
+            self.on_chain_selection_update()
+            return
+
+        update_dates = set()
+        for change in changes:
+            if change.kind != "link" or change.name not in self.chain_color_dict:
+                continue
+            date = change.start
+            week, weekday = divmod(date.toordinal() - 1, 7)
+            if week in self.week_masks:
+                week_mask = self.week_masks[week].get(change.name, 0)
+                week_mask = week_mask & ~(1 << weekday) | change.new << weekday
+                if week_mask:
+                    self.week_masks[week][change.name] = week_mask
+                else:
+                    self.week_masks[week].pop(change.name, None)
+                # Keeps chains in the order of the chain selector.
+                self.week_masks[week] = {
+                    chain_name: self.week_masks[week][chain_name]
+                    for chain_name in self.chain_color_dict
+                    if chain_name in self.week_masks[week]
+                }
+
+            monday = datetime.date.fromordinal(week * 7 + 1)
+            update_dates.update(
+                monday + datetime.timedelta(days=day) for day in range(7)
+            )
+
+            # A page never shows more than 6 weeks of the run.
+            run_date = date if change.new else date + datetime.timedelta(days=1)
+            run = chain_handler.get_chain_run(change.name, date=run_date)
+            last = date if run is None else max(date, run[1])
+            update_dates.update(
+                date + datetime.timedelta(days=day)
+                for day in range(min((last - date).days + 1, 42))
+            )
+
+        for date in update_dates:
+            self.render_cache.invalidate(date.toordinal())
+            self.updateCell(date_to_qdate(date))
+
     def set_chain_colors(self):
         self.chain_color_dict = {
             chain_name: self.chain_colors[index % len(self.chain_colors)]
             for index, chain_name in enumerate(self.parent().get_chains())
         }
 
-    def generate_week_info(self, date: datetime.date):
+    # Weeks are numbered by (date ordinal - 1) // 7, which counts Monday to Sunday weeks like the calendar does.
+    # week_masks holds {week: {chain_name: links of the week as 7 bits}} for every selected chain linked in the week.
+    def generate_week_info(self, week: int):
         chains = self.parent().get_chains()
-
-        # Set date to the first day of the week displayed in the calendar
-        while date.isoweekday() != self.firstDayOfWeek():
-            date -= datetime.timedelta(days=1)
-
-        date_range = (date, date + datetime.timedelta(days=6))
-
-        # Get all of the chains for every week.
-        week_chains = [
-            chain_name
-            for chain_name in chains
-            if any(
-                chain_handler.get_chain(
-                    chain_name, date=date + datetime.timedelta(days=day_offset)
-                )
-                for day_offset in range(7)
-            )
-        ]
-        self.month_chains[date_range] = week_chains
-        return week_chains
+        masks = chain_handler.get_week_masks(
+            chains, date=datetime.date.fromordinal(week * 7 + 1)
+        )
+        week_masks = {
+            chain_name: masks[chain_name] for chain_name in chains if masks[chain_name]
+        }
+        self.week_masks[week] = week_masks
+        return week_masks
 
     def paintCell(
         self, painter: QtGui.QPainter, rect: QtCore.QRect, qdate: QtCore.QDate
     ):
         date = qdate_to_date(qdate)
+        ordinal = date.toordinal()
+        # Everything painted in a cell depends only on these and on the links of its week.
+        key = (
+            rect.width(),
+            rect.height(),
+            self.monthShown() == qdate.month(),
+            datetime.date.today() == date,
+        )
+        self.render_cache.paint_cell(
+            painter, rect, ordinal, key, lambda size: self.render_cell(size, qdate)
+        )
+
+    # Paints a cell into a pixmap of its size.
+    def render_cell(self, size: QtCore.QSize, qdate: QtCore.QDate) -> QtGui.QPixmap:
+        date = qdate_to_date(qdate)
+        pixmap = create_cell_pixmap(self, size)
+        painter = QtGui.QPainter(pixmap)
+        rect = QtCore.QRect(QtCore.QPoint(0, 0), size)
+
         # Paint date text
         if self.monthShown() != qdate.month():
-            painter.setPen(self.Color.unselected_month_date_text)
+            date_text_color = self.Color.unselected_month_date_text
         else:
-            painter.setPen(self.Color.unselected_date_text)
-        painter.setFont(QtGui.QFont("Helvetica", 20))
+            date_text_color = self.Color.unselected_date_text
+        painter.setPen(date_text_color)
+        painter.setFont(self.date_font)
         painter.drawText(rect, QtCore.Qt.AlignTop, str(qdate.day()))
 
         # Get all of the chains for the current week
-        for date_range, chains in self.month_chains.items():
-            if date_range[0] <= date and date <= date_range[1]:
-                display_chains = chains
-                break
-        else:
-            display_chains = self.generate_week_info(qdate_to_date(qdate))
+        week, weekday = divmod(date.toordinal() - 1, 7)
+        week_masks = self.week_masks.get(week)
+        if week_masks is None:
+            week_masks = self.generate_week_info(week)
 
-        # Paint completed chains
+        # Paint completed chains with the length of their streak on that day
         completed_chains_num = 0
         x = 5
         y = 32
         width = rect.width() - x
-        painter.setFont(QtGui.QFont("Helvetica", 10))
-        for chain in display_chains:
+        painter.setFont(self.chain_font)
+        painter.setPen(self.Color.chain_name_color)
+        for chain, week_mask in week_masks.items():
             if y > rect.height():
                 break
 
-            height = rect.height() - y
-            bounding_rect = painter.boundingRect(
-                rect.x() + x,
-                rect.y() + y,
-                width,
-                height,
-                QtCore.Qt.TextWordWrap,
-                chain,
-            )
-            if chain_handler.get_chain(chain, qdate.year(), qdate.month(), qdate.day()):
+            linked = week_mask >> weekday & 1
+            chain_text = chain
+            if linked:
+                chain_text = f"{chain} ({chain_handler.get_streak(chain, date=date)})"
+            text_layout = self.render_cache.get_text_layout(chain_text, width)
+            text_height = math.ceil(text_layout.size().height())
+            if linked:
                 # Draw colored rect
                 painter.fillRect(
-                    rect.x(),
-                    rect.y() + y,
+                    0,
+                    y,
                     rect.width(),
-                    min(bounding_rect.height(), rect.height() - y),
+                    min(text_height, rect.height() - y),
                     self.chain_color_dict[chain],
                 )
 
                 # Draw text
-                painter.setPen(self.Color.chain_name_color)
                 completed_chains_num += 1
-                painter.drawText(
-                    rect.x() + x,
-                    rect.y() + y,
-                    width,
-                    height,
-                    QtCore.Qt.TextWordWrap,
-                    chain,
-                )
+                painter.drawStaticText(x, y, text_layout)
 
-            y += bounding_rect.height()
+            y += text_height
 
         # Paint number of completed todo items
         if completed_chains_num > 0:
-            if self.monthShown() != qdate.month():
-                painter.setPen(self.Color.unselected_month_date_text)
-            else:
-                painter.setPen(self.Color.unselected_date_text)
+            painter.setPen(date_text_color)
             x = 40
             y = 5
             width = rect.width() - x
-            painter.setFont(QtGui.QFont("Helvetica", 14))
+            painter.setFont(self.count_font)
             item_number_str = f"{completed_chains_num}"
-            painter.drawText(
-                rect.x() + x, rect.y() + y, width, rect.height(), 0, item_number_str
-            )
+            painter.drawText(x, y, width, rect.height(), 0, item_number_str)
 
         # Surround current date in a blue border
         if datetime.date.today() == date:
             painter.setPen(self.Color.selected_background)
-            painter.drawRect(rect.x(), rect.y(), rect.width(), rect.height())
+            painter.drawRect(0, 0, rect.width() - 1, rect.height() - 1)
+        painter.end()
+        return pixmap
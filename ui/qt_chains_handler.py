@@ -1,12 +1,14 @@
-from PySide2 import QtWidgets, QtCore
+from PySide2 import QtWidgets, QtCore, QtGui
 import datetime
+from collections import OrderedDict
 
 from core.chain_handler import chain_handler
 from ui.qt_chains_calendar import Q_Todo_Month_View
 
-from ui.qt_helpers import Q_Confirmation_Dialog, Q_Reorder_Dialogue, scroll_area_wrapper
+from ui.qt_helpers import Q_Confirmation_Dialog, Q_Reorder_Dialogue
 import core.helpers as h
 
+
 # Wrapper widget that contains a chain viewer and editor, as well as a month
 # view for chains.
 class Q_Chain_Handler_Widget(QtWidgets.QWidget):
@@ -15,105 +17,207 @@ class Q_Chain_Handler_Widget(QtWidgets.QWidget):
         self.init_widget_ui()
 
     def init_widget_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(Q_Chain_Comment_Search(self))
+
         self.tabs = QtWidgets.QTabWidget()
         tabs_style_sheet = "QTabWidget { font-size: 23px; }"
         self.tabs.setStyleSheet(tabs_style_sheet)
 
-        self.tabs.addTab(scroll_area_wrapper(Q_Chain_Editor_Widget()), "Vertical")
+        self.chain_editor = Q_Chain_Editor_Widget()
+        self.tabs.addTab(self.chain_editor, "Vertical")
         self.tabs.addTab(Q_Todo_Month_View(self), "Month")
+        self.tabs.addTab(Q_Chain_Statistics_Widget(self), "Statistics")
 
-        layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(self.tabs)
 
+    # Shows the chain link of a chain at a date in the chain editor.
+    def show_chain_link(self, chain_name, date: datetime.date):
+        chain_link = self.chain_editor.get_chain_link(chain_name, date)
+        if chain_link is not None:
+            self.tabs.setCurrentWidget(self.chain_editor)
+            self.chain_editor.show_chain_link(chain_link)
 
-# Widget to load and display all chains.
-class Q_Chain_Editor_Widget(QtWidgets.QWidget):
-    def __init__(self, *args, **kwargs):
-        super(Q_Chain_Editor_Widget, self).__init__(*args, **kwargs)
-        self.init_widget_ui()
 
-    def init_widget_ui(self):
-        layout = QtWidgets.QVBoxLayout()
-        self.setLayout(layout)
+# Search box for chain comments. Activating a result shows its chain link in the chain editor.
+class Q_Chain_Comment_Search(QtWidgets.QWidget):
+    max_results = 100
 
-        self.chain_layout = QtWidgets.QGridLayout()
-        layout.addLayout(self.chain_layout)
+    def __init__(self, parent: Q_Chain_Handler_Widget, *args, **kwargs):
+        super(Q_Chain_Comment_Search, self).__init__(parent, *args, **kwargs)
+        self.chain_handler_widget = parent
 
-        # Create button for loading more chain links.
-        load_previous_month_button = QtWidgets.QPushButton("Load more chains.")
-        load_previous_month_button.clicked.connect(lambda: self.load_chains(14))
-        layout.addWidget(load_previous_month_button)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
 
-        # Prevents vertical stretching of layout in scroll area.
-        layout.addStretch()
+        self.search_field = QtWidgets.QLineEdit(parent=self)
+        self.search_field.setStyleSheet("font-size: 25px")
+        self.search_field.setPlaceholderText(
+            'Search comments, e.g. sick or "felt sick"'
+        )
+        self.search_field.textChanged.connect(self.load_results)
+        layout.addWidget(self.search_field)
+
+        self.results = QtWidgets.QListWidget(parent=self)
+        self.results.setStyleSheet("font-size: 20px")
+        self.results.itemActivated.connect(self.on_result_activated)
+        self.results.hide()
+        layout.addWidget(self.results)
+
+    def load_results(self):
+        self.results.clear()
+        query = self.search_field.text()
+        if not query or query.isspace():
+            self.results.hide()
+            return
+
+        # Newest comments first.
+        hits = chain_handler.search_comments(query)[::-1][: self.max_results]
+        for chain_name, date in hits:
+            comment = chain_handler.get_chain_comment(chain_name, date=date)
+            item = QtWidgets.QListWidgetItem(
+                f"{date.month}/{date.day}/{str(date.year)[2:]} {chain_name}: {comment}"
+            )
+            item.setData(QtCore.Qt.UserRole, (chain_name, date))
+            self.results.addItem(item)
+        self.results.show()
+
+    def on_result_activated(self, item: QtWidgets.QListWidgetItem):
+        chain_name, date = item.data(QtCore.Qt.UserRole)
+        self.chain_handler_widget.show_chain_link(chain_name, date)
+
+
+# Table of how often each chain was completed over the last 7, 30 and 365 days and in a selected month.
+class Q_Chain_Statistics_Widget(QtWidgets.QWidget):
+    windows = [7, 30, 365]
 
-        self.load_chain_layout_ui()
+    def __init__(self, *args, **kwargs):
+        super(Q_Chain_Statistics_Widget, self).__init__(*args, **kwargs)
+        self.init_widget_ui()
+
+        chain_handler.update_chain_val_event.connect(self.on_chain_val_update)
+        chain_handler.update_chain_order_event.connect(
+            lambda changes: self.load_statistics()
+        )
 
-    # Creates widget labels loads first two months of chain links.
-    def load_chain_layout_ui(self):
-        self.clear_chain_layout_ui()
-        self.create_chain_labels()
+    def init_widget_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
 
-        # Load chains links for next 2 weeks.
-        self.date_iterator = h.Date_Iterator(
-            datetime.timedelta(days=-1), date=datetime.date.today()
+        # Selects the month shown in the last column, from this month back to a year ago.
+        self.month_selector = QtWidgets.QComboBox(parent=self)
+        self.month_selector.setStyleSheet("font-size: 25px")
+        today = datetime.date.today()
+        year, month = today.year, today.month
+        for _ in range(13):
+            self.month_selector.addItem(f"{month}/{year}", (year, month))
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        self.month_selector.currentIndexChanged.connect(
+            lambda index: self.load_statistics()
         )
-        self.load_chains(14)
-
-    def clear_chain_layout_ui(self):
-        for column in range(self.chain_layout.columnCount()):
-            self.chain_layout.setColumnStretch(column, 0)
-            for row in range(self.chain_layout.rowCount()):
-                item = self.chain_layout.itemAtPosition(row, column)
-                if item is not None:
-                    item.widget().deleteLater()
-
-    # Creates labels for each chain in the chain_layout.
-    def create_chain_labels(self):
-        label_style_sheet = "font-weight: bold; font-size: 50px; margin-right: 5px"
-        row = 0
-        for index, chain_name in enumerate(chain_handler.get_chain_order()):
-            column = index + 1
-            label = QtWidgets.QLabel(parent=self)
-            label.setText(chain_name)
-            label.setStyleSheet(label_style_sheet)
-            self.chain_layout.addWidget(label, row, column)
+        layout.addWidget(self.month_selector, alignment=QtCore.Qt.AlignLeft)
+
+        self.table = QtWidgets.QTableWidget(parent=self)
+        self.table.setStyleSheet("font-size: 25px")
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.load_statistics()
+
+    def load_statistics(self):
+        self.chain_order = chain_handler.get_chain_order()
+        headers = [f"Last {days} days" for days in self.windows]
+        headers.append(self.month_selector.currentText())
+        self.table.clear()
+        self.table.setRowCount(len(self.chain_order))
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setVerticalHeaderLabels(self.chain_order)
+
+        for row in range(len(self.chain_order)):
+            self.load_row(row)
+        self.table.resizeColumnsToContents()
+
+    def load_row(self, row):
+        today = datetime.date.today()
+        windows = [
+            (today - datetime.timedelta(days=days - 1), today) for days in self.windows
+        ]
+        year, month = self.month_selector.currentData()
+        month_start = datetime.date(year, month, 1)
+        month_end = month_start.replace(day=h.days_in_month(year, month))
+        # Days after today haven't happened yet.
+        windows.append((month_start, min(month_end, today)))
+
+        chain_name = self.chain_order[row]
+        for column, (start, end) in enumerate(windows):
+            links = chain_handler.count_links(chain_name, start, end)
+            rate = chain_handler.get_completion_rate(chain_name, start, end)
+            days = (end - start).days + 1
+            item = QtWidgets.QTableWidgetItem(f"{links}/{days} ({rate:.0%})")
+            self.table.setItem(row, column, item)
+
+    # Only the rows of chains with changed links are reloaded.
+    def on_chain_val_update(self, changes):
+        if h.changes_all(changes):
+            self.load_statistics()
+            return
+        for change in changes:
+            if change.kind == "link" and change.name in self.chain_order:
+                self.load_row(self.chain_order.index(change.name))
+
+
+# Widget to load and display all chains. Chain links are shown in a table with a row per day, starting today, and a
+# column per chain. Older days are loaded while scrolling down.
+class Q_Chain_Editor_Widget(QtWidgets.QWidget):
+    def __init__(self, *args, **kwargs):
+        super(Q_Chain_Editor_Widget, self).__init__(*args, **kwargs)
+        self.init_widget_ui()
+
+    def init_widget_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
 
         # Add button to reorder chains and create new chains.
         edit_chains_button = QtWidgets.QPushButton(parent=self)
         edit_chains_button.setText("Edit chains.")
         edit_chains_button.clicked.connect(self.edit_chain_order)
-        self.chain_layout.addWidget(
-            edit_chains_button,
-            row,
-            self.chain_layout.columnCount(),
-            alignment=QtCore.Qt.AlignLeft,
+        layout.addWidget(edit_chains_button, alignment=QtCore.Qt.AlignLeft)
+
+        self.model = Q_Chain_Links_Model(parent=self)
+        self.table = QtWidgets.QTableView(parent=self)
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(Q_Chain_Link_Delegate(self.table))
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setStyleSheet(
+            "QHeaderView { font-size: 25px } QHeaderView::section:horizontal { font-weight: bold }"
         )
-
-        # Prevents horizontal stretching of layout in scroll_area.
-        self.chain_layout.setColumnStretch(self.chain_layout.columnCount(), 1)
-
-    def load_chains(self, days):
-        date_label_style_sheet = "font-size: 25px"
-
-        row = self.chain_layout.rowCount()
-        date_label_column = 0
-
-        for date in self.date_iterator.get_dates(days):
-            weekday = h.get_weekday(date=date)
-            date_label = QtWidgets.QLabel(parent=self)
-            date_label.setStyleSheet(date_label_style_sheet)
-            date_label.setText(
-                f"{weekday} {date.month}/{date.day}/{str(date.year)[2:]}"
-            )
-
-            self.chain_layout.addWidget(date_label, row, date_label_column)
-
-            for index, chain_name in enumerate(chain_handler.get_chain_order()):
-                column = index + 1
-                chain_link = Q_Chain_Link_Checkbox(self, chain_name, date=date)
-                self.chain_layout.addWidget(chain_link, row, column)
-            row += 1
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(
+            Q_Chain_Link_Delegate.cell_height
+        )
+        self.table.horizontalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.ResizeToContents
+        )
+        self.table.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(self.on_context_menu)
+        layout.addWidget(self.table)
+
+    # Returns the model index of the link of a chain at a date, loading days until it's reached. Returns None for days
+    # in the future or chains that aren't shown.
+    def get_chain_link(self, chain_name, date: datetime.date):
+        if chain_name not in self.model.chain_order:
+            return None
+        row = self.model.row(date)
+        if row < 0:
+            return None
+        while self.model.rowCount() <= row and self.model.canFetchMore():
+            self.model.fetchMore()
+        return self.model.index(row, self.model.chain_order.index(chain_name))
+
+    def show_chain_link(self, index: QtCore.QModelIndex):
+        self.table.scrollTo(index, QtWidgets.QAbstractItemView.PositionAtCenter)
+        self.table.setCurrentIndex(index)
+        self.table.setFocus()
 
     def edit_chain_order(self):
         old_chain_order = chain_handler.get_chain_order()
@@ -121,126 +225,53 @@ class Q_Chain_Editor_Widget(QtWidgets.QWidget):
             old_chain_order, "Edit chains", "Add chain", allow_duplicates=False
         )
         if ok:
-            for chain_name in new_chain_order:
-                if chain_name not in old_chain_order:
-                    chain_handler.create_new_chain(chain_name)
-            chain_handler.edit_chain_order(new_chain_order)
-            self.load_chain_layout_ui()
-
-
-# Widget used to represent the chain links for each day in a chain.
-class Q_Chain_Link_Checkbox(QtWidgets.QCheckBox):
-    def __init__(
-        self,
-        parent: Q_Chain_Handler_Widget,
-        chain_name,
-        year=None,
-        month=None,
-        day=None,
-        date=None,
-        state=None,
-        *args,
-        **kwargs,
-    ):
-        super(Q_Chain_Link_Checkbox, self).__init__(parent=parent, *args, **kwargs)
-
-        chain_link_checkbox_stylesheet = """QCheckBox { margin-left: 50px; font-size:80px }
-            QCheckBox::indicator { width: 80px; height: 80px }"""
-        self.setStyleSheet(chain_link_checkbox_stylesheet)
-
-        self.chain_name = chain_name
-        self.year, self.month, self.day = h.format_date_iii(year, month, day, date)
-
-        self.init_checked_state(state)
-        self.load_comment()
-        self.init_context_menu()
-
-    # Determine whether the checkbox should be checked or not.
-    def init_checked_state(self, state):
-        if state is None:
-            state = chain_handler.get_chain(
-                self.chain_name, self.year, self.month, self.day
-            )
-
-        if state == 1:
-            self.setCheckState(QtCore.Qt.CheckState.Checked)
-        else:
-            self.setCheckState(QtCore.Qt.CheckState.Unchecked)
-
-        self.stateChanged.connect(self.on_state_change)
-
-    # Load the comment tooltip for the chain link.
-    def load_comment(self, comment=None):
-        if comment is None:
-            self.comment = chain_handler.get_chain_comment(
-                self.chain_name, self.year, self.month, self.day
-            )
-        else:
-            self.comment = comment
-
-        # Adds an asterik next to chain links with a comment tootltip.
-        self.checkbox_label = ""
-        if self.comment is not None:
-            self.checkbox_label = "*"
-            self.setToolTip(self.comment)
-        else:
-            self.setToolTip("")
-
-        self.setText(self.checkbox_label)
+            with chain_handler.batch():
+                for chain_name in new_chain_order:
+                    if chain_name not in old_chain_order:
+                        chain_handler.create_new_chain(chain_name)
+                chain_handler.edit_chain_order(new_chain_order)
 
-    # Load the context menu for editing the chain link's comment tooltip and deleting the chain.
-    def init_context_menu(self):
-        self.context_menu = QtWidgets.QMenu(self)
-        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.on_context_menu)
-        self.load_context_menu()
-
-    # Load items in the context menu for editing the chain link's comment tooltip and deleting the chain.
-    def load_context_menu(self):
-        self.context_menu.clear()
-
-        if self.comment is None:
-            create_comment_action = QtWidgets.QAction(
-                "Create new comment", parent=self.context_menu
+    # Opens a context menu for editing the comment of a chain link and renaming or deleting its chain on right click.
+    def on_context_menu(self, point):
+        index = self.table.indexAt(point)
+        if not index.isValid():
+            return
+        chain_name = self.model.chain_order[index.column()]
+        date = self.model.date(index.row())
+
+        context_menu = QtWidgets.QMenu(self)
+        if index.data(QtCore.Qt.ToolTipRole) is None:
+            create_comment_action = context_menu.addAction("Create new comment")
+            create_comment_action.triggered.connect(
+                lambda: self.edit_comment(chain_name, date)
             )
-            create_comment_action.triggered.connect(self.edit_comment)
-            self.context_menu.addAction(create_comment_action)
         else:
-            edit_comment_action = QtWidgets.QAction(
-                "Edit comment", parent=self.context_menu
+            edit_comment_action = context_menu.addAction("Edit comment")
+            edit_comment_action.triggered.connect(
+                lambda: self.edit_comment(chain_name, date)
             )
-            edit_comment_action.triggered.connect(self.edit_comment)
-            self.context_menu.addAction(edit_comment_action)
-
-            delete_comment_action = QtWidgets.QAction(
-                "Delete comment", parent=self.context_menu
+            delete_comment_action = context_menu.addAction("Delete comment")
+            delete_comment_action.triggered.connect(
+                lambda: chain_handler.delete_chain_comment(chain_name, date=date)
             )
-            delete_comment_action.triggered.connect(self.delete_comment)
-            self.context_menu.addAction(delete_comment_action)
-        rename_chain_action = QtWidgets.QAction(
-            "Rename chain", parent=self.context_menu
-        )
-        rename_chain_action.triggered.connect(self.rename_chain)
-        self.context_menu.addAction(rename_chain_action)
-        delete_chain_action = QtWidgets.QAction(
-            "Delete chain", parent=self.context_menu
-        )
-        delete_chain_action.triggered.connect(self.delete_chain)
-        self.context_menu.addAction(delete_chain_action)
-
-    def delete_chain(self):
-        text = f"Delete chain '{self.chain_name}'?"
+        rename_chain_action = context_menu.addAction("Rename chain")
+        rename_chain_action.triggered.connect(lambda: self.rename_chain(chain_name))
+        delete_chain_action = context_menu.addAction("Delete chain")
+        delete_chain_action.triggered.connect(lambda: self.delete_chain(chain_name))
+        context_menu.exec_(self.table.viewport().mapToGlobal(point))
+
+    def delete_chain(self, chain_name):
+        text = f"Delete chain '{chain_name}'?"
         informative_text = "WARNING: This can not be undone."
         ok = Q_Confirmation_Dialog(self).get_ok(
             "Confirm deletion", text, informative_text, warning=True
         )
         if ok:
-            chain_handler.delete_chain(self.chain_name)
-            self.parent().load_chain_layout_ui()
+            chain_handler.delete_chain(chain_name)
 
-    def rename_chain(self):
+    def rename_chain(self, chain_name):
         new_name, ok = QtWidgets.QInputDialog(self).getText(
-            self, f"Rename '{self.chain_name}'", "New name:"
+            self, f"Rename '{chain_name}'", "New name:"
         )
         if ok:
             if new_name == "" or new_name.isspace():
@@ -252,8 +283,7 @@ class Q_Chain_Link_Checkbox(QtWidgets.QCheckBox):
                 error_dialog.exec_()
             else:
                 try:
-                    chain_handler.rename_chain(self.chain_name, new_name)
-                    self.parent().load_chain_layout_ui()
+                    chain_handler.rename_chain(chain_name, new_name)
                 except NameError:
                     error_dialog = QtWidgets.QMessageBox(parent=self)
                     error_dialog.setWindowTitle("Rename failed")
@@ -266,33 +296,248 @@ class Q_Chain_Link_Checkbox(QtWidgets.QCheckBox):
                 except:
                     raise
 
-    def edit_comment(self):
+    def edit_comment(self, chain_name, date: datetime.date):
+        old_comment = chain_handler.get_chain_comment(chain_name, date=date)
         comment, ok = QtWidgets.QInputDialog(self).getText(
-            self, "Comment", "Set comment:", QtWidgets.QLineEdit.Normal, self.comment
+            self, "Comment", "Set comment:", QtWidgets.QLineEdit.Normal, old_comment
         )
         if comment and ok:
-            chain_handler.edit_chain_comment(
-                self.chain_name, comment, self.year, self.month, self.day
+            chain_handler.edit_chain_comment(chain_name, comment, date=date)
+
+
+# Table model of chain links, with a row per day going back from today and a column per chain in the chain order.
+# Rows are added in blocks of days as the view scrolls down. Links and comments are fetched from chain_handler a block
+# at a time, and only the most recently used blocks are kept, so memory doesn't grow with the number of rows.
+class Q_Chain_Links_Model(QtCore.QAbstractTableModel):
+    block_days = 14
+    max_blocks = 16
+
+    def __init__(self, *args, **kwargs):
+        super(Q_Chain_Links_Model, self).__init__(*args, **kwargs)
+        self.today = datetime.date.today()
+        self.chain_order = chain_handler.get_chain_order()
+        self.rows = self.block_days
+        # Block: ({chain_name: [link, ...]}, {chain_name: {date: comment}}), in least to most recently used order.
+        self.blocks = OrderedDict()
+        # Chain name: header text with the chain's streaks.
+        self.headers = {}
+        # Oldest year of the blocks fetched so far. Best streaks only count the years chain_handler has loaded, so
+        # headers are shown again once the view reaches an older year.
+        self.headers_year = self.today.year
+
+        chain_handler.update_chain_val_event.connect(self.on_chain_val_update)
+        chain_handler.update_chain_order_event.connect(self.on_chain_order_update)
+
+    def date(self, row) -> datetime.date:
+        return self.today - datetime.timedelta(days=row)
+
+    # Returns the row of a date, or -1 for dates after the first row.
+    def row(self, date: datetime.date) -> int:
+        row = (self.today - date).days
+        return row if row >= 0 else -1
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.chain_order)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self.date(self.rows) > datetime.date.min
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        days = min(self.block_days, (self.date(self.rows) - datetime.date.min).days)
+        self.beginInsertRows(QtCore.QModelIndex(), self.rows, self.rows + days - 1)
+        self.rows += days
+        self.endInsertRows()
+
+    def _get_block(self, block):
+        if block in self.blocks:
+            self.blocks.move_to_end(block)
+        else:
+            end = self.date(block * self.block_days)
+            start = max(
+                end - datetime.timedelta(days=self.block_days - 1), datetime.date.min
             )
-            self.load_comment(comment)
-            self.load_context_menu()
+            self.blocks[block] = (
+                chain_handler.get_chains_range(self.chain_order, start, end),
+                chain_handler.get_chains_comments_range(self.chain_order, start, end),
+            )
+            if len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+            if start.year < self.headers_year:
+                self.headers_year = start.year
+                self.headers.clear()
+                if self.chain_order:
+                    self.headerDataChanged.emit(
+                        QtCore.Qt.Horizontal, 0, len(self.chain_order) - 1
+                    )
+        return self.blocks[block]
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        chain_name = self.chain_order[index.column()]
+        block, offset = divmod(index.row(), self.block_days)
+        if role == QtCore.Qt.CheckStateRole:
+            links = self._get_block(block)[0][chain_name]
+            # Links of a block are stored oldest day first.
+            if links[len(links) - 1 - offset] == 1:
+                return QtCore.Qt.Checked
+            return QtCore.Qt.Unchecked
+        if role == QtCore.Qt.ToolTipRole:
+            return self._get_block(block)[1][chain_name].get(self.date(index.row()))
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.CheckStateRole:
+            return False
+        new_value = 1 if value == QtCore.Qt.Checked else 0
+        chain_handler.edit_chain(
+            self.chain_order[index.column()], new_value, date=self.date(index.row())
+        )
+        return True
+
+    def flags(self, index):
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
 
-    def delete_comment(self):
-        chain_handler.delete_chain_comment(
-            self.chain_name, self.year, self.month, self.day
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Vertical:
+            date = self.date(section)
+            weekday = h.get_weekday(date=date)
+            return f"{weekday} {date.month}/{date.day}/{str(date.year)[2:]}"
+
+        # Shows the current and longest streak of each chain under its name. The longest streak is only searched for in
+        # the years loaded so far, so showing the header doesn't load every shard.
+        chain_name = self.chain_order[section]
+        if chain_name not in self.headers:
+            streak = chain_handler.get_streak(chain_name, date=self.today)
+            longest_streak = chain_handler.get_longest_streak(
+                chain_name, loaded_only=True
+            )
+            if chain_handler.has_unloaded_years():
+                best = f"best {longest_streak} in loaded years"
+            else:
+                best = f"best {longest_streak}"
+            self.headers[chain_name] = f"{chain_name}\nStreak: {streak} ({best})"
+        return self.headers[chain_name]
+
+    # Updates the cached links and comments that changed, and only repaints their cells and the streaks of their
+    # chains.
+    def on_chain_val_update(self, changes):
+        if h.changes_all(changes):
+            self.blocks.clear()
+            self.headers.clear()
+            if self.rows and self.chain_order:
+                self.dataChanged.emit(
+                    self.index(0, 0),
+                    self.index(self.rows - 1, len(self.chain_order) - 1),
+                )
+                self.headerDataChanged.emit(
+                    QtCore.Qt.Horizontal, 0, len(self.chain_order) - 1
+                )
+            return
+
+        for change in changes:
+            if change.kind not in ("link", "comment"):
+                continue
+            if change.name not in self.chain_order:
+                continue
+            column = self.chain_order.index(change.name)
+            row = self.row(change.start)
+            if row < 0 or row >= self.rows:
+                continue
+            block, offset = divmod(row, self.block_days)
+            if block in self.blocks:
+                links, comments = self.blocks[block]
+                if change.kind == "link":
+                    chain_links = links[change.name]
+                    chain_links[len(chain_links) - 1 - offset] = change.new
+                elif change.new is None:
+                    comments[change.name].pop(change.start, None)
+                else:
+                    comments[change.name][change.start] = change.new
+            index = self.index(row, column)
+            self.dataChanged.emit(index, index)
+            if change.kind == "link":
+                self.headers.pop(change.name, None)
+                self.headerDataChanged.emit(QtCore.Qt.Horizontal, column, column)
+
+    # Chains were created, deleted, renamed or reordered, so every column is loaded again.
+    def on_chain_order_update(self, changes):
+        self.beginResetModel()
+        self.chain_order = chain_handler.get_chain_order()
+        self.blocks.clear()
+        self.headers.clear()
+        self.endResetModel()
+
+
+# Paints chain links as large checkboxes with an asterisk next to links with a comment, and toggles them on click.
+class Q_Chain_Link_Delegate(QtWidgets.QStyledItemDelegate):
+    cell_width = 180
+    cell_height = 90
+    margin = 5
+
+    def __init__(self, *args, **kwargs):
+        super(Q_Chain_Link_Delegate, self).__init__(*args, **kwargs)
+        self.comment_font = QtGui.QFont()
+        self.comment_font.setPixelSize(80)
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(self.cell_width, self.cell_height)
+
+    def _checkbox_rect(self, rect: QtCore.QRect) -> QtCore.QRect:
+        size = rect.height() - 2 * self.margin
+        return QtCore.QRect(rect.x() + 50, rect.y() + self.margin, size, size)
+
+    def paint(self, painter, option, index):
+        option = QtWidgets.QStyleOptionViewItem(option)
+        self.initStyleOption(option, index)
+        widget = option.widget
+        style = widget.style() if widget else QtWidgets.QApplication.style()
+        style.drawPrimitive(
+            QtWidgets.QStyle.PE_PanelItemViewItem, option, painter, widget
         )
-        self.load_comment()
-        self.load_context_menu()
-
-    # Update chains json when checkbox state is changed.
-    def on_state_change(self):
-        new_value = 0
-        if self.checkState() == QtCore.Qt.CheckState.Checked:
-            new_value = 1
-        chain_handler.edit_chain(
-            self.chain_name, new_value, self.year, self.month, self.day
+
+        checkbox = QtWidgets.QStyleOptionButton()
+        checkbox.rect = self._checkbox_rect(option.rect)
+        checkbox.state = QtWidgets.QStyle.State_Enabled
+        if index.data(QtCore.Qt.CheckStateRole) == QtCore.Qt.Checked:
+            checkbox.state |= QtWidgets.QStyle.State_On
+        else:
+            checkbox.state |= QtWidgets.QStyle.State_Off
+        style.drawPrimitive(
+            QtWidgets.QStyle.PE_IndicatorCheckBox, checkbox, painter, widget
         )
 
-    # Opens custom context menu for editing the chain link's comment tooltip on right click.
-    def on_context_menu(self, point):
-        self.context_menu.exec_(self.mapToGlobal(point))
\ No newline at end of file
+        if index.data(QtCore.Qt.ToolTipRole) is not None:
+            painter.save()
+            painter.setFont(self.comment_font)
+            comment_rect = QtCore.QRect(option.rect)
+            comment_rect.setLeft(checkbox.rect.right() + self.margin)
+            painter.drawText(
+                comment_rect, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, "*"
+            )
+            painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        toggle = False
+        if event.type() == QtCore.QEvent.MouseButtonRelease:
+            toggle = event.button() == QtCore.Qt.LeftButton and self._checkbox_rect(
+                option.rect
+            ).contains(event.pos())
+        elif event.type() == QtCore.QEvent.MouseButtonDblClick:
+            # Keeps double clicks from toggling the link twice.
+            return True
+        elif event.type() == QtCore.QEvent.KeyPress:
+            toggle = event.key() in (QtCore.Qt.Key_Space, QtCore.Qt.Key_Select)
+        if not toggle:
+            return False
+
+        if index.data(QtCore.Qt.CheckStateRole) == QtCore.Qt.Checked:
+            state = QtCore.Qt.Unchecked
+        else:
+            state = QtCore.Qt.Checked
+        return model.setData(index, state, QtCore.Qt.CheckStateRole)
@@ -1,6 +1,16 @@
 from PySide2 import QtWidgets
 from PySide2 import QtCore, QtGui
 import datetime
+from collections import OrderedDict
+
+import core.helpers as h
+
+
+# Makes deferred events (see core.helpers.Event) deliver their calls from the Qt event loop.
+def install_event_scheduler():
+    h.set_event_scheduler(
+        lambda callback, delay_ms: QtCore.QTimer.singleShot(delay_ms, callback)
+    )
 
 
 def scroll_area_wrapper(widget: QtWidgets.QWidget) -> QtWidgets.QScrollArea:
@@ -12,6 +22,66 @@ def scroll_area_wrapper(widget: QtWidgets.QWidget) -> QtWidgets.QScrollArea:
     return widget_scroll_area
 
 
+# Cache of what a calendar paints in its cells. Each cell is painted once into a pixmap, which is kept until the cell
+# is painted with a different key, e.g. at a new size or with changed contents, and only the most recently painted
+# cells are kept. Layouts of text drawn in cells are kept too, so wrapping text isn't worked out again for each cell.
+class Q_Cell_Render_Cache:
+    # Enough cells for a few pages.
+    max_cell_pixmaps = 42 * 4
+    max_text_layouts = 2000
+
+    def __init__(self, text_font: QtGui.QFont):
+        self.text_font = text_font
+        # Date ordinal: (cell key, pixmap of the cell), in least to most recently painted order.
+        self.cell_pixmaps = OrderedDict()
+        # (text, width): QStaticText of the text.
+        self.text_layouts = {}
+
+    # Draws the pixmap of the cell of a date. The cell is painted into a new pixmap by calling render with the size of
+    # the cell if it hasn't been painted yet or was painted with a different key.
+    def paint_cell(
+        self, painter: QtGui.QPainter, rect: QtCore.QRect, ordinal: int, key, render
+    ):
+        cached = self.cell_pixmaps.get(ordinal)
+        if cached is None or cached[0] != key:
+            cached = (key, render(rect.size()))
+            self.cell_pixmaps[ordinal] = cached
+            if len(self.cell_pixmaps) > self.max_cell_pixmaps:
+                self.cell_pixmaps.popitem(last=False)
+        else:
+            self.cell_pixmaps.move_to_end(ordinal)
+        painter.drawPixmap(rect.topLeft(), cached[1])
+
+    # Forgets the pixmap of the cell of a date, or of every cell if ordinal is None.
+    def invalidate(self, ordinal: int = None):
+        if ordinal is None:
+            self.cell_pixmaps.clear()
+        else:
+            self.cell_pixmaps.pop(ordinal, None)
+
+    # Returns the layout of text drawn in a width, wrapped to fit.
+    def get_text_layout(self, text, width) -> QtGui.QStaticText:
+        text_layout = self.text_layouts.get((text, width))
+        if text_layout is None:
+            if len(self.text_layouts) > self.max_text_layouts:
+                self.text_layouts.clear()
+            text_layout = QtGui.QStaticText(text)
+            text_layout.setTextFormat(QtCore.Qt.PlainText)
+            text_layout.setTextWidth(width)
+            text_layout.prepare(QtGui.QTransform(), self.text_font)
+            self.text_layouts[(text, width)] = text_layout
+        return text_layout
+
+
+# Returns a transparent pixmap to paint a cell of a size into, sharp on screens with the widget's pixel ratio.
+def create_cell_pixmap(widget: QtWidgets.QWidget, size: QtCore.QSize) -> QtGui.QPixmap:
+    device_pixel_ratio = widget.devicePixelRatioF()
+    pixmap = QtGui.QPixmap(size * device_pixel_ratio)
+    pixmap.setDevicePixelRatio(device_pixel_ratio)
+    pixmap.fill(QtCore.Qt.transparent)
+    return pixmap
+
+
 # Dialog to confirm or cancel action.
 class Q_Confirmation_Dialog(QtWidgets.QMessageBox):
     def __init__(self, parent=None):
@@ -137,26 +207,17 @@ class Q_Reorder_Widget(QtWidgets.QListWidget):
 
 def date_string_to_qdate(string: str) -> QtCore.QDate:
     # Assumes mm/dd/yy date format
-    try:
-        _date = datetime.date.today()
-        year, month, day = _date.year, _date.month, _date.day
-
-        split_string = string.split("/")
-        if len(split_string) == 3:
-            month, day, year = split_string
-            month, day, year = int(month), int(day), int(year)
-        elif len(split_string) == 2:
-            month, day = split_string
-            month, day = int(month), int(day)
-        else:
-            return None
+    date = h.date_string_to_date(string)
+    if date is None:
+        return None
+    return date_to_qdate(date)
 
-        qdate = QtCore.QDate()
-        qdate.setDate(year, month, day)
 
-        return qdate
-    except:
-        return None
+# Returns the text shown for a todo item due date, which is stored as a date ordinal or as text that isn't a date.
+def due_date_to_string(due_date) -> str:
+    if isinstance(due_date, int):
+        return datetime.date.fromordinal(due_date).strftime("%m/%d/%Y")
+    return due_date
 
 
 def qdate_is_weekend(qdate: QtCore.QDate) -> bool:
@@ -169,4 +230,4 @@ def date_to_qdate(date: datetime.date) -> QtCore.QDate:
 
 
 def qdate_to_date(qdate: QtCore.QDate) -> datetime.date:
-    return datetime.date(qdate.year(), qdate.month(), qdate.day())
\ No newline at end of file
+    return datetime.date(qdate.year(), qdate.month(), qdate.day())
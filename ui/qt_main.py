@@ -2,7 +2,7 @@ import sys
 from PySide2 import QtWidgets
 from PySide2.QtGui import QIcon
 
-from ui.qt_helpers import scroll_area_wrapper
+from ui.qt_helpers import scroll_area_wrapper, install_event_scheduler
 
 from ui.qt_chains_handler import Q_Chain_Handler_Widget
 from ui.qt_todo_handler import Q_Todo_Handler_Widget
@@ -73,6 +73,7 @@ class System_Tray_Icon(QtWidgets.QSystemTrayIcon):
 
 class App(QtWidgets.QApplication):
     def run(self, use_system_tray=False):
+        install_event_scheduler()
         if use_system_tray:
             self.setQuitOnLastWindowClosed(False)
 
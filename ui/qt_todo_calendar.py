@@ -1,13 +1,22 @@
 from PySide2 import QtWidgets, QtCore, QtGui
 import datetime
+import math
 
-from core.todo_handler import todo_handler, todo_item_is_completed
+from core.todo_handler import todo_handler, todo_item_is_completed, walk_items
 
 import core.helpers as h
-from ui.qt_helpers import date_string_to_qdate, qdate_is_weekend
+from ui.qt_helpers import (
+    Q_Cell_Render_Cache,
+    create_cell_pixmap,
+    qdate_is_weekend,
+    qdate_to_date,
+    date_to_qdate,
+)
 
 
 # Calendar to display todo items based on their due date.
+# Cell pixmaps are cached (see Q_Cell_Render_Cache) until the items due that day change or the cell is painted
+# differently, e.g. at a new size or when it's selected.
 class Q_Todo_Calendar(QtWidgets.QCalendarWidget):
     class Color:
         # Color enum
@@ -20,18 +29,47 @@ class Q_Todo_Calendar(QtWidgets.QCalendarWidget):
         uncompleted_todo_item = QtGui.QColor(255, 0, 0)
 
     def __init__(self, *args, **kwargs):
-        self.update_items_dict()
-
         super(Q_Todo_Calendar, self).__init__(*args, **kwargs)
         self.setFirstDayOfWeek(QtCore.Qt.DayOfWeek.Monday)
         self.setGridVisible(True)
         self.setVerticalHeaderFormat(self.VerticalHeaderFormat.NoVerticalHeader)
 
+        self.date_font = QtGui.QFont("Helvetica", 20)
+        self.count_font = QtGui.QFont("Helvetica", 14)
+        self.item_font = QtGui.QFont("Helvetica", 10)
+        # Cells are keyed by the version of the day's items, the cell size and how the date is shown.
+        self.render_cache = Q_Cell_Render_Cache(self.item_font)
+        # Date ordinal: number of times the items due that day changed. Days that never changed are version 0.
+        self.day_versions = {}
+        # Version of every day, for changes that may have changed any day.
+        self.all_days_version = 0
+        self.update_items_dict()
+
         todo_handler.update_event.connect(self.on_todolist_update)
+        self.currentPageChanged.connect(self.on_page_changed)
 
     def paintCell(
         self, painter: QtGui.QPainter, rect: QtCore.QRect, date: QtCore.QDate
     ):
+        ordinal = qdate_to_date(date).toordinal()
+        key = (
+            self.all_days_version,
+            self.day_versions.get(ordinal, 0),
+            rect.width(),
+            rect.height(),
+            self.selectedDate() == date,
+            self.monthShown() == date.month(),
+        )
+        self.render_cache.paint_cell(
+            painter, rect, ordinal, key, lambda size: self.render_cell(size, date)
+        )
+
+    # Paints a cell into a pixmap of its size.
+    def render_cell(self, size: QtCore.QSize, date: QtCore.QDate) -> QtGui.QPixmap:
+        pixmap = create_cell_pixmap(self, size)
+        painter = QtGui.QPainter(pixmap)
+        rect = QtCore.QRect(QtCore.QPoint(0, 0), size)
+
         # Paint background
         if self.selectedDate() == date:
             painter.fillRect(rect, self.Color.selected_background)
@@ -46,93 +84,96 @@ class Q_Todo_Calendar(QtWidgets.QCalendarWidget):
                 painter.setPen(self.Color.unselected_date_text)
         else:
             painter.setPen(self.Color.selected_date_text)
-        painter.setFont(QtGui.QFont("Helvetica", 20))
+        painter.setFont(self.date_font)
         painter.drawText(rect, QtCore.Qt.AlignTop, str(date.day()))
 
         # Get todo items to paint
-        items = []
-        try:
-            items = self.todo_item_dict[date.year()][date.month()][date.day()]
-        except KeyError:
-            pass
+        items = self.todo_item_dict.get(qdate_to_date(date).toordinal(), [])
 
         if len(items) != 0:
             # Paint number of todo items
             # Text color is same is date's
-            completed_items_num = len([item for item in items if item["completed"]])
+            completed_items_num = sum(
+                1 for item in items if todo_item_is_completed(item)
+            )
             x = 40
             y = 5
             width = rect.width() - x
-            painter.setFont(QtGui.QFont("Helvetica", 14))
+            painter.setFont(self.count_font)
             item_number_str = f"{completed_items_num}/{len(items)} items"
-            painter.drawText(
-                rect.x() + x, rect.y() + y, width, rect.height(), 0, item_number_str
-            )
+            painter.drawText(x, y, width, rect.height(), 0, item_number_str)
 
             # Paint todo items
             x = 5
             y = 32
             width = rect.width() - x
-            painter.setFont(QtGui.QFont("Helvetica", 10))
+            painter.setFont(self.item_font)
             for item in items:
                 if y > rect.height():
                     break
 
-                if item["completed"]:
+                if todo_item_is_completed(item):
                     painter.setPen(self.Color.completed_todo_item)
                 else:
                     painter.setPen(self.Color.uncompleted_todo_item)
 
-                height = rect.height() - y
-                bounding_rect = painter.boundingRect(
-                    rect.x() + x,
-                    rect.y() + y,
-                    width,
-                    height,
-                    QtCore.Qt.TextWordWrap,
-                    item["name"],
-                )
-                painter.drawText(
-                    rect.x() + x,
-                    rect.y() + y,
-                    width,
-                    height,
-                    QtCore.Qt.TextWordWrap,
-                    item["name"],
-                )
-                y += bounding_rect.height()
+                text_layout = self.render_cache.get_text_layout(item["name"], width)
+                painter.drawStaticText(x, y, text_layout)
+                y += math.ceil(text_layout.size().height())
+        painter.end()
+        return pixmap
+
+    # Returns the first and last date shown on the current page. The page always starts with at least one day of the
+    # previous month, so a month starting on Monday starts a week later.
+    def shown_date_range(self) -> (datetime.date, datetime.date):
+        first_of_month = datetime.date(self.yearShown(), self.monthShown(), 1)
+        first = first_of_month - datetime.timedelta(days=first_of_month.weekday() or 7)
+        return (first, first + datetime.timedelta(days=41))
 
     def update_items_dict(self):
-        # Accessing items: self.todo_item_dict[year: int][month: int][day: int] -> list
-        self.todo_item_dict = {}
-        for item in todo_handler.flat_item_list():
-            if "due_date" in item:
-                date = date_string_to_qdate(item["due_date"])
-                if date is not None:
-                    year, month, day = date.year(), date.month(), date.day()
-
-                    if year not in self.todo_item_dict:
-                        self.todo_item_dict[year] = {}
-                    if month not in self.todo_item_dict[year]:
-                        self.todo_item_dict[year][month] = {}
-                    if day not in self.todo_item_dict[year][month]:
-                        self.todo_item_dict[year][month][day] = []
-
-                    # If item is complete, append to the end of the list. If it is incomplete, append after the last
-                    # incomplete item in the list.
-                    if todo_item_is_completed(item):
-                        self.todo_item_dict[year][month][day].append(item)
-                    else:
-                        insert_index = 0
-                        for index, check_item in enumerate(
-                            self.todo_item_dict[year][month][day]
-                        ):
-                            if todo_item_is_completed(check_item):
-                                break
-                            else:
-                                insert_index = index + 1
-                        self.todo_item_dict[year][month][day].insert(insert_index, item)
-
-    def on_todolist_update(self):
+        # Accessing items: self.todo_item_dict[date ordinal: int] -> list
+        self.todo_item_dict = {
+            date.toordinal(): items
+            for date, items in todo_handler.items_due_between(*self.shown_date_range())
+        }
+
+    # Returns the date ordinals of the days whose due items changed, or None if any day may have changed.
+    def changed_days(self, changes) -> set:
+        if h.changes_all(changes):
+            return None
+        days = set()
+        for change in changes:
+            if change.kind == "todo_item_changed":
+                due_dates = [change.old.get("due_date"), change.new.get("due_date")]
+            elif change.kind in ("todo_item_inserted", "todo_item_deleted"):
+                item = change.new if change.kind == "todo_item_inserted" else change.old
+                # Items below the item moved with it.
+                due_dates = [
+                    subitem.get("due_date") for subitem, _, _ in walk_items([item])
+                ]
+            else:
+                continue
+            days.update(due_date for due_date in due_dates if isinstance(due_date, int))
+        return days
+
+    # Only the days whose due items changed are loaded and painted again.
+    def on_todolist_update(self, changes=None):
+        days = self.changed_days(changes)
+        if days is None:
+            self.all_days_version += 1
+            self.update_items_dict()
+            self.updateCells()
+            return
+
+        first, last = self.shown_date_range()
+        for ordinal in days:
+            self.day_versions[ordinal] = self.day_versions.get(ordinal, 0) + 1
+            date = datetime.date.fromordinal(ordinal)
+            if first <= date <= last:
+                self.todo_item_dict.pop(ordinal, None)
+                for _, items in todo_handler.items_due_between(date, date):
+                    self.todo_item_dict[ordinal] = items
+                self.updateCell(date_to_qdate(date))
+
+    def on_page_changed(self, year, month):
         self.update_items_dict()
-        self.updateCells()
\ No newline at end of file
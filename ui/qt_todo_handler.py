@@ -1,10 +1,11 @@
 from PySide2 import QtWidgets, QtGui
 from PySide2.QtCore import Qt
 
-from core.todo_handler import todo_handler
+from core.todo_handler import todo_handler, walk_items, due_date_ordinal
 import core.helpers as h
 
 from ui.qt_todo_calendar import Q_Todo_Calendar
+from ui.qt_helpers import due_date_to_string
 
 
 # Widget to load and display todo items.
@@ -59,16 +60,23 @@ class Q_Todo_Tree_Widget(QtWidgets.QTreeWidget):
         self.init_context_menu()
 
         self.load_widgets_from_list(load_list)
+        self.dropping = False
         self.itemChanged.connect(self.on_item_changed)
 
     def load_widgets_from_list(self, load_list, parent=None):
         if parent is None:
             parent = self
 
-        for item in load_list:
-            tree_view_item = Q_Todo_Item(**item, parent=parent)
-            if "items" in item:
-                self.load_widgets_from_list(item["items"], parent=tree_view_item)
+        # Widgets of the items above the current item, by depth.
+        parents = [parent]
+        tree_view_items = []
+        for item, depth, _ in walk_items(load_list):
+            del parents[depth + 1 :]
+            tree_view_item = Q_Todo_Item(**item, parent=parents[depth])
+            parents.append(tree_view_item)
+            tree_view_items.append(tree_view_item)
+        # Items are expanded once their children are added.
+        for tree_view_item in tree_view_items:
             self.expandItem(tree_view_item)
 
     def save_tree_to_json(self):
@@ -80,7 +88,14 @@ class Q_Todo_Tree_Widget(QtWidgets.QTreeWidget):
     def new_tree_item(self, parent=None):
         if parent is None:
             parent = self
-        item = Q_Todo_Item("Unnamed item", parent=parent)
+            parent_id = None
+        else:
+            parent_id = parent.item_id
+        # The item is added to the todo list first so its fields are already saved when the widget sets them.
+        item_id = todo_handler.insert(
+            parent_id, None, {"name": "Unnamed item", "completed": False}
+        )
+        item = Q_Todo_Item("Unnamed item", parent=parent, id=item_id)
         self.deselect_all_items()
         self.scrollToItem(item)
         item.setSelected(True)
@@ -94,20 +109,52 @@ class Q_Todo_Tree_Widget(QtWidgets.QTreeWidget):
 
     def clear_checked_items(self):
         items = [self.topLevelItem(i) for i in range(self.topLevelItemCount())]
-        for item in items:
-            item.clear_checked_children()
-            if item.childCount() == 0 and item.checkState(0) == Qt.Checked:
-                item.delete()
+        with todo_handler.batch():
+            for item in items:
+                item.clear_checked_children()
+                if item.childCount() == 0 and item.checkState(0) == Qt.Checked:
+                    item.delete()
 
     def delete_selected_items(self):
-        for item in self.selectedItems():
-            item.delete()
+        with todo_handler.batch():
+            for item in self.selectedItems():
+                item.delete()
 
     def dropEvent(self, event):
-        # Save todo list when todo items are reordered.
+        # Items moved by the drop are deleted from the todo list and inserted again at their new places. Children move
+        # with their parents, so only the top most selected items are moved.
         selected_items = self.selectedItems()
-        super(Q_Todo_Tree_Widget, self).dropEvent(event)
-        self.save_tree_to_json()
+        moved_items = [
+            item for item in selected_items if not item.has_selected_ancestor()
+        ]
+        old_paths = [item.path() for item in moved_items]
+
+        with todo_handler.batch():
+            self.dropping = True
+            try:
+                super(Q_Todo_Tree_Widget, self).dropEvent(event)
+            finally:
+                self.dropping = False
+
+            new_paths = [item.path() for item in moved_items]
+            if new_paths != old_paths:
+                moved_dicts = [todo_handler.get(item.item_id) for item in moved_items]
+                for item in moved_items:
+                    todo_handler.delete(item.item_id)
+                # Inserting earlier paths first puts every item where the later paths expect it.
+                for path, item, item_dict in sorted(
+                    zip(new_paths, moved_items, moved_dicts), key=lambda moved: moved[0]
+                ):
+                    parent_id = None if item.parent() is None else item.parent().item_id
+                    todo_handler.insert(parent_id, path[-1], item_dict)
+
+            # Saves the whole tree if the drop moved items in a way that wasn't expected. Only the moved items are
+            # checked, since the rest of the tree is left as it was.
+            if any(
+                todo_handler.get_path(item.item_id) != item.path()
+                for item in moved_items
+            ):
+                self.save_tree_to_json()
         for item in selected_items:
             item.setSelected(True)
         self.scrollToItem(selected_items[0])
@@ -154,13 +201,19 @@ class Q_Todo_Tree_Widget(QtWidgets.QTreeWidget):
         self.load_context_menu(point)
         self.context_menu.exec_(self.mapToGlobal(point))
 
-    def on_item_changed(self):
-        self.save_tree_to_json()
+    def on_item_changed(self, item, column):
+        # Moved items are saved when the drop is done.
+        if not self.dropping:
+            item.save_fields()
 
 
 class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
-    def __init__(self, name, completed=False, due_date=None, items=None, parent=None):
+    def __init__(
+        self, name, completed=False, due_date=None, items=None, parent=None, id=None
+    ):
         super(Q_Todo_Item, self).__init__(parent)
+        # Id of the item in todo_handler.
+        self.item_id = id
 
         self.setFlags(
             Qt.ItemIsEditable
@@ -173,7 +226,7 @@ class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
 
         self.setText(0, name)
         if due_date is not None:
-            self.setText(1, due_date)
+            self.setText(1, due_date_to_string(due_date))
 
         if completed == True:
             self.setCheckState(0, Qt.CheckState.Checked)
@@ -183,6 +236,36 @@ class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
     def save_tree_to_json(self):
         self.treeWidget().save_tree_to_json()
 
+    # Returns the path of the item in the tree, which is also its path in todo_handler (see Todo_Handler).
+    def path(self) -> tuple:
+        path = []
+        item = self
+        while item.parent() is not None:
+            path.append(item.parent().indexOfChild(item))
+            item = item.parent()
+        path.append(item.treeWidget().indexOfTopLevelItem(item))
+        return tuple(reversed(path))
+
+    def has_selected_ancestor(self) -> bool:
+        parent = self.parent()
+        while parent is not None:
+            if parent.isSelected():
+                return True
+            parent = parent.parent()
+        return False
+
+    # Saves the name, check state and due date of the item if they changed.
+    def save_fields(self):
+        due_date = self.text(1)
+        if due_date == "" or due_date.isspace():
+            due_date = None
+        todo_handler.update(
+            self.item_id,
+            name=self.text(0),
+            completed=self.checkState(0) == Qt.CheckState.Checked,
+            due_date=due_date,
+        )
+
     def clear_checked_children(self):
         items = [self.child(i) for i in range(self.childCount())]
         for item in items:
@@ -191,6 +274,8 @@ class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
                 item.delete()
 
     def delete(self, delete_children=False):
+        todo_handler.delete(self.item_id, keep_children=not delete_children)
+
         tree_widget = self.treeWidget()
         parent = self.parent()
         # parent() returns None for top level widgets.
@@ -206,13 +291,29 @@ class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
                 for i in range(self.childCount()):
                     tree_widget.insertTopLevelItem(index + i + 1, self.takeChild(0))
             tree_widget.takeTopLevelItem(index)
-        tree_widget.save_tree_to_json()
 
     def add_child_todo_item(self):
         self.treeWidget().new_tree_item(self)
 
+    # Returns the item and the items below it in the todo list format. The items below are converted with a stack
+    # instead of recursion, so items can be nested to any depth.
     def to_dict(self):
-        ret = {"name": self.text(0)}
+        item_dict = self.fields_to_dict()
+        stack = [(self, item_dict)]
+        while stack:
+            item, parent_dict = stack.pop()
+            if item.childCount() != 0:
+                parent_dict["items"] = []
+                for i in range(item.childCount()):
+                    child = item.child(i)
+                    child_dict = child.fields_to_dict()
+                    parent_dict["items"].append(child_dict)
+                    stack.append((child, child_dict))
+        return item_dict
+
+    # Returns the item in the todo list format, without the items below it.
+    def fields_to_dict(self):
+        ret = {"id": self.item_id, "name": self.text(0)}
 
         if self.checkState(0) == Qt.CheckState.Checked:
             ret["completed"] = True
@@ -220,9 +321,6 @@ class Q_Todo_Item(QtWidgets.QTreeWidgetItem):
             ret["completed"] = False
 
         if self.text(1) != "" and not self.text(1).isspace():
-            ret["due_date"] = self.text(1)
-
-        if self.childCount() != 0:
-            ret["items"] = [self.child(i).to_dict() for i in range(self.childCount())]
+            ret["due_date"] = due_date_ordinal(self.text(1))
 
         return ret